@@ -14,21 +14,221 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from collections import defaultdict
+"""全局运行环境
+
+维护进程内共享的 `aiohttp.ClientSession` ，每个事件循环一个会话，
+同步接口（后台事件循环）与同一事件循环中的异步接口共用同一个会话，
+连接池在多次调用之间复用，进程退出时自动关闭。
+
+连接池参数可以通过配置文件调整：
+
+    * http_limit: 连接池总连接数上限，默认 100
+    * http_limit_per_host: 单个 host 的连接数上限，默认 10
+    * http_keepalive_timeout: 空闲连接保持时间（秒），默认 60
+    * http_dns_ttl: DNS 缓存时间（秒），默认 300
+    * http_timeout: 单个请求的超时时间（秒），默认 30
+
+部分站点需要先访问首页获取 cookie 才能调用接口，`warm_up` 负责这一步：
+并发的调用者共享同一个进行中的预热请求，预热得到的 cookie 会保存到磁盘，
+有效期内新启动的进程可以直接复用而不必再次预热：
+
+    * cookie_path: cookie 保存目录，默认 ~/.cache/fintie ，设置为空字符串则不保存
+    * cookie_ttl: 保存的 cookie 的有效期（秒），默认 21600
+"""
+import json
+import time
+import atexit
+import asyncio
+import inspect
+import logging
+import weakref
+from pathlib import Path
 
 import aiohttp
 
-_http_session = None
-_init_in_session = defaultdict()
+from .config import get_config
+
+
+logger = logging.getLogger(__name__)
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:62.0) Gecko/20100101 Firefox/62.0"
+}
+
+WARM_UP_URLS = {
+    "xueqiu": "https://xueqiu.com",
+    "cninfo": "http://www.cninfo.com.cn/information/companyinfo_n.html",
+}
+
+# 事件循环 -> 该事件循环的共享会话
+_http_sessions = {}
+# 会话 -> {站点名称: 预热的 future}，会话被回收时自动删除
+_warm_ups = weakref.WeakKeyDictionary()
+_warm_up_times = {}
+
+
+def _create_connector():
+    return aiohttp.TCPConnector(
+        limit=get_config("http_limit", 100),
+        limit_per_host=get_config("http_limit_per_host", 10),
+        keepalive_timeout=get_config("http_keepalive_timeout", 60),
+        use_dns_cache=True,
+        ttl_dns_cache=get_config("http_dns_ttl", 300),
+    )
+
+
+async def _close_connector(connector):
+    ret = connector.close()
+    if inspect.isawaitable(ret):
+        await ret
+
+
+def _prune_sessions(current_loop):
+    """丢弃已经关闭的事件循环的会话，分离并在当前事件循环中关闭其连接池"""
+    for loop in [loop for loop in _http_sessions if loop.is_closed()]:
+        session = _http_sessions.pop(loop)
+        if session.closed:
+            continue
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            current_loop.create_task(_close_connector(connector))
+
+
+def _shared_session(session):
+    return any(shared is session for shared in _http_sessions.values())
 
 
 def get_http_session(force=False):
-    global _http_session
-    if force or not _http_session:
-        _init_in_session.clear()
-        _http_session = aiohttp.ClientSession(
-            headers={
-                "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:62.0) Gecko/20100101 Firefox/62.0"
-            }
+    """获取当前事件循环共享的 http 会话
+
+    每个事件循环有自己的会话，会话已关闭时重新创建，不影响其他事件循环的会话；
+    事件循环关闭后其会话在下一次调用时清理。请在协程中调用本函数。
+
+    :param force: 是否强制创建新的会话，原会话被关闭
+    :returns: `aiohttp.ClientSession` 对象
+    """
+    loop = asyncio.get_event_loop()
+    _prune_sessions(loop)
+    session = _http_sessions.get(loop)
+    if force or session is None or session.closed:
+        if session is not None and not session.closed:
+            loop.create_task(session.close())
+        session = aiohttp.ClientSession(
+            connector=_create_connector(),
+            timeout=aiohttp.ClientTimeout(total=get_config("http_timeout", 30)),
+            headers=DEFAULT_HEADERS,
         )
-    return _http_session
+        _http_sessions[loop] = session
+        _load_cookies(session)
+    return session
+
+
+def _cookie_files():
+    cookie_path = get_config("cookie_path", "~/.cache/fintie")
+    if not cookie_path:
+        return None, None
+    cookie_path = Path(cookie_path).expanduser()
+    return cookie_path / "cookies.pickle", cookie_path / "warm_up.json"
+
+
+def _load_cookies(session):
+    _warm_up_times.clear()
+    jar_file, times_file = _cookie_files()
+    if jar_file is None or not jar_file.exists() or not times_file.exists():
+        return
+    try:
+        session.cookie_jar.load(jar_file)
+        with times_file.open(encoding="utf-8") as f:
+            _warm_up_times.update(json.load(f))
+    except Exception as e:  # noqa
+        logger.warning("load cookies from %s failed: %s", jar_file, e)
+        _warm_up_times.clear()
+
+
+def _save_cookies(session):
+    jar_file, times_file = _cookie_files()
+    if jar_file is None:
+        return
+    try:
+        jar_file.parent.mkdir(parents=True, exist_ok=True)
+        session.cookie_jar.save(jar_file)
+        with times_file.open("w", encoding="utf-8") as f:
+            json.dump(_warm_up_times, f)
+    except Exception as e:  # noqa
+        logger.warning("save cookies to %s failed: %s", jar_file, e)
+
+
+async def warm_up(session, name, force=False):
+    """访问站点首页获取接口需要的 cookie
+
+    同一个会话中每个站点只预热一次，并发的调用者会等待同一个进行中的预热请求；
+    共享会话（见 `get_http_session` ）加载的磁盘 cookie 在有效期内时直接复用，
+    不再发出请求。预热请求经过 host 调度器，只有 2xx 响应视为成功。
+
+    :param session: `aiohttp.ClientSession` 对象
+    :param name: 站点名称，见 `WARM_UP_URLS`
+    :param force: 是否忽略已有的 cookie 强制预热
+    :returns: 预热成功返回 `True` ，否则返回 `False`
+    """
+    # fintie.utils 导入本模块，只能在使用时导入
+    from .utils.http import request
+
+    warm_ups = _warm_ups.setdefault(session, {})
+    fut = warm_ups.get(name)
+    if fut is not None and not force:
+        return await asyncio.shield(fut)
+
+    ttl = get_config("cookie_ttl", 6 * 3600)
+    loop = asyncio.get_event_loop()
+    fut = loop.create_future()
+    warm_ups[name] = fut
+    # 磁盘上的 cookie 只加载到了共享会话中
+    if (
+        not force
+        and _shared_session(session)
+        and time.time() - _warm_up_times.get(name, 0) < ttl
+    ):
+        fut.set_result(True)
+        return True
+
+    url = WARM_UP_URLS[name]
+    try:
+        async with request(session, "GET", url) as resp:
+            await resp.read()
+            status = resp.status
+        if 200 <= status < 300:
+            if _shared_session(session):
+                _warm_up_times[name] = time.time()
+                _save_cookies(session)
+            logger.info("warm up %s with %s finished", name, url)
+            fut.set_result(True)
+        else:
+            logger.warning("warm up %s with %s failed: http %s", name, url, status)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning("warm up %s with %s failed: %s", name, url, e)
+    finally:
+        if not fut.done():
+            # 下一个调用者会重新预热
+            warm_ups.pop(name, None)
+            fut.set_result(False)
+    return fut.result()
+
+
+async def close_http_session():
+    """关闭当前事件循环共享的 http 会话"""
+    session = _http_sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+@atexit.register
+def _close_at_exit():
+    # 运行中的事件循环（如后台事件循环）由其所有者负责关闭会话
+    for loop, session in list(_http_sessions.items()):
+        if session.closed or loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(session.close())
+        except Exception as e:  # noqa
+            logger.warning("close http session at exit failed: %s", e)
+    _http_sessions.clear()
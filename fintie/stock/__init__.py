@@ -21,12 +21,16 @@
 同步提供数据抓取并返回接口及抓取并存储接口
 """
 from . import mkt_calendar
+from . import scheduler
 from . import announcement
 from . import fundamentals
 from . import fundamentals_xq
 from . import list_quotes
 from . import hist_quotes
 from . import live_quotes
+from . import live_watch
+from . import tick_collector
+from . import live_hub
 from . import fenhong
 from . import zengfa
 from . import guben
@@ -35,12 +39,16 @@ from . import insider
 from . import picker_xq
 
 from .mkt_calendar import *         # noqa
+from .scheduler import *            # noqa
 from .announcement import *         # noqa
 from .fundamentals import *         # noqa
 from .fundamentals_xq import *      # noqa
 from .list_quotes import *          # noqa
 from .hist_quotes import *          # noqa
 from .live_quotes import *          # noqa
+from .live_watch import *           # noqa
+from .tick_collector import *       # noqa
+from .live_hub import *             # noqa
 from .fenhong import *              # noqa
 from .zengfa import *               # noqa
 from .guben import *                # noqa
@@ -51,6 +59,7 @@ from .picker_xq import *            # noqa
 
 __all__ = (
     mkt_calendar.__all__
+    + scheduler.__all__
     + announcement.__all__
     + fundamentals.__all__
     + fundamentals_xq.__all__
@@ -62,5 +71,8 @@ __all__ = (
     + picker_xq.__all__
     + list_quotes.__all__
     + live_quotes.__all__
+    + live_watch.__all__
+    + tick_collector.__all__
+    + live_hub.__all__
     + hist_quotes.__all__
 )
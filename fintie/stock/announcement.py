@@ -68,44 +68,91 @@
     from pathlib import Path
     with Path("xxx.json").open(encoding="utf-8") as f:
         data = json.load(f)
+
+公告原文流式下载到 ``<文件名>.part`` 临时文件，完成后重命名，
+中断的下载在下次运行时断点续传；已下载文件的大小及 md5 记录在
+同目录的 ``manifest.json`` 中，再次运行时与清单一致的文件直接跳过。
 """
 import os
 import json
 import asyncio
+import hashlib
 import logging
 from pathlib import Path
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 
 import click
-import aiohttp
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..utils import parse_dt, fetch_http_data, add_doc
+from ..env import warm_up
+from ..utils import parse_dt, fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, download_file, FetchError
+from ..store.writer import async_save_data
+from ..store.catalog import async_record_file
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["get_announcements", "async_get_announcements"]
+__all__ = ["get_announcements", "async_get_announcements", "submit_announcements"]
+MANIFEST_NAME = "manifest.json"
 
 
-async def _init(session):
-    return True
+async def _init(session, force=False):
+    return await warm_up(session, "cninfo", force)
 
 
-async def _get_one_announcement(session, url, fname):
+def _load_manifest(manifest_file):
+    if not manifest_file.exists():
+        return {}
     try:
-        resp = await session.get(url)
-        if resp.status != 200:
-            logger.warning(
-                "Download announcement %s from url failed: http %s", url, resp.status
-            )
-            return None
-        raw_data = await resp.read()
-    except (aiohttp.ServerTimeoutError, asyncio.TimerHandle):
-        logger.warning("Download announcement %s failed：timeout", fname)
+        with manifest_file.open(encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError as e:
+        logger.warning("load manifest %s failed: %s", manifest_file, e)
+        return {}
+
+
+async def _save_manifest(manifest_file, manifest):
+    await async_save_data(
+        manifest, manifest_file, fmt="json", compression="none", wait=True
+    )
+
+
+def _check_file(fpath, entry, verify):
+    if not fpath.exists() or fpath.stat().st_size != entry.get("size"):
+        return False
+    if not verify:
+        return True
+    md5 = hashlib.md5()
+    with fpath.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest() == entry.get("md5")
+
+
+async def _is_complete(fpath, entry, verify):
+    """检查已下载的文件，校验 md5 时在线程池中读取文件，不阻塞事件循环"""
+    if not verify:
+        return _check_file(fpath, entry, False)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, _check_file, fpath, entry, True)
+
+
+async def _get_one_announcement(session, symbol, url, fpath, manifest, verify=False):
+    entry = manifest.get(fpath.name)
+    if entry and entry.get("url") == url and await _is_complete(fpath, entry, verify):
+        logger.debug("announcement %s already downloaded, skipped", fpath)
+        return True
+    try:
+        size, md5 = await download_file(session, url, fpath)
+    except FetchError as e:
+        logger.warning("Download announcement %s failed：%s", fpath, e)
         return None
-    with Path(fname).open("wb") as statf:
-        statf.write(raw_data)
+    manifest[fpath.name] = {"url": url, "size": size, "md5": md5}
+    # 直接使用下载时计算的 md5 ，不再读取整个文件计算哈希
+    await async_record_file(
+        fpath, "announcement", symbol, {"url": url}, content_hash=md5
+    )
     return True
 
 
@@ -117,6 +164,7 @@ async def async_get_announcements(
     start_date=None,
     end_date=None,
     search_key="",
+    verify=False,
 ):
     """获取公告文件
 
@@ -127,6 +175,7 @@ async def async_get_announcements(
     :param start_date: 公共查询起始时间
     :param end_date: 公告查询截止时间
     :param search_key: 公告查询搜索关键字
+    :param verify: 是否校验已下载文件的 md5 ，默认只比较文件大小
     :returns: None 接口用于下载公告原文进行人工分析，不返回任何数据
 
     catetories::
@@ -170,8 +219,6 @@ async def async_get_announcements(
     page_num = 1
 
     logger.info("Downloading announcements data for %s", symbol)
-    query_url = "http://www.cninfo.com.cn/information/companyinfo_n.html"
-    await session.get(query_url)
     post_url = "http://www.cninfo.com.cn/cninfo-new/announcement/query"
 
     cninfo_symbol = symbol
@@ -196,36 +243,26 @@ async def async_get_announcements(
     while page_num <= page_cnt:
         post_form["pageNum"] = [page_num]
         try:
-            async with session.post(post_url, data=post_form) as resp:
-                if resp.status != 200:
-                    logger.warning(
-                        "Download announcement metadata from %s failed: http %s",
-                        post_url,
-                        resp.status,
-                    )
-                    break
-                data = await resp.json()
-                if "totalAnnouncement" in data:
-                    total_cnt = data["totalAnnouncement"]
-                elif "totalRecordNum" in data:
-                    total_cnt = data["totalRecordNum"]
-                else:
-                    logger.warning(
-                        "Download announcements meta data for %s failed: %s",
-                        symbol,
-                        data,
-                    )
-                    break
-                page_cnt = total_cnt // page_num
-                if total_cnt % page_num != 0:
-                    page_cnt += 1
-                if "announcements" in data:
-                    announcements.extend(data["announcements"])
-        except (aiohttp.ServerTimeoutError, asyncio.TimeoutError) as e:
+            data = await fetch_json(session, post_url, method="POST", data=post_form)
+        except FetchError as e:
             logger.warning(
-                "Download announcements meta data for %s timeout: %s", symbol, e
+                "Download announcements meta data for %s failed: %s", symbol, e
             )
-            continue
+            break
+        if "totalAnnouncement" in data:
+            total_cnt = data["totalAnnouncement"]
+        elif "totalRecordNum" in data:
+            total_cnt = data["totalRecordNum"]
+        else:
+            logger.warning(
+                "Download announcements meta data for %s failed: %s", symbol, data
+            )
+            break
+        page_cnt = total_cnt // page_size
+        if total_cnt % page_size != 0:
+            page_cnt += 1
+        if "announcements" in data:
+            announcements.extend(data["announcements"])
         page_num += 1
 
     if not announcements:
@@ -236,9 +273,12 @@ async def async_get_announcements(
     symbol_data_dir = Path(data_path) / MODULE_DATA_DIR / symbol / "announcements"
     os.makedirs(symbol_data_dir, exist_ok=True)
     meta_file = symbol_data_dir / f"{symbol}_meta.json"
-    with meta_file.open("w", encoding="utf-8") as dataf:
-        json.dump(announcements, dataf, indent=4, ensure_ascii=False)
+    await async_save_data(
+        announcements, meta_file, dataset="announcement_meta", symbol=symbol
+    )
 
+    manifest_file = symbol_data_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_file)
     aws = []
     logger.info("Downloading announcements files for %s", symbol)
     for announcement in announcements:
@@ -263,8 +303,13 @@ async def async_get_announcements(
         fpath = symbol_data_dir / f"{annou_name}-{annou_time}.{ftype}"
 
         url = "http://www.cninfo.com.cn/" + announcement["adjunctUrl"]
-        aws.append(_get_one_announcement(session, url, fpath))
-    await asyncio.gather(*aws, return_exceptions=True)
+        aws.append(
+            _get_one_announcement(session, symbol, url, fpath, manifest, verify)
+        )
+    try:
+        await asyncio.gather(*aws, return_exceptions=True)
+    finally:
+        await _save_manifest(manifest_file, manifest)
     logger.info("Download announcements files for %s finished", symbol)
     return None
 
@@ -277,6 +322,11 @@ def get_announcements(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_announcements.__doc__)
+def submit_announcements(*args, **kwargs):
+    return submit_http_data(async_get_announcements, *args, **kwargs)
+
+
 @click.option("-s", "--symbol", type=str, required=True)
 @click.option(
     "-st",
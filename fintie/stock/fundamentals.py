@@ -26,21 +26,23 @@
 
 加载已保存数据::
 
-    import pandas as pd
-    from pathlib import Path
-    df = pd.read_csv(Path("xxx.json"), index_col=0)
+    from fintie.stock import load_funda_tab
+
+    df = load_funda_tab(data_path, "SZ000333", "zcfzb")
 """
-import os
+import io
 import logging
 import asyncio
 from pathlib import Path
 
 import click
-import aiohttp
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..utils import fetch_http_data, add_doc
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_text, FetchError
+from ..store.writer import async_save_data
+from ..store.loader import read_columns
 
 
 logger = logging.getLogger(__file__)
@@ -49,6 +51,9 @@ __all__ = [
     "async_get_funda_tab",
     "get_fundamentals",
     "async_get_fundamentals",
+    "submit_funda_tab",
+    "submit_fundamentals",
+    "load_funda_tab",
 ]
 
 
@@ -75,24 +80,14 @@ async def async_get_funda_tab(session, symbol, tab_name, return_df=True):
         symbol_163 = symbol[2:]
     url = f"http://quotes.money.163.com/service/{tab_name}_{symbol_163}.html"
     try:
-        async with await session.get(url) as resp:
-            if resp.status != 200:
-                logger.warning(
-                    "Download funda for %s.%s from url failed: http %s",
-                    symbol,
-                    tab_name,
-                    url,
-                    resp.status,
-                )
-                return None
-            data = await resp.text()
-            encoding = resp.get_encoding()
-    except (aiohttp.ServerTimeoutError, asyncio.TimerHandle):
-        logger.warning("get %s for %s failed: timeout", tab_name, symbol)
+        data = await fetch_text(session, url)
+    except FetchError as e:
+        logger.warning("Download funda for %s.%s failed: %s", symbol, tab_name, e)
+        return None
 
     if not return_df:
         return data
-    return pd.read_csv(data, encoding=encoding, index_col=0)
+    return pd.read_csv(io.StringIO(data), index_col=0)
 
 
 async def async_get_fundamentals(session, symbols, data_path):
@@ -107,16 +102,17 @@ async def async_get_fundamentals(session, symbols, data_path):
 
     async def get_one_funda(symbol, tab_name, path):
         data = await async_get_funda_tab(session, symbol, tab_name, return_df=False)
-        save_file = path / (tab_name + ".csv")
-        with save_file.open("w", encoding="utf-8") as f:
-            f.write(data)
+        if data is None:
+            return None
+        await async_save_data(
+            data, path / (tab_name + ".csv"), dataset=f"funda_{tab_name}", symbol=symbol
+        )
 
     await _init(session)
     aws = []
     logger.info("Getting fundamental from 163")
     for symbol in symbols:
         symbol_data_dir = Path(data_path) / MODULE_DATA_DIR / symbol / "fundamental"
-        os.makedirs(symbol_data_dir, exist_ok=True)
         for tab_name in ("lrb", "zcfzb", "xjllb", "cwbbzy", "zycwzb"):
             aws.append(get_one_funda(symbol, tab_name, symbol_data_dir))
     rets = await asyncio.gather(*aws, return_exceptions=True)
@@ -135,6 +131,11 @@ def get_funda_tab(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_funda_tab.__doc__)
+def submit_funda_tab(*args, **kwargs):
+    return submit_http_data(async_get_funda_tab, *args, **kwargs)
+
+
 @add_doc(async_get_fundamentals.__doc__)
 def get_fundamentals(*args, **kwargs):
     ret = fetch_http_data(async_get_fundamentals, *args, **kwargs)
@@ -143,6 +144,33 @@ def get_fundamentals(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_fundamentals.__doc__)
+def submit_fundamentals(*args, **kwargs):
+    return submit_http_data(async_get_fundamentals, *args, **kwargs)
+
+
+def load_funda_tab(data_path, symbols, tab_name):
+    """从数据保存路径读取 `async_get_fundamentals` 保存的财务报表，不访问网络
+
+    :param data_path: 数据保存路径
+    :param symbols: 股票代码或代码列表
+    :param tab_name: 报表名称，lrb/zcfzb/xjllb/cwbbzy/zycwzb
+
+    :returns: `pandas.DataFrame` ，symbols 为单个代码时与 `async_get_funda_tab` 返回的相同，
+              否则以 (symbol, 原索引) 为索引，没有保存的股票不包含在内
+    """
+    single = isinstance(symbols, str)
+    dfs = {}
+    for symbol in [symbols] if single else symbols:
+        symbol_data_dir = Path(data_path) / MODULE_DATA_DIR / symbol / "fundamental"
+        for fpath in symbol_data_dir.glob(f"{tab_name}.csv*"):
+            dfs[symbol] = read_columns(fpath)
+            break
+    if single:
+        return dfs.get(symbols, pd.DataFrame())
+    return pd.concat(dfs, names=["symbol"]) if dfs else pd.DataFrame()
+
+
 @click.option(
     "-f",
     "--save-path",
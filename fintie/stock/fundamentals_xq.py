@@ -31,18 +31,11 @@
 加载已保存的数据::
 
     # 主要财务指标/单季财务指标/综合损益表/资产负债表/现金流量表
+    from fintie.stock import load_funda
 
-    import pandas as pd
-    from pathlib import Path
-
-    df = pd.read_json(Path('xxx.json')
-    # optional, set index
-    if "reportdate" if df:
-        df.set_index("reportdate", inplace=True)
-    else:
-        df.set_index("enddate", inplace=True)
-        or
-        df.set_index("begindate", inplace=True)
+    df = load_funda(data_path, "ZCFZB", ["SZ002353", "SZ000001"], start="2015-01-01")
+    # 没有 reportdate 的表
+    df = load_funda(data_path, "DJCWZB", "SZ002353", date_column="enddate")
 
     # 当日财务指标/股票收益率指标
     import json
@@ -51,9 +44,7 @@
     with Path("xxx.json").open(encoding="utf-8") as f:
         data = json.load(f)
 """
-import os
 import time
-import json
 import asyncio
 import logging
 from pathlib import Path
@@ -63,12 +54,17 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..config import get_config
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data, async_submit_write
+from ..store.loader import load_records
+from ..store.sql import upsert_records
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["async_get_funda", "get_funda"]
+__all__ = ["async_get_funda", "get_funda", "submit_funda", "load_funda"]
 FUNDA_TABLES = {
     # 当日财务指标
     "MRCWZB": "https://xueqiu.com/stock/f10/dailypriceextend.json",
@@ -88,10 +84,7 @@ FUNDA_TABLES = {
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
 
 
 async def async_get_funda(session, symbol, table, data_path=None, return_df=True):
@@ -130,26 +123,35 @@ async def async_get_funda(session, symbol, table, data_path=None, return_df=True
 
     list_data = False
     date_str = str(date.today())
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get funda2 from %s failed: %s", url, resp.status)
-            return None
-        funda_data = await resp.json()
-        if "list" in funda_data:
-            list_data = True
-            funda_data = funda_data.get("list")
+    try:
+        funda_data = await fetch_json(session, url, params=params)
+    except FetchError as e:
+        logger.warning("get funda2 from %s failed: %s", url, e)
+        return None
+    if "list" in funda_data:
+        list_data = True
+        funda_data = funda_data.get("list")
 
     if not funda_data:
         logger.warn("no funda2 data downloaded for %s from %s, return None", table, url)
         return None
     logger.info("download funda2 table %s from %s finish", table, url)
-    if data_path:
+    if data_path and get_config("f10_store", "json") == "sql":
+        await async_submit_write(
+            upsert_records,
+            f"funda2_{table}",
+            symbol,
+            funda_data,
+            data_path,
+            key=f"funda2_{table}:{symbol}",
+        )
+    elif data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / "funda2"
-        os.makedirs(data_path, exist_ok=True)
         data_fname = "-".join((symbol, table, date_str)) + ".json"
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(funda_data, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(
+            funda_data, data_file, dataset=f"funda2_{table}", symbol=symbol
+        )
 
     if not return_df or not list_data:
         return funda_data
@@ -171,6 +173,48 @@ def get_funda(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_funda.__doc__)
+def submit_funda(*args, **kwargs):
+    return submit_http_data(async_get_funda, *args, **kwargs)
+
+
+def load_funda(
+    data_path,
+    table,
+    symbols=None,
+    columns=None,
+    start=None,
+    end=None,
+    date_column="reportdate",
+):
+    """从数据保存路径读取财务数据，不访问网络
+
+    :param data_path: 数据保存路径
+    :param table: 财务数据表名，见 `async_get_funda`
+    :param symbols: 股票代码或代码列表，`None` 表示所有已保存的股票
+    :param columns: 要读取的列，`None` 表示所有列
+    :param start: 开始时间（包含），按 date_column 过滤
+    :param end: 截止时间（包含），按 date_column 过滤
+    :param date_column: 日期列，没有 reportdate 的表为 enddate 或 begindate
+
+    :returns: `pandas.DataFrame` ，symbols 为单个代码时与 `async_get_funda` 返回的相同，
+              否则增加 symbol 列
+    """
+    assert table in FUNDA_TABLES
+    data_dir = Path(data_path) / MODULE_DATA_DIR / "funda2"
+    return load_records(
+        f"funda2_{table}",
+        data_dir,
+        data_path,
+        symbols,
+        table,
+        columns,
+        start,
+        end,
+        date_column,
+    )
+
+
 @click.option("-s", "--symbol", required=True)
 @click.option(
     "-t",
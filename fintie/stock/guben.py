@@ -22,14 +22,11 @@
 
 加载已保存的数据::
 
-    import pandas as pd
-    from pathlib import Path
+    from fintie.stock import load_guben
 
-    df = pd.read_json(Path('xxx.json')
+    df = load_guben(data_path, "SZ002353")
 """
-import os
 import time
-import json
 import asyncio
 import logging
 from pathlib import Path
@@ -39,19 +36,21 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..config import get_config
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data, async_submit_write
+from ..store.loader import load_records
+from ..store.sql import upsert_records
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["async_get_guben", "get_guben"]
+__all__ = ["async_get_guben", "get_guben", "submit_guben", "load_guben"]
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
 
 
 async def async_get_guben(session, symbol, data_path=None, return_df=True):
@@ -77,27 +76,34 @@ async def async_get_guben(session, symbol, data_path=None, return_df=True):
     params["_"] = int(time.time() * 1000)
 
     date_str = str(date.today())
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get guben from %s failed: %s", url, resp.status)
-            return None
-        data = await resp.json()
-        if "list" not in data:
-            logger.warn("no guben data downloaded for %s from %s: % ", symbol, url, data)
-        guben_data = data["list"]
+    try:
+        data = await fetch_json(session, url, params=params)
+    except FetchError as e:
+        logger.warning("get guben from %s failed: %s", url, e)
+        return None
+    if "list" not in data:
+        logger.warn("no guben data downloaded for %s from %s: % ", symbol, url, data)
+    guben_data = data["list"]
 
     if not guben_data:
         logger.warn("no guben data downloaded for %s from %s, return None", symbol, url)
         return None
 
     logger.info("download guben for %s from %s finish", symbol, url)
-    if data_path:
+    if data_path and get_config("f10_store", "json") == "sql":
+        await async_submit_write(
+            upsert_records,
+            "guben",
+            symbol,
+            guben_data,
+            data_path,
+            key=f"guben:{symbol}",
+        )
+    elif data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / "guben"
-        os.makedirs(data_path, exist_ok=True)
         data_fname = "-".join((symbol, date_str)) + ".json"
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(guben_data, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(guben_data, data_file, dataset="guben", symbol=symbol)
 
     if not return_df:
         return guben_data
@@ -116,6 +122,32 @@ def get_guben(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_guben.__doc__)
+def submit_guben(*args, **kwargs):
+    return submit_http_data(async_get_guben, *args, **kwargs)
+
+
+def load_guben(
+    data_path, symbols=None, columns=None, start=None, end=None, date_column=None
+):
+    """从数据保存路径读取股本数据，不访问网络
+
+    :param data_path: 数据保存路径
+    :param symbols: 股票代码或代码列表，`None` 表示所有已保存的股票
+    :param columns: 要读取的列，`None` 表示所有列
+    :param start: 开始时间（包含），按 date_column 过滤
+    :param end: 截止时间（包含），按 date_column 过滤
+    :param date_column: 日期列，按时间过滤时需要指定
+
+    :returns: `pandas.DataFrame` ，symbols 为单个代码时与 `async_get_guben` 返回的相同，
+              否则增加 symbol 列
+    """
+    data_dir = Path(data_path) / MODULE_DATA_DIR / "guben"
+    return load_records(
+        "guben", data_dir, data_path, symbols, None, columns, start, end, date_column
+    )
+
+
 @click.option("-s", "--symbol", required=True)
 @click.option(
     "-f",
@@ -32,19 +32,13 @@
 
 加载已保存的数据::
 
-    import json
-    import pandas as pd
-    from pathlib import Path
-
-    with Path('xxx.json').open(encoding="utf-8") as f:
-        data = json.load(f)
+    from fintie.stock import load_gudong
 
+    df = load_gudong(data_path, "main", ["SZ002353", "SZ000001"])
     # 股东户数统计
-    df = pd.read_json(Path('xxx.json')
+    df = load_gudong(data_path, "count", "SZ002353")
 """
-import os
 import time
-import json
 import asyncio
 import logging
 from pathlib import Path
@@ -54,8 +48,13 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..config import get_config
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data, async_submit_write
+from ..store.loader import load_records
+from ..store.sql import upsert_records
 
 
 logger = logging.getLogger(__file__)
@@ -64,6 +63,9 @@ __all__ = [
     "async_get_gudong_count",
     "get_gudong",
     "get_gudong_count",
+    "submit_gudong",
+    "submit_gudong_count",
+    "load_gudong",
 ]
 GUDONG_TYPES = {
     "main": "https://xueqiu.com/stock/f10/shareholder.json",
@@ -74,10 +76,7 @@ GUDONG_TYPES = {
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
 
 
 async def async_get_gudong_count(session, symbol, data_path=None, return_df=True):
@@ -131,16 +130,14 @@ async def async_get_gudong(session, symbol, gd_type, data_path=None):
     params["_"] = int(time.time() * 1000)
 
     date_str = str(date.today())
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get gudong from %s failed: %s", url, resp.status)
-            return None
-        data = await resp.json()
-        if "list" not in data:
-            logger.warn(
-                "no gudong data downloaded for %s from %s: % ", symbol, url, data
-            )
-        gudong_data = data["list"]
+    try:
+        data = await fetch_json(session, url, params=params)
+    except FetchError as e:
+        logger.warning("get gudong from %s failed: %s", url, e)
+        return None
+    if "list" not in data:
+        logger.warn("no gudong data downloaded for %s from %s: % ", symbol, url, data)
+    gudong_data = data["list"]
 
     if not gudong_data:
         logger.warn(
@@ -149,13 +146,22 @@ async def async_get_gudong(session, symbol, gd_type, data_path=None):
         return None
 
     logger.info("download gudong for %s from %s finish", symbol, url)
-    if data_path:
+    if data_path and get_config("f10_store", "json") == "sql":
+        await async_submit_write(
+            upsert_records,
+            f"gudong_{gd_type}",
+            symbol,
+            gudong_data,
+            data_path,
+            key=f"gudong_{gd_type}:{symbol}",
+        )
+    elif data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / "gudong"
-        os.makedirs(data_path, exist_ok=True)
         data_fname = "-".join((symbol, gd_type, date_str)) + ".json"
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(gudong_data, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(
+            gudong_data, data_file, dataset=f"gudong_{gd_type}", symbol=symbol
+        )
 
     return gudong_data
 
@@ -168,6 +174,11 @@ def get_gudong(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_gudong.__doc__)
+def submit_gudong(*args, **kwargs):
+    return submit_http_data(async_get_gudong, *args, **kwargs)
+
+
 @add_doc(async_get_gudong_count.__doc__)
 def get_gudong_count(*args, **kwargs):
     ret = fetch_http_data(async_get_gudong_count, *args, **kwargs)
@@ -176,6 +187,47 @@ def get_gudong_count(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_gudong_count.__doc__)
+def submit_gudong_count(*args, **kwargs):
+    return submit_http_data(async_get_gudong_count, *args, **kwargs)
+
+
+def load_gudong(
+    data_path,
+    gd_type,
+    symbols=None,
+    columns=None,
+    start=None,
+    end=None,
+    date_column=None,
+):
+    """从数据保存路径读取股东数据，不访问网络
+
+    :param data_path: 数据保存路径
+    :param gd_type: 股东类型，见 `async_get_gudong`
+    :param symbols: 股票代码或代码列表，`None` 表示所有已保存的股票
+    :param columns: 要读取的列，`None` 表示所有列
+    :param start: 开始时间（包含），按 date_column 过滤
+    :param end: 截止时间（包含），按 date_column 过滤
+    :param date_column: 日期列，按时间过滤时需要指定
+
+    :returns: `pandas.DataFrame` ，symbols 为多个代码时增加 symbol 列
+    """
+    assert gd_type in GUDONG_TYPES
+    data_dir = Path(data_path) / MODULE_DATA_DIR / "gudong"
+    return load_records(
+        f"gudong_{gd_type}",
+        data_dir,
+        data_path,
+        symbols,
+        gd_type,
+        columns,
+        start,
+        end,
+        date_column,
+    )
+
+
 @click.option("-s", "--symbol", required=True)
 @click.option(
     "-t",
@@ -33,15 +33,18 @@
 
 加载::
 
-    from pathlib import Path
-    import pandas as pd
+    from fintie.stock import load_hist_quotes
 
-    with Path('data.json').open(encoding="utf-8") as f:
-        quotes = json.load(f)
+    df = load_hist_quotes(data_path, "SZ002353", start="2015-01-01", freq="day")
+    # 多只股票，以 (symbol, timestamp) 为索引
+    df = load_hist_quotes(data_path, ["SZ002353", "SZ000001"], columns=["close"])
 
-    df = pd.DataFrame(data=quotes['item'], column=quotes['column'])
-    df.timestamp = pd.to_datetime(df.timestamp, unit='ms')
-    df.set_index('timestamp', inplace=True)
+配置 ``"hist_quotes_store": "bars"`` 后，数据改为保存到 `fintie.store.bars`
+的列式存储中，按 timestamp 合并去重，读取::
+
+    from fintie.store import read_bars
+
+    df = read_bars(data_path, "SZ002353", "day", "before", start="2015-01-01")
 
 TODO
 
@@ -53,8 +56,7 @@ TODO
 
       Get http://quotes.money.163.com/service/chddata.html?code=1000333&start=20130918&end=20180803&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;TURNOVER;VOTURNOVER;VATURNOVER;TCAP;MCAP
 """
-import os
-import json
+import asyncio
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -63,12 +65,40 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import parse_dt, fetch_http_data, add_doc
+from ..config import get_config
+from ..env import warm_up
+from ..utils import (
+    parse_dt,
+    fetch_http_data,
+    fetch_http_iter,
+    submit_http_data,
+    run_batch,
+    add_doc,
+)
+from ..utils.http import fetch_json, error_code_ok, FetchError
+from ..store.writer import async_save_data, async_submit_write, read_data
+from ..store.bars import (
+    bars_dir,
+    write_bars,
+    read_bars,
+    read_bars_many,
+    last_bar_timestamp,
+    _to_timestamp,
+    _empty_many,
+)
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["async_get_hist_quotes", "get_hist_quotes"]
+__all__ = [
+    "async_get_hist_quotes",
+    "get_hist_quotes",
+    "submit_hist_quotes",
+    "async_sync_hist_quotes",
+    "sync_hist_quotes",
+    "async_get_hist_quotes_many",
+    "get_hist_quotes_many",
+    "load_hist_quotes",
+]
 
 
 SUPPORTED_FREQ = (
@@ -85,13 +115,18 @@ SUPPORTED_FREQ = (
     "year",
 )
 FQ_TYPE = ("before", "after", "normal")
+KLINE_PAGE_SIZE = 1000
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
+
+
+def _quotes_to_df(quotes):
+    df = pd.DataFrame(data=quotes["item"], columns=quotes["column"])
+    df.timestamp = pd.to_datetime(df.timestamp, unit="ms")
+    df.set_index("timestamp", inplace=True)
+    return df
 
 
 async def async_get_hist_quotes(
@@ -129,19 +164,26 @@ async def async_get_hist_quotes(
         "count": count,
         "indicator": "kline,ma,macd,kdj,boll,rsi,wr,bias,cci,psy",
     }
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get history quotes from %s failed: %s", url, resp.status)
-            return None
-        data = await resp.json()
-        if data.get("error_code", -1) != 0:
-            logger.warning("get history quotes from %s failed: %s", url, resp.status)
-            return None
-        quotes = data.get("data", {})
-
-    if data_path:
+    try:
+        data = await fetch_json(session, url, params=params, validate=error_code_ok)
+    except FetchError as e:
+        logger.warning("get history quotes from %s failed: %s", url, e)
+        return None
+    if data.get("error_code", -1) != 0:
+        logger.warning(
+            "get history quotes from %s failed, error_code: %s",
+            url,
+            data.get("error_code"),
+        )
+        return None
+    quotes = data.get("data", {})
+
+    df = None
+    if data_path and get_config("hist_quotes_store", "json") == "bars":
+        df = _quotes_to_df(quotes)
+        await _save_bars(data_path, symbol, freq, fq_type, df)
+    elif data_path:
         file_path = Path(data_path) / MODULE_DATA_DIR / symbol / "hist_quotes"
-        os.makedirs(file_path, exist_ok=True)
         data_fname = (
             "-".join(
                 (symbol, freq, ref_dt.strftime("%Y%m%d%H%M%S"), str(count), fq_type)
@@ -149,16 +191,17 @@ async def async_get_hist_quotes(
             + ".json"
         )
         data_file = file_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(quotes, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(
+            quotes,
+            data_file,
+            dataset="hist_quotes",
+            symbol=symbol,
+            params={"freq": freq, "fq_type": fq_type, "count": count},
+        )
 
     if not return_df:
         return quotes
-
-    df = pd.DataFrame(data=quotes["item"], columns=quotes["column"])
-    df.timestamp = pd.to_datetime(df.timestamp, unit="ms")
-    df.set_index("timestamp", inplace=True)
-    return df
+    return df if df is not None else _quotes_to_df(quotes)
 
 
 @add_doc(async_get_hist_quotes.__doc__)
@@ -169,10 +212,358 @@ def get_hist_quotes(*args, **kwargs):
     return ret
 
 
-@click.option("-s", "--symbol", required=True)
+@add_doc(async_get_hist_quotes.__doc__)
+def submit_hist_quotes(*args, **kwargs):
+    return submit_http_data(async_get_hist_quotes, *args, **kwargs)
+
+
+def _to_utc(dt):
+    """转为与行情 timestamp 一致的 UTC 时间，不带时区的时间按北京时间处理"""
+    if isinstance(dt, str):
+        dt = parse_dt(dt)
+    return _to_timestamp(dt)
+
+
+async def _page_backward(session, symbol, end_dt, freq, fq_type, start_dt=None):
+    """从 end_dt 向前翻页获取行情，直到 start_dt 或者没有更多数据，失败返回 `None`"""
+    if start_dt is not None:
+        start_dt = _to_utc(start_dt)
+    dfs = []
+    ref_dt = end_dt
+    while True:
+        df = await async_get_hist_quotes(
+            session, symbol, ref_dt, -KLINE_PAGE_SIZE, freq, fq_type
+        )
+        if df is None:
+            return None
+        page_len = len(df)
+        if dfs:
+            df = df[df.index < dfs[-1].index.min()]
+        if df.empty:
+            break
+        dfs.append(df)
+        earliest = df.index.min()
+        if page_len < KLINE_PAGE_SIZE:
+            break
+        if start_dt is not None and earliest <= start_dt:
+            break
+        ref_dt = earliest - pd.Timedelta(seconds=1)
+
+    if not dfs:
+        return pd.DataFrame()
+    df = pd.concat(dfs[::-1]).sort_index()
+    if start_dt is not None:
+        df = df[df.index >= start_dt]
+    return df
+
+
+def _import_json_quotes(data_path, symbol, freq, fq_type):
+    """将以前保存的行情文件导入行情存储"""
+    df = _load_json_quotes(data_path, symbol, freq, fq_type)
+    if not df.empty:
+        write_bars(data_path, symbol, freq, fq_type, df)
+        logger.info("imported %s saved bars of %s into the bar store", len(df), symbol)
+
+
+async def _save_bars(data_path, symbol, freq, fq_type, df, replace=False, wait=False):
+    """交给后台写入行情存储，同一只股票的写入按顺序执行"""
+    future = await async_submit_write(
+        write_bars,
+        data_path,
+        symbol,
+        freq,
+        fq_type,
+        df,
+        replace=replace,
+        key=str(bars_dir(data_path, symbol, freq, fq_type)),
+    )
+    if wait:
+        return await asyncio.wrap_future(future)
+    return future
+
+
+async def _sync_one(session, symbol, data_path, freq, fq_type, start_dt):
+    last = last_bar_timestamp(data_path, symbol, freq, fq_type)
+    if last is None:
+        future = await async_submit_write(
+            _import_json_quotes,
+            data_path,
+            symbol,
+            freq,
+            fq_type,
+            key=str(bars_dir(data_path, symbol, freq, fq_type)),
+        )
+        await asyncio.wrap_future(future)
+        last = last_bar_timestamp(data_path, symbol, freq, fq_type)
+    if last is None:
+        df = await _page_backward(
+            session, symbol, datetime.now(), freq, fq_type, start_dt
+        )
+        if df is None:
+            return None
+        await _save_bars(data_path, symbol, freq, fq_type, df, wait=True)
+        return len(df)
+
+    dfs = []
+    ref_dt = last
+    first_page = True
+    while True:
+        df = await async_get_hist_quotes(
+            session, symbol, ref_dt, KLINE_PAGE_SIZE, freq, fq_type
+        )
+        if df is None:
+            return None
+        page_len = len(df)
+        if first_page and fq_type == "before" and last in df.index:
+            # 除权除息后前复权的历史价格全部改变，需要重新获取；
+            # 比较开盘价是因为保存的最后一条可能是盘中未完成的行情
+            # 保存的 timestamp 为 UTC 时间
+            last_utc = last.tz_localize("UTC")
+            stored = read_bars(
+                data_path, symbol, freq, fq_type, last_utc, last_utc, columns=["open"]
+            )
+            if not stored.empty and abs(stored.open.iloc[0] - df.open[last]) > 1e-6:
+                logger.info("%s %s adjusted, refetch all quotes", symbol, freq)
+                full_df = await _page_backward(
+                    session, symbol, datetime.now(), freq, fq_type, start_dt
+                )
+                if full_df is None:
+                    return None
+                await _save_bars(
+                    data_path, symbol, freq, fq_type, full_df, replace=True, wait=True
+                )
+                return len(full_df)
+        # 第一页包含最后一条已保存的行情，覆盖保存以更新盘中未完成的行情
+        df = df[df.index >= ref_dt] if first_page else df[df.index > ref_dt]
+        first_page = False
+        if df.empty:
+            break
+        dfs.append(df)
+        if page_len < KLINE_PAGE_SIZE:
+            break
+        ref_dt = df.index.max()
+
+    if not dfs:
+        return 0
+    df = pd.concat(dfs)
+    await _save_bars(data_path, symbol, freq, fq_type, df, wait=True)
+    return int((df.index > last).sum())
+
+
+async def async_sync_hist_quotes(
+    session,
+    symbols,
+    data_path,
+    freq="day",
+    fq_type="before",
+    start_dt=None,
+    concurrency=8,
+):
+    """增量同步行情数据到 `fintie.store.bars` 行情存储
+
+    对每个 (symbol, freq, fq_type) 只请求已保存的最后一条行情之后的数据；
+    还没有保存过的股票会先导入以前保存的 json 文件，没有的话获取全部历史行情；
+    前复权的行情在除权除息后会重新获取全部历史行情。
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param symbols: 股票代码或者股票代码列表
+    :param data_path: 数据保存路径
+    :param freq: 数据频率：1m/5m/15m/30m/60m/120m/day/week/month/quarter/year
+    :param fq_type: before/after/normal 前复权、后复权、不复权
+    :param start_dt: 获取全部历史行情时的开始时间，默认不限制
+    :param concurrency: 同时同步的股票数上限
+
+    :returns: {symbol: 新增的行情条数} ，同步失败的股票值为 `None`
+    """
+    assert freq in SUPPORTED_FREQ
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    await _init(session)
+    sem = asyncio.Semaphore(max(int(concurrency), 1))
+
+    async def sync_one(symbol):
+        async with sem:
+            try:
+                return await _sync_one(
+                    session, symbol, data_path, freq, fq_type, start_dt
+                )
+            except Exception as e:
+                logger.warning("sync history quotes for %s failed: %r", symbol, e)
+                return None
+
+    results = await asyncio.gather(*[sync_one(symbol) for symbol in symbols])
+    return dict(zip(symbols, results))
+
+
+@add_doc(async_sync_hist_quotes.__doc__)
+def sync_hist_quotes(*args, **kwargs):
+    ret = fetch_http_data(async_sync_hist_quotes, *args, **kwargs)
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
+
+
+async def async_get_hist_quotes_many(
+    session,
+    symbols,
+    start_dt,
+    end_dt=None,
+    freq="day",
+    fq_type="before",
+    data_path=None,
+    concurrency=8,
+):
+    """并发获取多只股票一段时间内的行情，自动向前翻页直到覆盖整个时间范围
+
+    这是一个异步生成器，每只股票获取完成后立即产生 ``(symbol, df)`` ::
+
+        async for symbol, df in async_get_hist_quotes_many(session, symbols, start):
+            ...
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param symbols: 股票代码列表
+    :param start_dt: 开始时间
+    :param end_dt: 截止时间，默认为当前时间
+    :param freq: 数据频率：1m/5m/15m/30m/60m/120m/day/week/month/quarter/year
+    :param fq_type: before/after/normal 前复权、后复权、不复权
+    :param data_path: 数据保存路径，指定时保存到 `fintie.store.bars` 行情存储
+    :param concurrency: 同时获取的股票数上限
+
+    :returns: 以 timestamp 为索引的 `pandas.DataFrame` ，获取失败的股票为 `None`
+    """
+    assert freq in SUPPORTED_FREQ
+    if isinstance(start_dt, str):
+        start_dt = parse_dt(start_dt)
+    if end_dt is None:
+        end_dt = datetime.now()
+    elif isinstance(end_dt, str):
+        end_dt = parse_dt(end_dt)
+    await _init(session)
+    sem = asyncio.Semaphore(max(int(concurrency), 1))
+
+    async def get_one(symbol):
+        async with sem:
+            try:
+                df = await _page_backward(
+                    session, symbol, end_dt, freq, fq_type, start_dt
+                )
+            except Exception as e:
+                logger.warning("get history quotes for %s failed: %r", symbol, e)
+                df = None
+        if df is not None and data_path:
+            await _save_bars(data_path, symbol, freq, fq_type, df)
+        return symbol, df
+
+    tasks = [asyncio.ensure_future(get_one(symbol)) for symbol in symbols]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_hist_quotes_many(*args, **kwargs):
+    """`async_get_hist_quotes_many` 的同步接口，返回一个生成器::
+
+        for symbol, df in get_hist_quotes_many(symbols, "2010-01-01"):
+            ...
+    """
+    return fetch_http_iter(async_get_hist_quotes_many, *args, **kwargs)
+
+
+def _load_json_quotes(data_path, symbol, freq, fq_type):
+    """合并以 json 等格式保存的行情文件"""
+    file_path = Path(data_path) / MODULE_DATA_DIR / symbol / "hist_quotes"
+    dfs = [
+        _quotes_to_df(quotes)
+        for quotes in map(
+            read_data, sorted(file_path.glob(f"{symbol}-{freq}-*-{fq_type}.*"))
+        )
+        if quotes.get("item")
+    ]
+    if not dfs:
+        return pd.DataFrame()
+    df = pd.concat(dfs, sort=False)
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+def load_hist_quotes(
+    data_path, symbols, start=None, end=None, freq="day", fq_type="before", columns=None
+):
+    """从数据保存路径读取历史行情，不访问网络
+
+    优先读取行情存储（`fintie.store.bars`）中的数据，时间范围及列的选择下推到文件读取；
+    没有导入行情存储的股票读取以前保存的行情文件
+
+    :param data_path: 数据保存路径
+    :param symbols: 股票代码或代码列表
+    :param start: 开始时间（包含），不带时区时按北京时间，`None` 表示不限制
+    :param end: 截止时间（包含），不带时区时按北京时间，`None` 表示不限制
+    :param freq: 行情周期
+    :param fq_type: 复权类型
+    :param columns: 要读取的列，`None` 表示所有列
+    :returns: symbols 为单个代码时返回与 `async_get_hist_quotes` 相同的以 timestamp
+              为索引的 `pandas.DataFrame` ，否则以 (symbol, timestamp) 为索引
+    """
+    single = isinstance(symbols, str)
+    if single:
+        symbols = [symbols]
+    stored = [
+        symbol
+        for symbol in symbols
+        if bars_dir(data_path, symbol, freq, fq_type).is_dir()
+    ]
+    dfs = []
+    if stored:
+        dfs.append(read_bars_many(data_path, stored, freq, fq_type, start, end, columns))
+    for symbol in symbols:
+        if symbol in stored:
+            continue
+        df = _load_json_quotes(data_path, symbol, freq, fq_type)
+        if df.empty:
+            continue
+        if start is not None:
+            df = df[df.index >= _to_utc(start)]
+        if end is not None:
+            df = df[df.index <= _to_utc(end)]
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        dfs.append(pd.concat({symbol: df}, names=["symbol", "timestamp"]))
+    if not dfs:
+        dfs.append(_empty_many(columns))
+    df = pd.concat(dfs, sort=False)
+    if single:
+        return df.droplevel("symbol")
+    return df.sort_index()
+
+
+def _parse_symbols(symbols, symbol_file=None):
+    """合并命令行参数及文件中的股票代码，参数中可以用逗号分隔多个代码"""
+    lines = list(symbols)
+    if symbol_file is not None:
+        lines.extend(line.split("#")[0] for line in symbol_file)
+    parsed = []
+    for line in lines:
+        for symbol in line.replace(",", " ").split():
+            if symbol not in parsed:
+                parsed.append(symbol)
+    return parsed
+
+
+@click.option(
+    "-s", "--symbol", "symbols", multiple=True, help="股票代码，可以指定多次或用逗号分隔"
+)
+@click.option(
+    "-sf",
+    "--symbol-file",
+    type=click.File(encoding="utf-8"),
+    help="股票代码文件，每行一个或多个代码",
+)
 @click.option(
     "-ed", "--end-dt", default=str(datetime.now()), show_default=True, help="行情截止时间"
 )
+@click.option("-st", "--start-dt", default=None, help="行情开始时间，指定时按时间范围获取")
 @click.option("-c", "--count", default=200, show_default=True, help="行情条数")
 @click.option(
     "-fq",
@@ -198,17 +589,100 @@ def get_hist_quotes(*args, **kwargs):
 @click.option("-p/-np", "--print/--no-print", "show", default=True)
 @stock_cli_group.command("hist-quotes")
 @click.pass_context
-def hist_quotes_cli(ctx, symbol, end_dt, count, freq, fq_type, save_path, show):
+def hist_quotes_cli(
+    ctx,
+    symbols,
+    symbol_file,
+    end_dt,
+    start_dt,
+    count,
+    freq,
+    fq_type,
+    save_path,
+    show,
+):
     """从雪球获取历史行情数据
 
     day 以下的 freq 会有条数和时间限制，只能获取最近的数据
+
+    指定 start-dt 时自动翻页获取 start-dt 到 end-dt 之间的全部行情，
+    并保存到行情存储（需要安装 pyarrow），否则获取 end-dt 之前 count 条行情
     """
     if not save_path:
         save_path = ctx.obj["data_path"]
+    symbols = _parse_symbols(symbols, symbol_file)
+    if not symbols:
+        raise click.UsageError("请通过 --symbol 或 --symbol-file 指定股票代码")
     end_dt = parse_dt(end_dt)
-    data = get_hist_quotes(symbol, end_dt, -count, freq, fq_type, save_path)
-    if show:
-        click.echo(data)
+    if start_dt:
+        items = get_hist_quotes_many(
+            symbols, parse_dt(start_dt), end_dt, freq, fq_type, save_path
+        )
+    elif len(symbols) == 1:
+        data = get_hist_quotes(symbols[0], end_dt, -count, freq, fq_type, save_path)
+        items = [(symbols[0], data)]
+    else:
+        calls = [
+            (async_get_hist_quotes, (symbol, end_dt, -count, freq, fq_type, save_path))
+            for symbol in symbols
+        ]
+        items = zip(symbols, run_batch(calls))
+    for symbol, data in items:
+        if show:
+            click.echo(f"{symbol}:")
+            click.echo(data)
+
+
+@click.option(
+    "-s", "--symbol", "symbols", multiple=True, help="股票代码，可以指定多次或用逗号分隔"
+)
+@click.option(
+    "-sf",
+    "--symbol-file",
+    type=click.File(encoding="utf-8"),
+    help="股票代码文件，每行一个或多个代码",
+)
+@click.option(
+    "-fq",
+    "--freq",
+    default="day",
+    type=click.Choice(SUPPORTED_FREQ),
+    show_default=True,
+    help="行情的频率",
+)
+@click.option(
+    "-ft",
+    "--fq-type",
+    default="before",
+    type=click.Choice(FQ_TYPE),
+    show_default=True,
+    help="复权类型",
+)
+@click.option("-st", "--start-dt", default=None, help="首次同步的行情开始时间")
+@click.option("-c", "--concurrency", default=8, show_default=True, help="并发数")
+@click.option(
+    "-f",
+    "--save-path",
+    type=click.Path(exists=False)
+)
+@stock_cli_group.command("hist-sync")
+@click.pass_context
+def hist_sync_cli(
+    ctx, symbols, symbol_file, freq, fq_type, start_dt, concurrency, save_path
+):
+    """增量同步历史行情数据到行情存储"""
+    if not save_path:
+        save_path = ctx.obj["data_path"]
+    symbols = _parse_symbols(symbols, symbol_file)
+    if not symbols:
+        raise click.UsageError("请通过 --symbol 或 --symbol-file 指定股票代码")
+    if start_dt:
+        start_dt = parse_dt(start_dt)
+    data = sync_hist_quotes(
+        symbols, save_path, freq, fq_type, start_dt, concurrency=concurrency
+    )
+    for symbol, cnt in data.items():
+        click.echo(f"{symbol}: {'failed' if cnt is None else cnt}")
 
 
 if __name__ == "__main__":
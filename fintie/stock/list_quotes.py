@@ -23,22 +23,14 @@
 
 加载已保存的数据::
 
-    import pandas as pd
-    from pathlib import Path
+    from fintie.stock import load_list_quotes
 
-    df = pd.read_json(Path('20181018165415.json')
-    df.set_index(["symbol"], inplace=True)
-    # df.drop_duplicates(inplace=True)
-    df.apply(pd.to_numeric, errors="coerce") # convert to numertic types
-
-    # df['day'] = date.today()
-    # df["day"] = datetime.now().replace(hour=16, minute=0, second=0, microsecond=0)
-    # set index
-    # df.set_index(["symbol", "day"], inplace=True)
+    # 最新一次保存的行情一览
+    df = load_list_quotes(data_path, "stock", columns=["current", "percent"])
+    # 某个时间之前最近一次保存的行情一览
+    df = load_list_quotes(data_path, "stock", at="2018-10-18 16:00")
 """
-import os
 import time
-import json
 import copy
 import asyncio
 import logging
@@ -50,19 +42,24 @@ import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
 from ..config import get_config
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data
+from ..store.loader import read_columns
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["async_get_list_qutes", "get_list_quotes"]
+__all__ = [
+    "async_get_list_qutes",
+    "get_list_quotes",
+    "submit_list_quotes",
+    "load_list_quotes",
+]
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
 
 
 async def async_get_list_qutes(
@@ -113,13 +110,11 @@ async def async_get_list_qutes(
     logger.info("start download live quotes from xueqiu for %s...", data_type)
 
     async def fetch_one_page(url, params):
-        async with session.get(url, params=params) as resp:
-            if resp.status != 200:
-                logger.warning(
-                    "Download list_quotes from url %s failed: http %s", url, resp.status
-                )
-                return None
-            return await resp.json()
+        try:
+            return await fetch_json(session, url, params=params)
+        except FetchError as e:
+            logger.warning("Download list_quotes from url %s failed: %s", url, e)
+            return None
 
     def process_one_page(resp_json, quotes):
         if not resp_json:
@@ -171,11 +166,11 @@ async def async_get_list_qutes(
 
     if data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / "list_quotes"
-        os.makedirs(data_path, exist_ok=True)
         data_fname = data_type + "-" + datetime.now().strftime("%Y%m%d%H%M%S") + ".json"
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(quotes, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(
+            quotes, data_file, dataset="list_quotes", params={"data_type": data_type}
+        )
 
     if not return_df:
         return quotes
@@ -200,6 +195,43 @@ def get_list_quotes(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_list_qutes.__doc__)
+def submit_list_quotes(*args, **kwargs):
+    return submit_http_data(async_get_list_qutes, *args, **kwargs)
+
+
+def load_list_quotes(data_path, data_type="stock", symbols=None, columns=None, at=None):
+    """从数据保存路径读取行情一览，不访问网络
+
+    :param data_path: 数据保存路径
+    :param data_type: 同 `async_get_list_qutes`
+    :param symbols: 股票代码列表，`None` 表示所有股票
+    :param columns: 要读取的列，`None` 表示所有列
+    :param at: 读取此时间及之前最近一次保存的行情，`None` 表示最新一次
+
+    :returns: 与 `async_get_list_qutes` 相同的以 symbol 为索引的 `pandas.DataFrame` ，
+              没有保存的数据时返回空的 `pandas.DataFrame`
+    """
+    data_dir = Path(data_path) / MODULE_DATA_DIR / "list_quotes"
+    at_str = None if at is None else pd.Timestamp(at).strftime("%Y%m%d%H%M%S")
+    snapshots = [
+        fpath
+        for fpath in data_dir.glob(f"{data_type}-*")
+        if not fpath.name.startswith(".")
+        and (at_str is None or fpath.name.split(".")[0].split("-")[-1] <= at_str)
+    ]
+    if not snapshots:
+        return pd.DataFrame()
+    fpath = max(snapshots, key=lambda p: p.name)
+    if columns is not None:
+        columns = ["symbol"] + [col for col in columns if col != "symbol"]
+    df = read_columns(fpath, columns)
+    if symbols is not None:
+        df = df[df.symbol.isin(list(symbols))]
+    df.set_index(["symbol"], inplace=True)
+    return df.drop_duplicates()
+
+
 @click.option("-t", "--data-type", default="stock", show_default=True)
 @click.option(
     "-f",
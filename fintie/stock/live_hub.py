@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""实时行情发布/订阅
+
+进程内多个策略需要同一批股票的实时行情时，由 `LiveHub` 统一轮询，
+订阅者按股票代码及数据类型订阅，通过各自的 `asyncio.Queue` 接收更新，
+上游的请求数只取决于被订阅的 (数据类型, 股票) 的数量，与订阅者的数量无关::
+
+    from fintie.stock import LiveHub
+
+    hub = LiveHub(data_path, intervals={"pankou": 5, "live-info": 60})
+    asyncio.ensure_future(hub.run(session))
+
+    sub = hub.subscribe(["SZ002353", "SH600000"], ["pankou", "trades"])
+    async for quote_type, symbol, data in sub:
+        ...
+    sub.close()
+
+live-info/pankou 只在内容变化时发布，trades 只发布新的成交。
+
+每个订阅者的队列长度有限，队列满时按订阅时指定的策略处理：
+
+    * drop_oldest: 丢弃最早的一条，轮询不受慢订阅者影响，丢弃的条数见 `Subscription.dropped`
+    * block: 等待订阅者取走数据，同一 (数据类型, 股票) 的轮询暂停，不会丢失数据
+
+其他进程可以通过 Unix socket 订阅，``fintie stock live-hub`` 命令或
+``hub.run(session, socket_path=...)`` 启动服务后::
+
+    from fintie.stock import async_subscribe_unix
+
+    async for quote_type, symbol, data in async_subscribe_unix(path, ["SZ002353"]):
+        ...
+
+socket 协议为每行一个 json ，客户端连接后发送一行订阅请求
+``{"symbols": [...], "types": [...], "policy": "drop_oldest", "maxsize": 100}`` ，
+之后服务端每行发送一条 ``{"type": ..., "symbol": ..., "data": ...}`` 。
+"""
+import os
+import random
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+from collections import Counter
+
+import click
+
+from .cli import stock_cli_group
+from .live_watch import FETCHERS, _parse_intervals
+from .tick_collector import _new_ticks, _tick_key
+from .scheduler import MARKET_TZ, is_live, next_session
+from ..config import get_config
+from ..utils import submit_http_data
+from ..utils.codec import json_dumps, json_loads
+
+
+logger = logging.getLogger(__file__)
+__all__ = ["LiveHub", "Subscription", "async_subscribe_unix"]
+DEFAULT_INTERVALS = {"live-info": 60, "pankou": 5, "trades": 5}
+POLICIES = ("drop_oldest", "block")
+# 单行消息的最大长度
+LINE_LIMIT = 16 * 1024 * 1024
+_CLOSED = object()
+
+
+class Subscription(object):
+    """订阅，由 `LiveHub.subscribe` 创建
+
+    可以用 ``async for`` 遍历收到的 ``(数据类型, 股票代码, 数据)`` ，
+    调用 `close` 或者 hub 停止后遍历结束。
+    """
+
+    def __init__(self, hub, keys, maxsize, policy):
+        if policy not in POLICIES:
+            raise ValueError(f"不支持的策略: {policy}")
+        self.keys = frozenset(keys)
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+        self._hub = hub
+        self._closed_event = asyncio.Event()
+
+    def _put_nowait(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def _put(self, item):
+        if self.closed:
+            return
+        if self.policy != "block" or not self.queue.full():
+            self._put_nowait(item)
+            return
+        # 等待订阅者取走数据，订阅关闭时放弃
+        waiters = [
+            asyncio.ensure_future(self.queue.put(item)),
+            asyncio.ensure_future(self._closed_event.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def get(self):
+        """等待下一条更新
+
+        :returns: ``(数据类型, 股票代码, 数据)`` ，订阅关闭后返回 `None`
+        """
+        if self.closed and self.queue.empty():
+            return None
+        item = await self.queue.get()
+        if item is _CLOSED:
+            return None
+        return item
+
+    def close(self):
+        """取消订阅，没有订阅者的 (数据类型, 股票) 停止轮询"""
+        if self.closed:
+            return
+        self.closed = True
+        self._closed_event.set()
+        self._hub._remove(self)
+        if not self.queue.full():
+            # 唤醒正在等待的 `get`
+            self.queue.put_nowait(_CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+
+class LiveHub(object):
+    """实时行情发布/订阅中心
+
+    :param data_path: 数据保存路径，`None` 表示不保存
+    :param intervals: ``{数据类型: 刷新周期（秒）}`` ，数据类型为 live-info/pankou/trades
+    :param sessions_only: 是否只在交易时段内轮询
+    """
+
+    def __init__(self, data_path=None, intervals=None, sessions_only=False):
+        self.data_path = data_path
+        self.intervals = dict(DEFAULT_INTERVALS)
+        self.intervals.update(intervals or {})
+        for quote_type in self.intervals:
+            if quote_type not in FETCHERS:
+                raise ValueError(f"不支持的数据类型: {quote_type}")
+        self.sessions_only = sessions_only
+        self._subs = {}
+        self._pollers = {}
+        self._session = None
+        self._loop = None
+        self._stop_event = None
+        self._stopped = False
+        self._counts = Counter()
+
+    def subscribe(
+        self, symbols, quote_types=("live-info",), maxsize=100, policy="drop_oldest"
+    ):
+        """订阅实时行情，需要在 hub 运行的事件循环中调用
+
+        :param symbols: 股票代码或代码列表
+        :param quote_types: 数据类型列表，live-info/pankou/trades
+        :param maxsize: 队列长度
+        :param policy: 队列满时的策略，drop_oldest/block
+        :returns: `Subscription` 对象
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        if isinstance(quote_types, str):
+            quote_types = [quote_types]
+        for quote_type in quote_types:
+            if quote_type not in self.intervals:
+                raise ValueError(f"不支持的数据类型: {quote_type}")
+        keys = [
+            (quote_type, symbol) for quote_type in quote_types for symbol in symbols
+        ]
+        sub = Subscription(self, keys, maxsize, policy)
+        for key in sub.keys:
+            self._subs.setdefault(key, set()).add(sub)
+            self._start_poller(key)
+        return sub
+
+    def _remove(self, sub):
+        for key in sub.keys:
+            subs = self._subs.get(key)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._subs[key]
+                poller = self._pollers.pop(key, None)
+                if poller is not None:
+                    poller.cancel()
+
+    def _start_poller(self, key):
+        if self._stop_event is None or self._stopped or key in self._pollers:
+            return
+        self._pollers[key] = asyncio.ensure_future(self._poll(key))
+
+    async def _sleep(self, delay):
+        """等待 delay 秒，hub 停止时提前返回"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll(self, key):
+        quote_type, symbol = key
+        interval = self.intervals[quote_type]
+        fetcher = FETCHERS[quote_type]
+        loop = asyncio.get_event_loop()
+        last_hash = None
+        last_keys = []
+        # 错开各个轮询的第一次请求
+        await self._sleep(random.uniform(0, interval))
+        while not self._stopped:
+            if self.sessions_only and not is_live():
+                start, _ = next_session()
+                delay = (start - datetime.now(MARKET_TZ)).total_seconds()
+                await self._sleep(max(delay, 0) + random.uniform(0, interval))
+                continue
+            started = loop.time()
+            self._counts[f"{quote_type}_requests"] += 1
+            try:
+                data = await asyncio.wait_for(
+                    fetcher(self._session, symbol, self.data_path), interval
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("poll %s of %s failed: %r", quote_type, symbol, e)
+                data = None
+            if data is None:
+                self._counts[f"{quote_type}_failed"] += 1
+            elif quote_type == "trades":
+                items = sorted(data.get("items") or [], key=lambda x: x["timestamp"])
+                new, _ = _new_ticks(last_keys, items)
+                if items:
+                    last_keys = [_tick_key(item) for item in items]
+                if new:
+                    await self._publish(key, new)
+            else:
+                content_hash = hashlib.sha1(
+                    json_dumps(data, compact=True).encode("utf-8")
+                ).hexdigest()
+                if content_hash != last_hash:
+                    last_hash = content_hash
+                    await self._publish(key, data)
+            await self._sleep(interval - (loop.time() - started))
+
+    async def _publish(self, key, data):
+        self._counts[f"{key[0]}_published"] += 1
+        item = (key[0], key[1], data)
+        blocked = []
+        for sub in list(self._subs.get(key, ())):
+            if sub.policy == "block" and sub.queue.full() and not sub.closed:
+                blocked.append(sub)
+            elif not sub.closed:
+                sub._put_nowait(item)
+        # 不需要等待的订阅者先收到数据，不受阻塞策略的慢订阅者影响
+        if blocked:
+            await asyncio.gather(*[sub._put(item) for sub in blocked])
+
+    def stats(self):
+        """发布统计
+
+        :returns: 每种数据类型的请求、失败、发布次数，订阅者数，轮询数及丢弃的更新数
+        """
+        result = dict(self._counts)
+        subs = {sub for key_subs in self._subs.values() for sub in key_subs}
+        result["subscribers"] = len(subs)
+        result["pollers"] = len(self._pollers)
+        result["dropped"] = sum(sub.dropped for sub in subs)
+        return result
+
+    def stop(self):
+        """停止 hub ，所有订阅结束，可以在其他线程中调用"""
+        self._stopped = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _handle_client(self, reader, writer):
+        sub = closer = None
+        try:
+            request = json_loads(await reader.readline())
+            sub = self.subscribe(
+                request["symbols"],
+                request.get("types", ["live-info"]),
+                request.get("maxsize", 100),
+                request.get("policy", "drop_oldest"),
+            )
+            # 客户端断开时结束订阅
+            closer = asyncio.ensure_future(reader.read())
+            closer.add_done_callback(lambda _: sub.close())
+            async for quote_type, symbol, data in sub:
+                message = {"type": quote_type, "symbol": symbol, "data": data}
+                writer.write(json_dumps(message, compact=True).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("invalid live hub request: %r", e)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if closer is not None:
+                closer.cancel()
+            if sub is not None:
+                sub.close()
+            writer.close()
+
+    async def run(self, session, duration=None, socket_path=None):
+        """开始轮询被订阅的行情，直到 duration 秒后或调用 `stop`
+
+        :param session: `aiohttp.ClientSession` 对象
+        :param duration: 运行时长（秒），`None` 表示一直运行
+        :param socket_path: Unix socket 路径，指定时为其他进程提供订阅服务
+        :returns: `stats` 的返回值
+        """
+        self._loop = asyncio.get_event_loop()
+        self._stop_event = asyncio.Event()
+        self._stopped = False
+        self._session = session
+        for key in list(self._subs):
+            self._start_poller(key)
+        server = None
+        if socket_path:
+            socket_path = Path(socket_path).expanduser()
+            if socket_path.is_socket():
+                socket_path.unlink()
+            server = await asyncio.start_unix_server(
+                self._handle_client, str(socket_path), limit=LINE_LIMIT
+            )
+            logger.info("live hub listening on %s", socket_path)
+        try:
+            if duration is None:
+                await self._stop_event.wait()
+            else:
+                await self._sleep(duration)
+        finally:
+            self._stopped = True
+            self._stop_event.set()
+            # 清理之前统计，保留停止时的轮询数
+            stats = self.stats()
+            pollers = list(self._pollers.values())
+            self._pollers.clear()
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+            for sub in {sub for subs in self._subs.values() for sub in subs}:
+                sub.close()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+                if socket_path.is_socket():
+                    os.unlink(socket_path)
+            self._session = None
+        return stats
+
+
+async def async_subscribe_unix(
+    path, symbols, quote_types=("live-info",), maxsize=100, policy="drop_oldest"
+):
+    """通过 Unix socket 订阅其他进程中 `LiveHub` 发布的行情
+
+    :param path: `LiveHub` 的 Unix socket 路径
+    :param symbols: 股票代码或代码列表
+    :param quote_types: 数据类型列表，live-info/pankou/trades
+    :param maxsize: 服务端为本订阅保留的队列长度
+    :param policy: 服务端队列满时的策略，drop_oldest/block
+    :returns: 异步迭代器，依次返回 ``(数据类型, 股票代码, 数据)`` ，服务端停止时结束
+    """
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    if isinstance(quote_types, str):
+        quote_types = [quote_types]
+    reader, writer = await asyncio.open_unix_connection(
+        str(Path(path).expanduser()), limit=LINE_LIMIT
+    )
+    request = {
+        "symbols": list(symbols),
+        "types": list(quote_types),
+        "maxsize": maxsize,
+        "policy": policy,
+    }
+    try:
+        writer.write(json_dumps(request, compact=True).encode("utf-8") + b"\n")
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json_loads(line)
+            yield message["type"], message["symbol"], message["data"]
+    finally:
+        writer.close()
+
+
+@click.option(
+    "-i",
+    "--interval",
+    "intervals",
+    multiple=True,
+    help="数据类型及刷新周期，如 pankou=5 ，可以指定多次",
+)
+@click.option("-u", "--socket", "socket_path", type=click.Path(), help="Unix socket 路径")
+@click.option("-d", "--duration", type=float, default=None, help="运行时长（秒）")
+@click.option("-ts", "--sessions-only", is_flag=True, help="只在交易时段内轮询")
+@click.option("-f", "--save-path", type=click.Path(exists=False))
+@click.option("-ns", "--no-save", is_flag=True, help="不保存数据")
+@stock_cli_group.command("live-hub")
+@click.pass_context
+def live_hub_cli(
+    ctx, intervals, socket_path, duration, sessions_only, save_path, no_save
+):
+    """通过 Unix socket 为其他进程提供实时行情订阅"""
+    if not save_path:
+        save_path = ctx.obj["data_path"]
+    if not socket_path:
+        socket_path = get_config(
+            "live_hub_socket", str(Path(save_path).expanduser() / "live_hub.sock")
+        )
+    hub = LiveHub(
+        None if no_save else save_path, _parse_intervals(intervals), sessions_only
+    )
+    click.echo(f"live hub listening on {socket_path}")
+    future = submit_http_data(hub.run, duration, socket_path)
+    try:
+        stats = future.result()
+    except KeyboardInterrupt:
+        hub.stop()
+        stats = future.result()
+    click.echo(", ".join(f"{key} {value}" for key, value in sorted(stats.items())))
+
+
+if __name__ == "__main__":
+    live_hub_cli()
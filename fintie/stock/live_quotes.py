@@ -22,6 +22,10 @@
 
       https://stock.xueqiu.com/v5/stock/quote.json?symbol=SZ002353&extend=detail
 
+    * 批量基础信息，symbol 为逗号分隔的多个代码
+
+      https://stock.xueqiu.com/v5/stock/batch/quote.json?symbol=SZ002353,SH600000&extend=detail
+
     * 最近的 100 条成交记录
 
       https://stock.xueqiu.com/v5/stock/history/trade.json?symbol=SZ002353&count=100
@@ -47,6 +51,20 @@
         df.timestamp = pd.to_datetime(df.timestamp, unit="ms")
         df.set_index("timestamp", inplace=True)
 
+    配置 ``"trade_store": "ticks"`` 后，成交记录追加到 `fintie.store.ticks`
+    的逐笔成交文件中，与上次获取重叠的部分不会重复保存::
+
+        from fintie.store.ticks import read_ticks
+
+        ticks = read_ticks(data_path, "SZ002353", "20181019")
+
+快照去重
+
+    非交易时间或停牌股票的轮询会得到与上次完全相同的数据，保存前比较数据内容的哈希，
+    与该股票上一次保存的同类快照相同时不再写入文件，只计数，见 `snapshot_stats` 。
+    进程启动后第一次比较的是目录中最新的同类文件。
+    配置 ``"snapshot_dedup": false`` 关闭。
+
 
 TODO:
 
@@ -54,9 +72,11 @@ TODO:
 
       headers = {"X-Forwarded-For": ipAddress}
 """
-import os
 import json
+import asyncio
+import hashlib
 import logging
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 
@@ -64,8 +84,13 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..config import get_config
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, error_code_ok, FetchError
+from ..utils.codec import json_dumps
+from ..store.writer import async_save_data, read_data
+from ..store.ticks import get_tick_writer
 
 
 __all__ = [
@@ -75,17 +100,76 @@ __all__ = [
     "get_trade_info",
     "get_pankou",
     "get_live_info",
+    "submit_trade_info",
+    "submit_pankou",
+    "submit_live_info",
+    "async_get_live_info_many",
+    "get_live_info_many",
+    "submit_live_info_many",
+    "snapshot_stats",
 ]
 logger = logging.getLogger(__file__)
 INIT_URLS = ["https://xueqiu.com"]
 QUOTE_TYPES = ("pankou", "trades", "live-info")
+# (目录, 股票代码, 快照类型) -> 上次保存的快照内容哈希
+_snapshot_hashes = {}
+# 已提交写入但可能还没有完成的最新快照哈希
+_snapshot_pending = {}
+_snapshot_counter = Counter()
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
+
+
+def _content_hash(data):
+    return hashlib.sha1(json_dumps(data, compact=True).encode("utf-8")).hexdigest()
+
+
+def _saved_hash(data_dir, symbol, kind):
+    """目录中最新的同类快照的内容哈希，没有时返回 `None`"""
+    saved = sorted(
+        fpath
+        for fpath in data_dir.glob(f"{symbol}-{kind}-*")
+        if not fpath.name.startswith(".")
+    )
+    return _content_hash(read_data(saved[-1])) if saved else None
+
+
+async def _save_snapshot(data_dir, symbol, kind, data, data_file, dataset):
+    """快照与上次保存的相同时跳过，否则在后台写入，写入成功后才记录新快照的哈希"""
+    if not get_config("snapshot_dedup", True):
+        await async_save_data(data, data_file, dataset=dataset, symbol=symbol)
+        return
+    key = (str(data_dir), symbol, kind)
+    if key not in _snapshot_hashes:
+        loop = asyncio.get_event_loop()
+        digest = await loop.run_in_executor(None, _saved_hash, data_dir, symbol, kind)
+        _snapshot_hashes.setdefault(key, digest)
+    digest = _content_hash(data)
+    if digest == _snapshot_hashes[key]:
+        _snapshot_counter[f"{kind}_unchanged"] += 1
+        logger.debug("%s %s snapshot unchanged, skipped", symbol, kind)
+        return
+    _snapshot_counter[f"{kind}_written"] += 1
+    _snapshot_pending[key] = digest
+    future = await async_save_data(data, data_file, dataset=dataset, symbol=symbol)
+
+    def on_saved(future):
+        # 只记录最后提交的快照，先提交的写入晚完成时不覆盖
+        if future.exception() is None and _snapshot_pending.get(key) == digest:
+            _snapshot_hashes[key] = digest
+
+    future.add_done_callback(on_saved)
+
+
+def snapshot_stats():
+    """返回各类快照写入及因内容未变化跳过的次数
+
+    :returns: ``{"<类型>_written": 次数, "<类型>_unchanged": 次数}`` ，
+              类型为 trade/pankou/quotes
+    """
+    return dict(_snapshot_counter)
 
 
 async def async_get_trade_info(session, symbol, data_path=None, return_df=True):
@@ -102,21 +186,27 @@ async def async_get_trade_info(session, symbol, data_path=None, return_df=True):
 
     url = "https://stock.xueqiu.com/v5/stock/history/trade.json"
     params = {"symbol": symbol}
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get live trades from %s failed: %s", url, resp.status)
-            return None
-        data_json = await resp.json()
-        if data_json.get("error_code", -1) != 0:
-            logger.warning(
-                "get live trades from %s failed, error_code: %s", url, resp.status
-            )
-            return None
-        quotes = data_json["data"]
+    try:
+        data_json = await fetch_json(
+            session, url, params=params, validate=error_code_ok
+        )
+    except FetchError as e:
+        logger.warning("get live trades from %s failed: %s", url, e)
+        return None
+    if data_json.get("error_code", -1) != 0:
+        logger.warning(
+            "get live trades from %s failed, error_code: %s",
+            url,
+            data_json.get("error_code"),
+        )
+        return None
+    quotes = data_json["data"]
 
-    if data_path:
+    if data_path and get_config("trade_store", "json") == "ticks":
+        writer = get_tick_writer(data_path)
+        await writer.append_async(symbol, quotes.get("items"))
+    elif data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / symbol / "live_quotes"
-        os.makedirs(data_path, exist_ok=True)
         try:
             ref_dt = datetime.fromtimestamp(quotes["items"][0]["timestamp"] / 1000)
         except (KeyError, TypeError):
@@ -126,8 +216,9 @@ async def async_get_trade_info(session, symbol, data_path=None, return_df=True):
             "-".join((symbol, "trade", ref_dt.strftime("%Y%m%d%H%M%S"))) + ".json"
         )
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(quotes, dataf, indent=4, ensure_ascii=False)
+        await _save_snapshot(
+            data_path, symbol, "trade", quotes, data_file, "live_trade"
+        )
 
     if not return_df:
         return quotes
@@ -150,21 +241,24 @@ async def async_get_pankou(session, symbol, data_path=None):
 
     url = "https://stock.xueqiu.com/v5/stock/realtime/pankou.json"
     params = {"symbol": symbol}
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get live pankou from %s failed: %s", url, resp.status)
-            return None
-        data_json = await resp.json()
-        if data_json.get("error_code", -1) != 0:
-            logger.warning(
-                "get live pankou from %s failed, error_code: %s", url, resp.status
-            )
-            return None
-        quotes = data_json["data"]
+    try:
+        data_json = await fetch_json(
+            session, url, params=params, validate=error_code_ok
+        )
+    except FetchError as e:
+        logger.warning("get live pankou from %s failed: %s", url, e)
+        return None
+    if data_json.get("error_code", -1) != 0:
+        logger.warning(
+            "get live pankou from %s failed, error_code: %s",
+            url,
+            data_json.get("error_code"),
+        )
+        return None
+    quotes = data_json["data"]
 
     if data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / symbol / "live_quotes"
-        os.makedirs(data_path, exist_ok=True)
         try:
             ref_dt = datetime.fromtimestamp(quotes["timestamp"] / 1000)
         except (KeyError, TypeError):
@@ -174,8 +268,9 @@ async def async_get_pankou(session, symbol, data_path=None):
             "-".join((symbol, "pankou", ref_dt.strftime("%Y%m%d%H%M%S"))) + ".json"
         )
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(quotes, dataf, indent=4, ensure_ascii=False)
+        await _save_snapshot(
+            data_path, symbol, "pankou", quotes, data_file, "live_pankou"
+        )
 
     return quotes
 
@@ -193,34 +288,116 @@ async def async_get_live_info(session, symbol, data_path=None):
 
     url = "https://stock.xueqiu.com/v5/stock/quote.json"
     params = {"symbol": symbol, "extend": "detail"}
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.warning("get live trade info from %s failed: %s", url, resp.status)
-            return None
-        data_json = await resp.json()
+    try:
+        data_json = await fetch_json(
+            session, url, params=params, validate=error_code_ok
+        )
+    except FetchError as e:
+        logger.warning("get live trade info from %s failed: %s", url, e)
+        return None
+    if data_json.get("error_code", -1) != 0:
+        logger.warning(
+            "get live trade info from %s failed, error_code: %s",
+            url,
+            data_json.get("error_code"),
+        )
+        return None
+    quotes = data_json["data"]
+
+    if data_path:
+        await _save_live_info(data_path, symbol, quotes)
+
+    return quotes
+
+
+async def _save_live_info(data_path, symbol, quotes):
+    data_path = Path(data_path) / MODULE_DATA_DIR / symbol / "live_quotes"
+    try:
+        ref_dt = datetime.fromtimestamp(quotes["quote"]["timestamp"] / 1000)
+    except (KeyError, TypeError):
+        ref_dt = datetime.now()
+
+    data_fname = "-".join((symbol, "quotes", ref_dt.strftime("%Y%m%d%H%M%S"))) + ".json"
+    data_file = data_path / data_fname
+    await _save_snapshot(data_path, symbol, "quotes", quotes, data_file, "live_quote")
+
+
+async def async_get_live_info_many(
+    session, symbols, data_path=None, batch_size=None, return_df=True
+):
+    """批量获取多只股票最新的基本信息
+
+    每个请求查询 batch_size 只股票，批量接口失败或没有返回的股票再逐只获取
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param symbols: 股票代码列表
+    :param data_path: 数据保存路径
+    :param batch_size: 每个请求的股票数，默认由 live_batch_size 配置决定，默认 50
+    :param return_df: 是否返回 `pandas.DataFrame` 对象，False 返回原始数据
+
+    :returns: 以 symbol 为索引、每行为一只股票行情快照（quote）的 `pandas.DataFrame` ，
+              或 ``{symbol: 与 async_get_live_info 相同的基本信息数据}``
+    """
+    await _init(session)
+
+    symbols = list(dict.fromkeys(symbols))
+    batch_size = batch_size or get_config("live_batch_size", 50)
+    url = "https://stock.xueqiu.com/v5/stock/batch/quote.json"
+    results = {}
+
+    async def fetch_batch(batch):
+        params = {"symbol": ",".join(batch), "extend": "detail"}
+        try:
+            data_json = await fetch_json(
+                session, url, params=params, validate=error_code_ok
+            )
+        except FetchError as e:
+            logger.warning("get live info of %s symbols failed: %s", len(batch), e)
+            return
         if data_json.get("error_code", -1) != 0:
             logger.warning(
-                "get live trade info from %s failed, error_code: %s", url, resp.status
+                "get live info of %s symbols failed, error_code: %s",
+                len(batch),
+                data_json.get("error_code"),
             )
-            return None
-        quotes = data_json["data"]
+            return
+        for item in (data_json.get("data") or {}).get("items") or []:
+            symbol = (item.get("quote") or {}).get("symbol")
+            if symbol in batch:
+                results[symbol] = item
 
-    if data_path:
-        data_path = Path(data_path) / MODULE_DATA_DIR / symbol / "live_quotes"
-        os.makedirs(data_path, exist_ok=True)
-        try:
-            ref_dt = datetime.fromtimestamp(quotes["quote"]["timestamp"] / 1000)
-        except (KeyError, TypeError):
-            ref_dt = datetime.now()
+    batches = [
+        symbols[idx : idx + batch_size] for idx in range(0, len(symbols), batch_size)
+    ]
+    await asyncio.gather(*[fetch_batch(batch) for batch in batches])
 
-        data_fname = (
-            "-".join((symbol, "quotes", ref_dt.strftime("%Y%m%d%H%M%S"))) + ".json"
+    if data_path:
+        await asyncio.gather(
+            *[
+                _save_live_info(data_path, symbol, quotes)
+                for symbol, quotes in results.items()
+            ]
         )
-        data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(quotes, dataf, indent=4, ensure_ascii=False)
+    missing = [symbol for symbol in symbols if symbol not in results]
+    if missing:
+        logger.info("get live info of %s symbols one by one", len(missing))
+        quotes_list = await asyncio.gather(
+            *[async_get_live_info(session, symbol, data_path) for symbol in missing],
+            return_exceptions=True,
+        )
+        for symbol, quotes in zip(missing, quotes_list):
+            if quotes and not isinstance(quotes, Exception):
+                results[symbol] = quotes
 
-    return quotes
+    results = {symbol: results[symbol] for symbol in symbols if symbol in results}
+    if not return_df:
+        return results
+
+    df = pd.DataFrame(
+        [quotes.get("quote") or {} for quotes in results.values()],
+        index=pd.Index(list(results), name="symbol"),
+    )
+    return df.drop(columns="symbol", errors="ignore")
 
 
 @add_doc(async_get_trade_info.__doc__)
@@ -231,6 +408,11 @@ def get_trade_info(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_trade_info.__doc__)
+def submit_trade_info(*args, **kwargs):
+    return submit_http_data(async_get_trade_info, *args, **kwargs)
+
+
 @add_doc(async_get_pankou.__doc__)
 def get_pankou(*args, **kwargs):
     ret = fetch_http_data(async_get_pankou, *args, **kwargs)
@@ -239,6 +421,11 @@ def get_pankou(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_pankou.__doc__)
+def submit_pankou(*args, **kwargs):
+    return submit_http_data(async_get_pankou, *args, **kwargs)
+
+
 @add_doc(async_get_live_info.__doc__)
 def get_live_info(*args, **kwargs):
     ret = fetch_http_data(async_get_live_info, *args, **kwargs)
@@ -247,6 +434,24 @@ def get_live_info(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_live_info.__doc__)
+def submit_live_info(*args, **kwargs):
+    return submit_http_data(async_get_live_info, *args, **kwargs)
+
+
+@add_doc(async_get_live_info_many.__doc__)
+def get_live_info_many(*args, **kwargs):
+    ret = fetch_http_data(async_get_live_info_many, *args, **kwargs)
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
+
+
+@add_doc(async_get_live_info_many.__doc__)
+def submit_live_info_many(*args, **kwargs):
+    return submit_http_data(async_get_live_info_many, *args, **kwargs)
+
+
 @click.option("-s", "--symbol", required=True)
 @click.option(
     "-t", "--type", "quotes_type", type=click.Choice(QUOTE_TYPES), default="pankou"
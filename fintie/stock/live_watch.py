@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""实时行情轮询
+
+按固定周期轮询大量股票的实时行情，每种数据类型单独设置刷新周期::
+
+    from fintie.stock import LiveWatcher, watch_live_quotes
+
+    # 盘口 5 秒刷新一次，基本信息 60 秒刷新一次，运行 1 小时
+    stats = watch_live_quotes(
+        symbols, data_path, intervals={"pankou": 5, "live-info": 60}, duration=3600
+    )
+
+一个周期内的请求均匀分布在整个周期中，每个请求在自己的时间槽内随机抖动，
+避免所有请求同时发出；上一周期同一只股票的请求还没有完成时跳过本次请求，
+调度落后于周期截止时间时跳过本周期剩余的请求，请求超过一个周期没有返回时放弃，
+保证轮询不会越积越多。
+
+sessions_only 为 `True` 时只在交易时段内轮询，午间休市、收盘后及休市日等待下一个交易时段，
+见 `fintie.stock.scheduler` 。
+
+`LiveWatcher.stats` 返回每种数据类型的目标及实际刷新速率，运行中定期输出到日志。
+"""
+import time
+import random
+from datetime import datetime
+import asyncio
+import inspect
+import logging
+
+import click
+
+from .cli import stock_cli_group
+from .live_quotes import (
+    QUOTE_TYPES,
+    async_get_live_info,
+    async_get_pankou,
+    async_get_trade_info,
+)
+from .hist_quotes import _parse_symbols
+from .scheduler import MARKET_TZ, is_live, next_session
+from ..utils import fetch_http_data, submit_http_data, add_doc
+
+
+logger = logging.getLogger(__file__)
+__all__ = [
+    "LiveWatcher",
+    "async_watch_live_quotes",
+    "watch_live_quotes",
+    "submit_watch_live_quotes",
+]
+DEFAULT_INTERVALS = {"live-info": 60}
+
+
+async def _fetch_trades(session, symbol, data_path=None):
+    return await async_get_trade_info(session, symbol, data_path, return_df=False)
+
+
+FETCHERS = {
+    "live-info": async_get_live_info,
+    "pankou": async_get_pankou,
+    "trades": _fetch_trades,
+}
+
+
+class LiveWatcher(object):
+    """实时行情轮询器
+
+    :param symbols: 股票代码列表
+    :param data_path: 数据保存路径，`None` 表示不保存
+    :param intervals: ``{数据类型: 刷新周期（秒）}`` ，数据类型为 live-info/pankou/trades
+    :param on_data: 每次取到数据时的回调 ``on_data(quote_type, symbol, data)`` ，
+                    可以是协程函数
+    :param jitter: 请求在时间槽内随机抖动的比例，0 ~ 1
+    :param report_interval: 输出速率统计日志的间隔（秒），`None` 表示不输出
+    :param sessions_only: 是否只在交易时段内轮询
+    """
+
+    def __init__(
+        self,
+        symbols,
+        data_path=None,
+        intervals=None,
+        on_data=None,
+        jitter=0.5,
+        report_interval=60,
+        sessions_only=False,
+    ):
+        self.symbols = list(symbols)
+        self.data_path = data_path
+        self.intervals = dict(intervals or DEFAULT_INTERVALS)
+        for quote_type in self.intervals:
+            if quote_type not in FETCHERS:
+                raise ValueError(f"不支持的数据类型: {quote_type}")
+        self.on_data = on_data
+        self.jitter = min(max(jitter, 0), 1)
+        self.report_interval = report_interval
+        self.sessions_only = sessions_only
+        self._loop = None
+        self._stop_event = None
+        self._stopped = False
+        self._inflight = set()
+        self._started = None
+        self._counts = {
+            quote_type: dict.fromkeys(
+                ("requests", "ok", "failed", "timeout", "skipped", "cycles"), 0
+            )
+            for quote_type in self.intervals
+        }
+
+    def stats(self):
+        """每种数据类型的轮询统计
+
+        :returns: ``{数据类型: {...}}`` ，其中 target_rate/achieved_rate 为目标及实际的
+                  每秒成功请求数，refresh 为每只股票实际的平均刷新间隔（秒），
+                  其余为请求、成功、失败、超时、跳过的请求数及完成的周期数
+        """
+        elapsed = time.monotonic() - self._started if self._started else 0
+        result = {}
+        for quote_type, interval in self.intervals.items():
+            counts = dict(self._counts[quote_type])
+            counts["interval"] = interval
+            counts["target_rate"] = len(self.symbols) / interval
+            counts["achieved_rate"] = counts["ok"] / elapsed if elapsed else 0.0
+            counts["refresh"] = (
+                elapsed * len(self.symbols) / counts["ok"] if counts["ok"] else None
+            )
+            result[quote_type] = counts
+        return result
+
+    def stop(self):
+        """停止轮询，可以在其他线程中调用"""
+        self._stopped = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _sleep(self, delay):
+        """等待 delay 秒，轮询停止时提前返回"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _fetch_one(self, session, quote_type, symbol, timeout):
+        counts = self._counts[quote_type]
+        key = (quote_type, symbol)
+        self._inflight.add(key)
+        counts["requests"] += 1
+        try:
+            data = await asyncio.wait_for(
+                FETCHERS[quote_type](session, symbol, self.data_path), timeout
+            )
+        except asyncio.TimeoutError:
+            counts["timeout"] += 1
+            return
+        except Exception as e:
+            counts["failed"] += 1
+            logger.warning("poll %s of %s failed: %r", quote_type, symbol, e)
+            return
+        finally:
+            self._inflight.discard(key)
+        if data is None:
+            counts["failed"] += 1
+            return
+        counts["ok"] += 1
+        if self.on_data is None:
+            return
+        try:
+            ret = self.on_data(quote_type, symbol, data)
+            if inspect.isawaitable(ret):
+                await ret
+        except Exception as e:
+            logger.warning("on_data of %s %s failed: %r", quote_type, symbol, e)
+
+    async def _watch(self, session, quote_type, interval, tasks):
+        counts = self._counts[quote_type]
+        step = interval / len(self.symbols)
+        cycle_start = self._loop.time()
+        while not self._stopped:
+            if self.sessions_only and not is_live():
+                start, _ = next_session()
+                delay = (start - datetime.now(MARKET_TZ)).total_seconds()
+                logger.info("%s watch paused until %s", quote_type, start)
+                await self._sleep(max(delay, 0))
+                cycle_start = self._loop.time()
+                continue
+            deadline = cycle_start + interval
+            for idx, symbol in enumerate(self.symbols):
+                slot = cycle_start + step * (idx + random.uniform(0, self.jitter))
+                delay = slot - self._loop.time()
+                if delay > 0:
+                    await self._sleep(delay)
+                if self._stopped:
+                    return
+                if self._loop.time() >= deadline:
+                    # 调度已经落后一个周期，本周期剩余的请求不再发出
+                    counts["skipped"] += len(self.symbols) - idx
+                    break
+                if (quote_type, symbol) in self._inflight:
+                    counts["skipped"] += 1
+                    continue
+                task = asyncio.ensure_future(
+                    self._fetch_one(session, quote_type, symbol, interval)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            counts["cycles"] += 1
+            cycle_start = deadline
+            behind = self._loop.time() - cycle_start
+            if behind >= interval:
+                missed = int(behind // interval)
+                counts["skipped"] += missed * len(self.symbols)
+                cycle_start += missed * interval
+
+    async def _report(self):
+        while not self._stopped:
+            await self._sleep(self.report_interval)
+            for quote_type, stats in self.stats().items():
+                logger.info(
+                    "live watch %s: %.2f/%.2f req/s, refresh %s/%ss, "
+                    "failed %s, timeout %s, skipped %s",
+                    quote_type,
+                    stats["achieved_rate"],
+                    stats["target_rate"],
+                    "%.1f" % stats["refresh"] if stats["refresh"] else "-",
+                    stats["interval"],
+                    stats["failed"],
+                    stats["timeout"],
+                    stats["skipped"],
+                )
+
+    async def run(self, session, duration=None):
+        """开始轮询，直到 duration 秒后或调用 `stop`
+
+        :param session: `aiohttp.ClientSession` 对象
+        :param duration: 运行时长（秒），`None` 表示一直运行
+        :returns: `stats` 的返回值
+        """
+        if not self.symbols or not self.intervals:
+            return self.stats()
+        self._loop = asyncio.get_event_loop()
+        self._stop_event = asyncio.Event()
+        self._stopped = False
+        self._started = time.monotonic()
+        tasks = set()
+        watchers = [
+            asyncio.ensure_future(self._watch(session, quote_type, interval, tasks))
+            for quote_type, interval in self.intervals.items()
+        ]
+        if self.report_interval:
+            watchers.append(asyncio.ensure_future(self._report()))
+        try:
+            if duration is None:
+                await self._stop_event.wait()
+            else:
+                await self._sleep(duration)
+        finally:
+            self._stopped = True
+            self._stop_event.set()
+            await asyncio.gather(*watchers, return_exceptions=True)
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.stats()
+
+
+async def async_watch_live_quotes(
+    session, symbols, data_path=None, duration=None, **kwargs
+):
+    """轮询实时行情
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param symbols: 股票代码列表
+    :param data_path: 数据保存路径，`None` 表示不保存
+    :param duration: 运行时长（秒），`None` 表示一直运行
+    :param kwargs: 其他参数见 `LiveWatcher`
+    :returns: 每种数据类型的轮询统计，见 `LiveWatcher.stats`
+    """
+    watcher = LiveWatcher(symbols, data_path, **kwargs)
+    return await watcher.run(session, duration)
+
+
+@add_doc(async_watch_live_quotes.__doc__)
+def watch_live_quotes(*args, **kwargs):
+    ret = fetch_http_data(async_watch_live_quotes, *args, **kwargs)
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
+
+
+@add_doc(async_watch_live_quotes.__doc__)
+def submit_watch_live_quotes(*args, **kwargs):
+    return submit_http_data(async_watch_live_quotes, *args, **kwargs)
+
+
+def _parse_intervals(values):
+    intervals = {}
+    for value in values:
+        try:
+            quote_type, interval = value.split("=")
+            intervals[quote_type] = float(interval)
+        except ValueError:
+            raise click.BadParameter(f"{value} 格式应为 <数据类型>=<秒数>")
+        if quote_type not in QUOTE_TYPES or intervals[quote_type] <= 0:
+            raise click.BadParameter(f"{value} 无效，数据类型为 {'/'.join(QUOTE_TYPES)}")
+    return intervals
+
+
+@click.option(
+    "-s", "--symbol", "symbols", multiple=True, help="股票代码，可以指定多次或用逗号分隔"
+)
+@click.option(
+    "-sf",
+    "--symbol-file",
+    type=click.File(encoding="utf-8"),
+    help="股票代码文件，每行一个或多个代码",
+)
+@click.option(
+    "-i",
+    "--interval",
+    "intervals",
+    multiple=True,
+    default=["live-info=60"],
+    show_default=True,
+    help="数据类型及刷新周期，如 pankou=5 ，可以指定多次",
+)
+@click.option("-d", "--duration", type=float, default=None, help="运行时长（秒）")
+@click.option("-r", "--report", default=60, show_default=True, help="统计输出间隔（秒）")
+@click.option("-j", "--jitter", default=0.5, show_default=True, help="请求随机抖动比例")
+@click.option("-ts", "--sessions-only", is_flag=True, help="只在交易时段内轮询")
+@click.option("-f", "--save-path", type=click.Path(exists=False))
+@click.option("-ns", "--no-save", is_flag=True, help="不保存数据")
+@stock_cli_group.command("live-watch")
+@click.pass_context
+def live_watch_cli(
+    ctx,
+    symbols,
+    symbol_file,
+    intervals,
+    duration,
+    report,
+    jitter,
+    sessions_only,
+    save_path,
+    no_save,
+):
+    """按固定周期轮询大量股票的实时行情"""
+    symbols = _parse_symbols(symbols, symbol_file)
+    if not symbols:
+        raise click.UsageError("请通过 -s 或 -sf 指定股票代码")
+    if not save_path:
+        save_path = ctx.obj["data_path"]
+    watcher = LiveWatcher(
+        symbols,
+        None if no_save else save_path,
+        _parse_intervals(intervals),
+        jitter=jitter,
+        report_interval=report,
+        sessions_only=sessions_only,
+    )
+    future = submit_http_data(watcher.run, duration)
+    try:
+        stats = future.result()
+    except KeyboardInterrupt:
+        watcher.stop()
+        stats = future.result()
+    for quote_type, item in stats.items():
+        rate = f"{item['achieved_rate']:.2f}/{item['target_rate']:.2f}"
+        click.echo(
+            f"{quote_type}: {rate} req/s, "
+            f"ok {item['ok']}, failed {item['failed']}, timeout {item['timeout']}, "
+            f"skipped {item['skipped']}, cycles {item['cycles']}"
+        )
+
+
+if __name__ == "__main__":
+    live_watch_cli()
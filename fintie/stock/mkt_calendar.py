@@ -42,7 +42,6 @@
     with Path("xxx.json").open(encoding="utf-8") as f:
         data = json.load(f)
 """
-import os
 import json
 import asyncio
 import logging
@@ -50,13 +49,20 @@ from pathlib import Path
 from datetime import date, timedelta
 
 import click
-import aiohttp
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..utils import iter_dt, parse_dt, fetch_http_data, add_doc
+from ..utils import (
+    iter_dt,
+    parse_dt,
+    fetch_http_data,
+    submit_http_data,
+    add_doc,
+)
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data
 
 
-__all__ = ["async_get_market_events", "get_market_events"]
+__all__ = ["async_get_market_events", "get_market_events", "submit_market_events"]
 logger = logging.getLogger(__file__)
 
 
@@ -80,26 +86,40 @@ async def async_get_market_events(session, start, end, data_path=None):
     async def fetch_one_day(day_str):
         url = "http://www.cninfo.com.cn/cninfo-new/memo/memoQuery"
         try:
-            async with session.post(url, data={"queryDate": day_str}) as resp:
-                datas[day_str] = await resp.json()
-        except (aiohttp.ServerTimeoutError, asyncio.TimerHandle) as e:
+            datas[day_str] = await fetch_json(
+                session, url, method="POST", data={"queryDate": day_str}
+            )
+        except FetchError as e:
             logger.warning("Download calendar event data for %s failed：%s.", day_str, e)
+            failed_days.append(day_str)
 
     aws = []
+    failed_days = []
     for day in iter_dt(start, end, include_end=True):
         day_str = day.strftime("%Y-%m-%d")
         aws.append(fetch_one_day(day_str))
     await asyncio.gather(*aws, return_exceptions=True)
+    if failed_days:
+        logger.warning(
+            "calendar event data for %s days failed: %s",
+            len(failed_days),
+            sorted(failed_days),
+        )
     logger.info("calendar event data from %s to %s has been downloaded.", start, end)
 
     if data_path:
         file_path = Path(data_path) / MODULE_DATA_DIR / "market_events"
-        os.makedirs(file_path, exist_ok=True)
         data_file = (
             file_path / f"{start.strftime('%Y%m%d')}-{end.strftime('%Y%m%d')}.json"
         )
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(datas, dataf, indent=4, ensure_ascii=False)
+        data_file = await async_save_data(
+            datas,
+            data_file,
+            dataset="market_events",
+            start=start,
+            end=end,
+            wait=True,
+        )
         logger.info("calendar data has been saved to: %s", data_file)
     return datas
 
@@ -112,6 +132,11 @@ def get_market_events(*args, **kwargs):
     return ret
 
 
+@add_doc(async_get_market_events.__doc__)
+def submit_market_events(*args, **kwargs):
+    return submit_http_data(async_get_market_events, *args, **kwargs)
+
+
 @click.option(
     "-st", "--start", default=str(date.today() - timedelta(days=30)), show_default=True
 )
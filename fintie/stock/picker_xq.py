@@ -71,9 +71,7 @@
     # set index
     # df.set_index(["symbol", "day"], inplace=True)
 """
-import os
 import time
-import json
 import copy
 import asyncio
 import logging
@@ -84,19 +82,23 @@ import click
 import pandas as pd
 
 from .cli import stock_cli_group, MODULE_DATA_DIR
-from ..env import _init_in_session
-from ..utils import fetch_http_data, add_doc
+from ..env import warm_up
+from ..utils import fetch_http_data, submit_http_data, add_doc
+from ..utils.http import fetch_json, FetchError
+from ..store.writer import async_save_data
 
 
 logger = logging.getLogger(__file__)
-__all__ = ["async_pick_stocks", "async_get_field_values", "pick_stocks"]
+__all__ = [
+    "async_pick_stocks",
+    "async_get_field_values",
+    "pick_stocks",
+    "submit_pick_stocks",
+]
 
 
 async def _init(session, force=False):
-    if force or not _init_in_session.get("xueqiu"):
-        _init_in_session["xueqiu"] = True
-        await session.get("https://xueqiu.com")
-    return True
+    return await warm_up(session, "xueqiu", force)
 
 
 async def async_get_field_values(session, field, return_df=True):
@@ -110,16 +112,16 @@ async def async_get_field_values(session, field, return_df=True):
     params = {"category": "SH", "field": field}
     params["_"] = int(time.time() * 1000)
     data = []
-    async with session.get(url, params=params) as resp:
-        if resp.status != 200:
-            logger.error("pick stock from %s failed: %s", url, resp.status)
-            return None
+    try:
+        resp_json = await fetch_json(session, url, params=params)
+    except FetchError as e:
+        logger.error("pick stock from %s failed: %s", url, e)
+        return None
 
-        resp_json = await resp.json()
-        if "list" not in resp_json:
-            logger.error("pick stocks unknown result: %s", resp_json)
-        else:
-            data = resp_json["list"]
+    if "list" not in resp_json:
+        logger.error("pick stocks unknown result: %s", resp_json)
+    else:
+        data = resp_json["list"]
 
     if not return_df:
         return data
@@ -189,22 +191,22 @@ async def async_pick_stocks(session, filter_dict=None, data_path=None, return_df
         params["_"] = int(time.time() * 1000)
 
         logger.info("Fetching first page")
-        async with session.get(url, params=params) as resp:
-            if resp.status != 200:
-                logger.error("pick stock from %s failed: %s", url, resp.status)
-                return None
-
-            resp_json = await resp.json()
-            total_cnt = resp_json["count"]
-            if "list" not in resp_json:
-                logger.error("pick stocks unknown result: %s", resp_json)
-                break
-
-            page_cnt = total_cnt // page_size + 1 if total_cnt % page_size != 0 else 0
-            if page_cnt != 1:
-                stock_list.extend(resp_json["list"])
-            else:
-                stock_list = resp_json["list"]
+        try:
+            resp_json = await fetch_json(session, url, params=params)
+        except FetchError as e:
+            logger.error("pick stock from %s failed: %s", url, e)
+            return None
+
+        total_cnt = resp_json["count"]
+        if "list" not in resp_json:
+            logger.error("pick stocks unknown result: %s", resp_json)
+            break
+
+        page_cnt = total_cnt // page_size + 1 if total_cnt % page_size != 0 else 0
+        if page_cnt != 1:
+            stock_list.extend(resp_json["list"])
+        else:
+            stock_list = resp_json["list"]
         curr_page += 1
 
     if not stock_list:
@@ -213,11 +215,11 @@ async def async_pick_stocks(session, filter_dict=None, data_path=None, return_df
 
     if data_path:
         data_path = Path(data_path) / MODULE_DATA_DIR / "picker_xueqiu"
-        os.makedirs(data_path, exist_ok=True)
         data_fname = "picker" + "-" + datetime.now().strftime("%Y%m%d%H%M%S") + ".json"
         data_file = data_path / data_fname
-        with data_file.open("w", encoding="utf-8") as dataf:
-            json.dump(stock_list, dataf, indent=4, ensure_ascii=False)
+        await async_save_data(
+            stock_list, data_file, dataset="picker_xq", params=filter_dict
+        )
 
     if not return_df:
         return stock_list
@@ -239,6 +241,11 @@ def pick_stocks(*args, **kwargs):
     return ret
 
 
+@add_doc(async_pick_stocks.__doc__)
+def submit_pick_stocks(*args, **kwargs):
+    return submit_http_data(async_pick_stocks, *args, **kwargs)
+
+
 @click.option(
     "-f",
     "--save-path",
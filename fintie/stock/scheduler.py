@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""交易时段及交易日历
+
+沪深 A 股的交易时段（北京时间）：
+
+    * 09:15 - 09:25 开盘集合竞价
+    * 09:30 - 11:30 上午连续竞价
+    * 13:00 - 14:57 下午连续竞价
+    * 14:57 - 15:00 收盘集合竞价
+
+周末及交易所休市的节假日不交易。本模块内置了 2024 - 2026 年的休市日期，
+其他年份只排除周末；可以通过配置补充或修正：
+
+    * market_holidays: 额外的休市日期列表，如 ``["2027-01-01"]``
+    * market_open_days: 从内置休市日期中移除的日期列表
+
+不带时区的时间均视为北京时间，返回的时间带有北京时区。
+
+只在交易时段内轮询::
+
+    from fintie.stock import async_get_pankou
+    from fintie.stock.scheduler import async_run_in_sessions
+
+    await async_run_in_sessions(async_get_pankou, 5, session, "SZ002353", data_path)
+
+每个交易日收盘后运行::
+
+    from fintie.stock.scheduler import async_run_after_close
+
+    await async_run_after_close(async_get_list_qutes, session, "stock", data_path)
+"""
+import asyncio
+import inspect
+import logging
+from functools import lru_cache
+from datetime import datetime, date, time, timedelta
+
+import pandas as pd
+
+from ..config import get_config
+from ..store.ticks import TRADE_TZ
+
+
+logger = logging.getLogger(__file__)
+__all__ = [
+    "MARKET_TZ",
+    "is_trading_day",
+    "next_trading_day",
+    "prev_trading_day",
+    "trading_days",
+    "market_phase",
+    "is_live",
+    "next_session",
+    "next_close",
+    "async_wait_for_session",
+    "async_run_in_sessions",
+    "async_run_after_close",
+]
+MARKET_TZ = TRADE_TZ
+# 交易所休市的工作日，周末不交易不需要列出
+HOLIDAYS = {
+    2024: (
+        "01-01", "02-09", "02-12", "02-13", "02-14", "02-15", "02-16", "04-04",
+        "04-05", "05-01", "05-02", "05-03", "06-10", "09-16", "09-17", "10-01",
+        "10-02", "10-03", "10-04", "10-07",
+    ),
+    2025: (
+        "01-01", "01-28", "01-29", "01-30", "01-31", "02-03", "02-04", "04-04",
+        "05-01", "05-02", "05-05", "06-02", "10-01", "10-02", "10-03", "10-06",
+        "10-07", "10-08",
+    ),
+    2026: (
+        "01-01", "01-02", "02-16", "02-17", "02-18", "02-19", "02-20", "02-23",
+        "04-06", "05-01", "05-04", "05-05", "06-19", "09-25", "10-01", "10-02",
+        "10-05", "10-06", "10-07",
+    ),
+}  # fmt: skip
+# (阶段名称, 开始时间)，每个阶段持续到下一个阶段开始
+PHASES = (
+    ("pre_open", time(0, 0)),
+    ("call_auction", time(9, 15)),
+    ("pre_continuous", time(9, 25)),
+    ("morning", time(9, 30)),
+    ("lunch_break", time(11, 30)),
+    ("afternoon", time(13, 0)),
+    ("closing_auction", time(14, 57)),
+    ("closed", time(15, 0)),
+)
+AUCTION_SESSION = (time(9, 15), time(9, 25))
+TRADING_SESSIONS = ((time(9, 30), time(11, 30)), (time(13, 0), time(15, 0)))
+CLOSE_TIME = time(15, 0)
+_warned_years = set()
+
+
+def _to_market_dt(dt=None):
+    if dt is None:
+        return datetime.now(MARKET_TZ)
+    if isinstance(dt, str):
+        dt = pd.Timestamp(dt).to_pydatetime()
+    elif not isinstance(dt, datetime):
+        dt = datetime.combine(dt, time(0, 0))
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=MARKET_TZ)
+    return dt.astimezone(MARKET_TZ)
+
+
+def _to_date(day=None):
+    if isinstance(day, date) and not isinstance(day, datetime):
+        return day
+    return _to_market_dt(day).date()
+
+
+@lru_cache(maxsize=1)
+def _holidays():
+    days = {
+        date.fromisoformat(f"{year}-{month_day}")
+        for year, month_days in HOLIDAYS.items()
+        for month_day in month_days
+    }
+    days.update(date.fromisoformat(day) for day in get_config("market_holidays", []))
+    days.difference_update(
+        date.fromisoformat(day) for day in get_config("market_open_days", [])
+    )
+    return days
+
+
+def is_trading_day(day=None):
+    """是否为交易日
+
+    :param day: 日期，`datetime` 取北京时间的日期，默认为今天
+    """
+    day = _to_date(day)
+    if day.weekday() >= 5:
+        return False
+    if day.year not in HOLIDAYS and day.year not in _warned_years:
+        _warned_years.add(day.year)
+        logger.warning("no holiday data for %s, only weekends are excluded", day.year)
+    return day not in _holidays()
+
+
+def next_trading_day(day=None, include=False):
+    """day 之后的第一个交易日，include 为 `True` 时 day 是交易日则返回 day"""
+    day = _to_date(day)
+    if not include:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def prev_trading_day(day=None, include=False):
+    """day 之前的最后一个交易日，include 为 `True` 时 day 是交易日则返回 day"""
+    day = _to_date(day)
+    if not include:
+        day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def trading_days(start, end):
+    """start 到 end （包含）之间的交易日列表"""
+    day, end = _to_date(start), _to_date(end)
+    days = []
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def market_phase(dt=None):
+    """dt 所处的交易阶段
+
+    :param dt: 时间，默认为当前时间
+    :returns: 非交易日返回 ``holiday`` ，否则为 pre_open/call_auction/pre_continuous/
+              morning/lunch_break/afternoon/closing_auction/closed 之一
+    """
+    dt = _to_market_dt(dt)
+    if not is_trading_day(dt.date()):
+        return "holiday"
+    now = dt.time()
+    phase = PHASES[0][0]
+    for name, start in PHASES:
+        if now >= start:
+            phase = name
+    return phase
+
+
+def _sessions(auction):
+    return ((AUCTION_SESSION,) if auction else ()) + TRADING_SESSIONS
+
+
+def is_live(dt=None, auction=True):
+    """dt 是否处于行情会变化的交易时段
+
+    :param auction: 是否包括开盘集合竞价
+    """
+    dt = _to_market_dt(dt)
+    if not is_trading_day(dt.date()):
+        return False
+    now = dt.time()
+    return any(start <= now < end for start, end in _sessions(auction))
+
+
+def next_session(dt=None, auction=True):
+    """dt 所处的或之后的第一个交易时段
+
+    :param auction: 是否包括开盘集合竞价
+    :returns: ``(开始时间, 结束时间)`` ，dt 处于交易时段内时开始时间为该时段的开始
+    """
+    dt = _to_market_dt(dt)
+    day = next_trading_day(dt.date(), include=True)
+    while True:
+        for start, end in _sessions(auction):
+            end_dt = datetime.combine(day, end, MARKET_TZ)
+            if end_dt > dt:
+                return datetime.combine(day, start, MARKET_TZ), end_dt
+        day = next_trading_day(day)
+
+
+def next_close(dt=None):
+    """dt 当天或之后第一个交易日的收盘时间，dt 已经收盘时为下一个交易日"""
+    dt = _to_market_dt(dt)
+    day = next_trading_day(dt.date(), include=True)
+    close_dt = datetime.combine(day, CLOSE_TIME, MARKET_TZ)
+    if close_dt <= dt:
+        close_dt = datetime.combine(next_trading_day(day), CLOSE_TIME, MARKET_TZ)
+    return close_dt
+
+
+def _seconds_until(dt):
+    return max((dt - datetime.now(MARKET_TZ)).total_seconds(), 0)
+
+
+async def _call(func, *args, **kwargs):
+    ret = func(*args, **kwargs)
+    if inspect.isawaitable(ret):
+        ret = await ret
+    return ret
+
+
+async def async_wait_for_session(auction=True):
+    """等待到交易时段开始，已经在交易时段内时立即返回
+
+    :param auction: 是否包括开盘集合竞价
+    :returns: 当前交易时段的结束时间
+    """
+    start, end = next_session(auction=auction)
+    delay = _seconds_until(start)
+    if delay:
+        logger.info("waiting %.0fs for the session starting at %s", delay, start)
+        await asyncio.sleep(delay)
+    return end
+
+
+async def async_run_in_sessions(func, interval, *args, auction=True, **kwargs):
+    """只在交易时段内每隔 interval 秒调用一次 func ，午间休市、收盘及休市日等待
+
+    :param func: 函数或协程函数，异常记录日志后继续运行
+    :param interval: 调用间隔（秒）
+    :param auction: 是否在开盘集合竞价时段调用
+    :param args: func 的参数
+    :param kwargs: func 的关键字参数
+    """
+    while True:
+        end = await async_wait_for_session(auction)
+        while datetime.now(MARKET_TZ) < end:
+            try:
+                await _call(func, *args, **kwargs)
+            except Exception as e:
+                logger.warning("periodic call of %s failed: %r", func.__name__, e)
+            await asyncio.sleep(min(interval, _seconds_until(end)))
+
+
+async def async_run_after_close(func, *args, delay=60, days=1, **kwargs):
+    """在交易日收盘 delay 秒后调用 func
+
+    :param func: 函数或协程函数
+    :param delay: 收盘后等待的时间（秒）
+    :param days: 运行的交易日数，`None` 表示每个交易日都运行
+    :param args: func 的参数
+    :param kwargs: func 的关键字参数
+    :returns: 最后一次调用的返回值
+    """
+    ret = None
+    count = 0
+    while days is None or count < days:
+        # 收盘后 delay 秒内启动的当天仍然运行
+        run_at = next_close(datetime.now(MARKET_TZ) - timedelta(seconds=delay))
+        run_at += timedelta(seconds=delay)
+        logger.info("%s will run at %s", func.__name__, run_at)
+        await asyncio.sleep(_seconds_until(run_at))
+        ret = await _call(func, *args, **kwargs)
+        count += 1
+    return ret
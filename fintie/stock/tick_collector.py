@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""逐笔成交采集
+
+雪球的 history/trade.json 接口只返回最近的若干笔成交，固定周期轮询时，
+成交活跃的股票会漏掉成交，成交稀少的股票则浪费请求。`TickCollector`
+为每只股票单独调整轮询周期::
+
+    from fintie.stock import collect_ticks
+
+    stats = collect_ticks(["SZ002353", "SH600000"], data_path, duration=3600)
+
+每次取到的成交按 ``(timestamp, price, volume)`` 序列与上一次的结果对齐，
+只保留新的成交；两次结果没有重叠并且返回的记录数已经达到接口上限时，
+中间可能有成交遗漏，记为一次 gap 并立即缩短轮询周期。轮询周期根据观察到的
+成交速率估算，使每次请求新增的成交约为接口上限的 target_fill 倍，
+在不遗漏成交的前提下请求尽量少。
+
+新增的成交追加到 `fintie.store.ticks` ，可以用 `fintie.store.ticks.read_ticks` 读取。
+默认只在交易时段内轮询，见 `fintie.stock.scheduler` 。
+"""
+import time
+import random
+import asyncio
+import inspect
+import logging
+from datetime import datetime, timedelta
+
+import click
+
+from .cli import stock_cli_group
+from .live_quotes import async_get_trade_info
+from .hist_quotes import _parse_symbols
+from .scheduler import MARKET_TZ, is_live, next_session
+from ..config import get_config
+from ..store.ticks import get_tick_writer
+from ..utils import fetch_http_data, submit_http_data, add_doc
+
+
+logger = logging.getLogger(__file__)
+__all__ = [
+    "TickCollector",
+    "async_collect_ticks",
+    "collect_ticks",
+    "submit_collect_ticks",
+]
+
+
+def _tick_key(item):
+    return (item["timestamp"], item.get("current"), item.get("trade_volume"))
+
+
+def _new_ticks(prev_keys, items):
+    """与上一次的成交序列对齐
+
+    :param prev_keys: 上一次成交的 key 列表，按时间排序
+    :param items: 本次取到的成交，按时间排序
+    :returns: ``(新增的成交, 是否与上一次重叠)``
+    """
+    if not prev_keys:
+        return items, True
+    keys = [_tick_key(item) for item in items]
+    # 本次结果的开头与上一次结果的末尾相同的最长部分
+    for size in range(min(len(keys), len(prev_keys)), 0, -1):
+        if keys[:size] == prev_keys[-size:]:
+            return items[size:], True
+    # 序列对不上时按时间去重，同一时间的成交按出现的顺序对应
+    last_ts = prev_keys[-1][0]
+    same = sum(1 for key in prev_keys if key[0] == last_ts)
+    new = [item for item in items if item["timestamp"] > last_ts]
+    old_same = [item for item in items if item["timestamp"] == last_ts]
+    overlapped = len(new) < len(items)
+    return old_same[same:] + new, overlapped
+
+
+class _SymbolState(object):
+    def __init__(self, interval):
+        self.interval = interval
+        # 估计的成交速率（笔/秒），`None` 表示还没有观察到
+        self.rate = None
+        self.keys = []
+        self.last_poll = None
+        self.requests = 0
+        self.ticks = 0
+        self.gaps = 0
+
+
+class TickCollector(object):
+    """逐笔成交采集器
+
+    :param symbols: 股票代码列表
+    :param data_path: 数据保存路径，`None` 表示不保存
+    :param min_interval: 最短轮询周期（秒）
+    :param max_interval: 最长轮询周期（秒）
+    :param target_fill: 每次请求期望新增的成交数占接口返回上限的比例，0 ~ 1，
+                        越小越不容易遗漏，请求也越多
+    :param on_ticks: 取到新成交时的回调 ``on_ticks(symbol, items)`` ，可以是协程函数
+    :param sessions_only: 是否只在交易时段内轮询
+    :param concurrency: 同时进行的请求数，默认为配置 tick_concurrency 或 10
+    """
+
+    # 成交速率的指数平滑系数
+    smoothing = 0.3
+    # 收盘后继续轮询的时间（秒），保证取到收盘集合竞价的成交
+    grace = 30
+
+    def __init__(
+        self,
+        symbols,
+        data_path=None,
+        min_interval=1,
+        max_interval=60,
+        target_fill=0.5,
+        on_ticks=None,
+        sessions_only=True,
+        concurrency=None,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("需要 0 < min_interval <= max_interval")
+        self.symbols = list(symbols)
+        self.data_path = data_path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_fill = min(max(target_fill, 0.05), 1)
+        self.on_ticks = on_ticks
+        self.sessions_only = sessions_only
+        self.concurrency = concurrency or get_config("tick_concurrency", 10)
+        self._states = {symbol: _SymbolState(min_interval) for symbol in self.symbols}
+        # 接口单次返回的最多记录数，按观察到的最大值估计
+        self._capacity = 0
+        self._loop = None
+        self._stop_event = None
+        self._stopped = False
+        self._started = None
+        self._counts = dict.fromkeys(
+            (
+                "requests",
+                "failed",
+                "ticks",
+                "duplicates",
+                "gaps",
+                "write_failed",
+                "callback_failed",
+            ),
+            0,
+        )
+
+    def stats(self):
+        """采集统计
+
+        :returns: 请求、失败、新增成交、重复成交、可能遗漏、保存失败及回调失败的次数，
+                  symbols 为每只股票的当前轮询周期（秒）、估计的成交速率（笔/秒）、
+                  请求数、成交数及 gap 次数，request_rate 为每秒请求数
+        """
+        result = dict(self._counts)
+        elapsed = time.monotonic() - self._started if self._started else 0
+        result["request_rate"] = result["requests"] / elapsed if elapsed else 0.0
+        result["symbols"] = {
+            symbol: {
+                "interval": state.interval,
+                "rate": state.rate,
+                "requests": state.requests,
+                "ticks": state.ticks,
+                "gaps": state.gaps,
+            }
+            for symbol, state in self._states.items()
+        }
+        return result
+
+    def stop(self):
+        """停止采集，可以在其他线程中调用"""
+        self._stopped = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _sleep(self, delay):
+        """等待 delay 秒，采集停止时提前返回"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _in_session(self):
+        now = datetime.now(MARKET_TZ)
+        return is_live(now, auction=False) or is_live(
+            now - timedelta(seconds=self.grace), auction=False
+        )
+
+    def _adjust(self, state, items, new_count, gap):
+        now = self._loop.time()
+        elapsed = now - state.last_poll if state.last_poll is not None else None
+        state.last_poll = now
+        sample = None
+        span = (items[-1]["timestamp"] - items[0]["timestamp"]) / 1000 if items else 0
+        if new_count and span > 0:
+            # 有新成交时按本次返回的成交的时间跨度估计速率
+            sample = (len(items) - 1) / span
+        elif elapsed:
+            sample = new_count / elapsed
+        if gap:
+            # 可能漏掉了成交，速率至少为两次请求之间填满一次接口上限
+            state.gaps += 1
+            self._counts["gaps"] += 1
+            sample = max(sample or 0.0, self._capacity / (elapsed or state.interval))
+        if sample is None:
+            return
+        if state.rate is None or sample > state.rate:
+            # 速率上升时立即跟上，下降时平滑，宁可多请求也不遗漏
+            state.rate = sample
+        else:
+            state.rate += self.smoothing * (sample - state.rate)
+        if state.rate > 0:
+            interval = self.target_fill * self._capacity / state.rate
+        else:
+            interval = self.max_interval
+        if gap:
+            interval = min(interval, state.interval / 2)
+        state.interval = min(max(interval, self.min_interval), self.max_interval)
+
+    async def _poll(self, session, symbol, sem):
+        state = self._states[symbol]
+        state.requests += 1
+        self._counts["requests"] += 1
+        try:
+            async with sem:
+                data = await async_get_trade_info(session, symbol, return_df=False)
+        except Exception as e:
+            logger.warning("poll trades of %s failed: %r", symbol, e)
+            data = None
+        if not data or data.get("items") is None:
+            self._counts["failed"] += 1
+            return
+        items = sorted(data["items"], key=lambda item: item["timestamp"])
+        self._capacity = max(self._capacity, len(items))
+        new, overlapped = _new_ticks(state.keys, items)
+        gap = not overlapped and len(items) >= self._capacity
+        if gap:
+            logger.warning(
+                "possible gap in trades of %s before %s", symbol, items[0]["timestamp"]
+            )
+        self._adjust(state, items, len(new), gap)
+        if items:
+            state.keys = [_tick_key(item) for item in items]
+        self._counts["duplicates"] += len(items) - len(new)
+        if not new:
+            return
+        state.ticks += len(new)
+        self._counts["ticks"] += len(new)
+        if self.data_path:
+            try:
+                writer = get_tick_writer(self.data_path)
+                await writer.append_async(symbol, new)
+            except Exception as e:
+                logger.warning("save %s trades of %s failed: %r", len(new), symbol, e)
+                self._counts["write_failed"] += 1
+        if self.on_ticks is None:
+            return
+        try:
+            ret = self.on_ticks(symbol, new)
+            if inspect.isawaitable(ret):
+                await ret
+        except Exception as e:
+            logger.warning("on_ticks of %s failed: %r", symbol, e)
+            self._counts["callback_failed"] += 1
+
+    async def _collect(self, session, symbol, sem):
+        state = self._states[symbol]
+        # 错开各股票的第一次请求
+        await self._sleep(random.uniform(0, self.min_interval))
+        while not self._stopped:
+            if self.sessions_only and not self._in_session():
+                start, _ = next_session(auction=False)
+                delay = (start - datetime.now(MARKET_TZ)).total_seconds()
+                await self._sleep(max(delay, 0) + random.uniform(0, self.min_interval))
+                # 休市期间不计入成交速率
+                state.last_poll = None
+                continue
+            started = self._loop.time()
+            try:
+                await self._poll(session, symbol, sem)
+            except Exception:
+                # 一次轮询出错不能结束这只股票的采集
+                logger.exception("poll trades of %s failed", symbol)
+                self._counts["failed"] += 1
+            await self._sleep(state.interval - (self._loop.time() - started))
+
+    async def run(self, session, duration=None):
+        """开始采集，直到 duration 秒后或调用 `stop`
+
+        :param session: `aiohttp.ClientSession` 对象
+        :param duration: 运行时长（秒），`None` 表示一直运行
+        :returns: `stats` 的返回值
+        """
+        if not self.symbols:
+            return self.stats()
+        self._loop = asyncio.get_event_loop()
+        self._stop_event = asyncio.Event()
+        self._stopped = False
+        self._started = time.monotonic()
+        sem = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.ensure_future(self._collect(session, symbol, sem))
+            for symbol in self.symbols
+        ]
+        try:
+            if duration is None:
+                await self._stop_event.wait()
+            else:
+                await self._sleep(duration)
+        finally:
+            self._stopped = True
+            self._stop_event.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.stats()
+
+
+async def async_collect_ticks(
+    session, symbols, data_path=None, duration=None, **kwargs
+):
+    """采集逐笔成交
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param symbols: 股票代码列表
+    :param data_path: 数据保存路径，`None` 表示不保存
+    :param duration: 运行时长（秒），`None` 表示一直运行
+    :param kwargs: 其他参数见 `TickCollector`
+    :returns: 采集统计，见 `TickCollector.stats`
+    """
+    collector = TickCollector(symbols, data_path, **kwargs)
+    return await collector.run(session, duration)
+
+
+@add_doc(async_collect_ticks.__doc__)
+def collect_ticks(*args, **kwargs):
+    ret = fetch_http_data(async_collect_ticks, *args, **kwargs)
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
+
+
+@add_doc(async_collect_ticks.__doc__)
+def submit_collect_ticks(*args, **kwargs):
+    return submit_http_data(async_collect_ticks, *args, **kwargs)
+
+
+@click.option(
+    "-s", "--symbol", "symbols", multiple=True, help="股票代码，可以指定多次或用逗号分隔"
+)
+@click.option(
+    "-sf",
+    "--symbol-file",
+    type=click.File(encoding="utf-8"),
+    help="股票代码文件，每行一个或多个代码",
+)
+@click.option("-d", "--duration", type=float, default=None, help="运行时长（秒）")
+@click.option("--min-interval", default=1.0, show_default=True, help="最短轮询周期（秒）")
+@click.option("--max-interval", default=60.0, show_default=True, help="最长轮询周期（秒）")
+@click.option("--all-hours", is_flag=True, help="交易时段外也轮询")
+@click.option("-f", "--save-path", type=click.Path(exists=False))
+@stock_cli_group.command("tick-collect")
+@click.pass_context
+def tick_collect_cli(
+    ctx,
+    symbols,
+    symbol_file,
+    duration,
+    min_interval,
+    max_interval,
+    all_hours,
+    save_path,
+):
+    """按成交速率自适应轮询，采集完整的逐笔成交"""
+    symbols = _parse_symbols(symbols, symbol_file)
+    if not symbols:
+        raise click.UsageError("请通过 -s 或 -sf 指定股票代码")
+    if not save_path:
+        save_path = ctx.obj["data_path"]
+    collector = TickCollector(
+        symbols,
+        save_path,
+        min_interval,
+        max_interval,
+        sessions_only=not all_hours,
+    )
+    future = submit_http_data(collector.run, duration)
+    try:
+        stats = future.result()
+    except KeyboardInterrupt:
+        collector.stop()
+        stats = future.result()
+    click.echo(
+        f"requests {stats['requests']} ({stats['request_rate']:.2f}/s), "
+        f"ticks {stats['ticks']}, duplicates {stats['duplicates']}, "
+        f"gaps {stats['gaps']}, failed {stats['failed']}"
+    )
+
+
+if __name__ == "__main__":
+    tick_collect_cli()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""数据存储模块
+
+将抓取到的数据保存为便于查询的格式
+"""
+from . import bars
+from . import catalog
+from . import loader
+from . import sql
+from . import ticks
+from . import writer
+
+from .bars import *     # noqa
+
+
+__all__ = bars.__all__
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""历史行情（K 线）列式存储
+
+按 ``股票/频率/复权类型/年`` 分区保存为 Parquet 或 Feather 文件::
+
+    <data_path>/stock/<symbol>/hist_quotes/<freq>/<fq_type>/<year>.parquet
+
+写入时与已有的数据按 timestamp 合并去重，新数据覆盖旧数据；
+读取时只读取时间范围涉及的年份文件，Parquet 格式还会将列选择及时间过滤下推到文件读取。
+
+需要安装 `pyarrow` ： ``pip install fintie[store]``
+
+配置项：
+
+    * bar_store_format: parquet/feather ，新写入文件的格式，默认 parquet
+
+加载全市场的日线::
+
+    from fintie.store import read_bars_many
+
+    df = read_bars_many(data_path, symbols, "day", "before", start="2010-01-01")
+    close = df["close"].unstack(level=0)
+"""
+import os
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from ..config import get_config
+from .catalog import record_file
+from .ticks import TRADE_TZ
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover
+    pa = pq = feather = ds = None
+
+
+logger = logging.getLogger(__name__)
+__all__ = [
+    "bars_dir",
+    "write_bars",
+    "read_bars",
+    "read_bars_many",
+    "last_bar_timestamp",
+]
+STOCK_DATA_DIR = "stock"
+FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError("行情存储需要安装 pyarrow: pip install fintie[store]")
+
+
+def bars_dir(data_path, symbol, freq, fq_type):
+    """行情数据的保存目录"""
+    return Path(data_path) / STOCK_DATA_DIR / symbol / "hist_quotes" / freq / fq_type
+
+
+def _year_files(bar_dir):
+    """返回 {年份: 文件路径}"""
+    files = {}
+    if not bar_dir.is_dir():
+        return files
+    for fpath in bar_dir.iterdir():
+        if fpath.suffix in FORMATS.values() and fpath.stem.isdigit():
+            files[int(fpath.stem)] = fpath
+    return files
+
+
+def _to_timestamp(value):
+    """转为与行情 timestamp 一致的 UTC 时间，不带时区的时间按北京时间处理"""
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize(TRADE_TZ)
+    return value.tz_convert("UTC").tz_localize(None)
+
+
+def _empty_many(columns=None):
+    """没有数据时返回的以 (symbol, timestamp) 为索引的空 `pandas.DataFrame`"""
+    index = pd.MultiIndex.from_arrays([[], []], names=["symbol", "timestamp"])
+    if columns is not None:
+        columns = [col for col in columns if col not in ("symbol", "timestamp")]
+    return pd.DataFrame(columns=columns, index=index)
+
+
+def _read_file(fpath, columns=None, start=None, end=None):
+    if columns is not None:
+        columns = ["timestamp"] + [col for col in columns if col != "timestamp"]
+    if fpath.suffix == FORMATS["parquet"]:
+        filters = []
+        if start is not None:
+            filters.append(("timestamp", ">=", start.to_datetime64()))
+        if end is not None:
+            filters.append(("timestamp", "<=", end.to_datetime64()))
+        table = pq.read_table(fpath, columns=columns, filters=filters or None)
+    else:
+        table = feather.read_table(fpath, columns=columns)
+    df = table.to_pandas()
+    if start is not None:
+        df = df[df.timestamp >= start]
+    if end is not None:
+        df = df[df.timestamp <= end]
+    return df
+
+
+def _write_file(df, fpath):
+    tmp_path = fpath.with_name(fpath.name + ".tmp")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fpath.suffix == FORMATS["parquet"]:
+        pq.write_table(table, tmp_path, compression="zstd")
+    else:
+        feather.write_feather(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, fpath)
+
+
+def _normalize(df):
+    """统一为 timestamp 列加 float64 数值列，保证各年份文件的 schema 一致"""
+    if "timestamp" not in df.columns:
+        df = df.reset_index()
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df.timestamp):
+        df["timestamp"] = pd.to_datetime(df.timestamp, unit="ms")
+    df["timestamp"] = df.timestamp.astype("datetime64[ms]")
+    for col in df.columns:
+        if col != "timestamp":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def write_bars(data_path, symbol, freq, fq_type, df, replace=False):
+    """保存行情数据，与已保存的数据按 timestamp 合并去重
+
+    :param data_path: 数据保存路径
+    :param symbol: 股票代码
+    :param freq: 数据频率
+    :param fq_type: 复权类型
+    :param df: `async_get_hist_quotes` 返回的以 timestamp 为索引的 `pandas.DataFrame` ，
+               或者包含 timestamp 列（毫秒时间戳或时间类型）的 `pandas.DataFrame`
+    :param replace: 是否丢弃已保存的数据，用 df 替换
+    :returns: 写入的文件列表
+    """
+    _check_pyarrow()
+    if df is None or df.empty:
+        return []
+    df = _normalize(df)
+    bar_dir = bars_dir(data_path, symbol, freq, fq_type)
+    os.makedirs(bar_dir, exist_ok=True)
+    exists = _year_files(bar_dir)
+    suffix = FORMATS[get_config("bar_store_format", "parquet")]
+
+    written = []
+    for year, year_df in df.groupby(df.timestamp.dt.year):
+        old_file = exists.get(year)
+        if old_file is not None and not replace:
+            old_df = _read_file(old_file)
+            year_df = pd.concat([old_df, year_df], ignore_index=True, sort=False)
+        year_df = year_df.drop_duplicates("timestamp", keep="last")
+        year_df = year_df.sort_values("timestamp").reset_index(drop=True)
+        fpath = bar_dir / f"{year}{suffix}"
+        _write_file(_normalize(year_df), fpath)
+        record_file(
+            fpath,
+            "bars",
+            symbol,
+            {"freq": freq, "fq_type": fq_type},
+            year_df.timestamp.iloc[0],
+            year_df.timestamp.iloc[-1],
+            len(year_df),
+        )
+        if old_file is not None and old_file != fpath:
+            old_file.unlink()
+        written.append(fpath)
+    if replace:
+        for old_file in exists.values():
+            if old_file not in written and old_file.exists():
+                old_file.unlink()
+    logger.debug("write %s bars of %s %s %s", len(df), symbol, freq, fq_type)
+    return written
+
+
+def read_bars(data_path, symbol, freq, fq_type, start=None, end=None, columns=None):
+    """读取保存的行情数据
+
+    :param data_path: 数据保存路径
+    :param symbol: 股票代码
+    :param freq: 数据频率
+    :param fq_type: 复权类型
+    :param start: 开始时间（包含），不带时区时按北京时间，`None` 表示不限制
+    :param end: 截止时间（包含），不带时区时按北京时间，`None` 表示不限制
+    :param columns: 要读取的列，`None` 表示所有列
+    :returns: 以 timestamp 为索引的 `pandas.DataFrame` ，没有数据时返回空的 `pandas.DataFrame`
+    """
+    _check_pyarrow()
+    start, end = _to_timestamp(start), _to_timestamp(end)
+    files = _year_files(bars_dir(data_path, symbol, freq, fq_type))
+    dfs = [
+        _read_file(fpath, columns, start, end)
+        for year, fpath in sorted(files.items())
+        if (start is None or year >= start.year) and (end is None or year <= end.year)
+    ]
+    if not dfs:
+        return pd.DataFrame(columns=columns).rename_axis("timestamp")
+    df = pd.concat(dfs, ignore_index=True, sort=False)
+    return df.set_index("timestamp")
+
+
+def read_bars_many(
+    data_path, symbols, freq, fq_type, start=None, end=None, columns=None
+):
+    """读取多只股票的行情数据
+
+    所有文件作为一个 `pyarrow.dataset` 多线程扫描，列选择及时间过滤下推到文件读取。
+    参数同 `read_bars`
+
+    :returns: 以 (symbol, timestamp) 为索引的 `pandas.DataFrame` ，没有数据时返回空的
+              `pandas.DataFrame`
+    """
+    _check_pyarrow()
+    start, end = _to_timestamp(start), _to_timestamp(end)
+    root = Path(data_path) / STOCK_DATA_DIR
+    files = {suffix: [] for suffix in FORMATS.values()}
+    for symbol in symbols:
+        year_files = _year_files(bars_dir(data_path, symbol, freq, fq_type))
+        for year, fpath in year_files.items():
+            if (start is None or year >= start.year) and (
+                end is None or year <= end.year
+            ):
+                files[fpath.suffix].append(str(fpath))
+
+    # <symbol>/hist_quotes/<freq>/<fq_type>/<year>.parquet
+    partitioning = ds.DirectoryPartitioning(
+        pa.schema([("symbol", pa.string()), ("_dataset", pa.string())])
+    )
+    expr = None
+    if start is not None:
+        expr = ds.field("timestamp") >= start
+    if end is not None:
+        end_expr = ds.field("timestamp") <= end
+        expr = end_expr if expr is None else expr & end_expr
+    if columns is not None:
+        columns = ["symbol", "timestamp"] + [
+            col for col in columns if col not in ("symbol", "timestamp")
+        ]
+
+    tables = []
+    for fmt, suffix in FORMATS.items():
+        if not files[suffix]:
+            continue
+        dataset = ds.dataset(
+            files[suffix],
+            format="ipc" if fmt == "feather" else fmt,
+            partitioning=partitioning,
+            partition_base_dir=str(root),
+        )
+        tables.append(dataset.to_table(columns=columns, filter=expr))
+    if not tables:
+        return _empty_many(columns)
+    table = pa.concat_tables(tables, promote_options="default")
+    df = table.to_pandas().drop(columns="_dataset", errors="ignore")
+    return df.set_index(["symbol", "timestamp"]).sort_index()
+
+
+def last_bar_timestamp(data_path, symbol, freq, fq_type):
+    """已保存的最后一条行情的时间，没有数据时返回 `None`"""
+    _check_pyarrow()
+    files = _year_files(bars_dir(data_path, symbol, freq, fq_type))
+    for year in sorted(files, reverse=True):
+        df = _read_file(files[year], columns=["timestamp"])
+        if not df.empty:
+            return df.timestamp.max()
+    return None
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""数据文件目录
+
+数据保存路径下的 ``catalog.db`` （SQLite）记录了保存过的每个数据文件：
+数据集、股票代码、请求参数、覆盖的时间范围、记录数、文件大小、内容哈希及抓取时间，
+查找数据及检查数据是否过期都可以通过索引查询完成，而不必遍历文件系统。
+
+`fintie.store.writer.save_data` 、行情存储、逐笔成交存储及公告下载写入文件时自动登记，
+已有的数据文件可以通过 ``fintie catalog rebuild`` 登记。
+
+配置项：
+
+    * catalog: 是否登记数据文件，默认 `True`
+
+查询::
+
+    from fintie.store.catalog import query, freshness
+
+    # SZ002353 2018 年的行情文件
+    df = query(data_path, dataset="hist_quotes", symbol="SZ002353",
+               start="2018-01-01", end="2018-12-31")
+    # 每只股票分红数据最后的抓取时间
+    df = freshness(data_path, "fhsp")
+"""
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, date, timezone
+from contextlib import closing
+
+import click
+import pandas as pd
+
+from ..cli import cli
+from ..config import get_config
+
+
+logger = logging.getLogger(__name__)
+__all__ = [
+    "catalog_file",
+    "data_root",
+    "record_file",
+    "async_record_file",
+    "query",
+    "freshness",
+    "prune",
+]
+CATALOG_NAME = "catalog.db"
+STOCK_DATA_DIR = "stock"
+# 以股票代码为目录的数据集
+SYMBOL_DIRS = ("hist_quotes", "live_quotes", "announcements", "fundamental", "ticks")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    symbol TEXT,
+    params TEXT,
+    start TEXT,
+    end TEXT,
+    rows INTEGER,
+    bytes INTEGER,
+    hash TEXT,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_files_dataset_symbol ON files (dataset, symbol);
+CREATE INDEX IF NOT EXISTS ix_files_symbol ON files (symbol);
+CREATE INDEX IF NOT EXISTS ix_files_range ON files (dataset, start, end);
+CREATE INDEX IF NOT EXISTS ix_files_fetched_at ON files (fetched_at);
+"""
+_initialized = set()
+# 每个线程缓存的登记用连接，{数据库路径: 连接}
+_local = threading.local()
+
+
+def catalog_file(data_path):
+    """目录数据库的路径"""
+    return Path(data_path).expanduser() / CATALOG_NAME
+
+
+def data_root(fpath):
+    """数据文件所在的数据保存路径，即路径中 stock 目录的上一级"""
+    fpath = Path(fpath).resolve()
+    for parent in fpath.parents:
+        if parent.name == STOCK_DATA_DIR:
+            return parent.parent
+    return fpath.parent
+
+
+def _connect(data_path):
+    db_file = catalog_file(data_path)
+    conn = sqlite3.connect(str(db_file), timeout=30)
+    if db_file not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(db_file)
+    return conn
+
+
+def _thread_connect(data_path):
+    """当前线程缓存的连接，登记文件时复用，不必每个文件重新打开数据库"""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    db_file = catalog_file(data_path)
+    conn = conns.get(db_file)
+    if conn is None:
+        conn = conns[db_file] = _connect(data_path)
+    return conn
+
+
+def _discard_connect(data_path):
+    conn = getattr(_local, "conns", {}).pop(catalog_file(data_path), None)
+    if conn is not None:
+        conn.close()
+
+
+def _to_text(value):
+    """时间转为可以比较大小的 UTC 时间字符串，整数视为毫秒时间戳"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value / 1000, timezone.utc)
+    elif isinstance(value, str):
+        value = pd.Timestamp(value)
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _file_hash(fpath):
+    sha1 = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def record_file(
+    fpath,
+    dataset,
+    symbol=None,
+    params=None,
+    start=None,
+    end=None,
+    rows=None,
+    content_hash=None,
+    fetched_at=None,
+):
+    """登记一个数据文件，已登记过的文件更新其信息
+
+    :param fpath: 文件路径
+    :param dataset: 数据集名称
+    :param symbol: 股票代码
+    :param params: 请求参数 `dict`
+    :param start: 数据覆盖的开始时间，整数为毫秒时间戳，不带时区的时间视为 UTC 时间
+    :param end: 数据覆盖的截止时间
+    :param rows: 记录数
+    :param content_hash: 文件内容的哈希，默认读取文件计算 sha1 ，调用方已有哈希时应直接传入
+    :param fetched_at: 抓取时间，默认为当前时间
+    """
+    if not get_config("catalog", True):
+        return
+    fpath = Path(fpath).resolve()
+    root = data_root(fpath)
+    try:
+        row = (
+            fpath.relative_to(root).as_posix(),
+            dataset,
+            symbol,
+            json.dumps(params, sort_keys=True, default=str) if params else None,
+            _to_text(start),
+            _to_text(end),
+            rows,
+            fpath.stat().st_size,
+            content_hash or _file_hash(fpath),
+            fetched_at or time.time(),
+        )
+        conn = _thread_connect(root)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (%s)" % ",".join("?" * len(row)),
+                row,
+            )
+    except sqlite3.Error as e:
+        _discard_connect(root)
+        logger.warning("record %s into catalog failed: %s", fpath, e)
+    except OSError as e:
+        logger.warning("record %s into catalog failed: %s", fpath, e)
+
+
+async def async_record_file(fpath, dataset, *args, **kwargs):
+    """在后台写入线程中登记数据文件，参数同 `record_file`
+
+    协程中不应直接调用 `record_file` ，计算文件哈希及写数据库都会阻塞事件循环。
+    """
+    from .writer import async_submit_write
+
+    await async_submit_write(
+        record_file, fpath, dataset, *args, key=f"catalog:{fpath}", **kwargs
+    )
+
+
+def query(
+    data_path,
+    dataset=None,
+    symbol=None,
+    start=None,
+    end=None,
+    fetched_after=None,
+    limit=None,
+):
+    """查询登记的数据文件
+
+    :param data_path: 数据保存路径
+    :param dataset: 数据集名称
+    :param symbol: 股票代码
+    :param start: 与数据时间范围重叠的开始时间
+    :param end: 与数据时间范围重叠的截止时间
+    :param fetched_after: 只返回此时间之后抓取的文件，unix 时间戳
+    :param limit: 最多返回的条数
+    :returns: `pandas.DataFrame` ，按抓取时间倒序，path 为相对 data_path 的路径
+    """
+    conds, args = [], []
+    if dataset is not None:
+        conds.append("dataset = ?")
+        args.append(dataset)
+    if symbol is not None:
+        conds.append("symbol = ?")
+        args.append(symbol)
+    if start is not None:
+        conds.append("(end IS NULL OR end >= ?)")
+        args.append(_to_text(start))
+    if end is not None:
+        conds.append("(start IS NULL OR start <= ?)")
+        args.append(_to_text(end))
+    if fetched_after is not None:
+        conds.append("fetched_at >= ?")
+        args.append(fetched_after)
+    sql = "SELECT * FROM files"
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += " ORDER BY fetched_at DESC"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    with closing(_connect(data_path)) as conn:
+        return pd.read_sql_query(sql, conn, params=args)
+
+
+def freshness(data_path, dataset, symbols=None):
+    """每只股票某个数据集最后的抓取时间及数据覆盖的最后时间
+
+    :returns: 以 symbol 为索引，包含 fetched_at/end/files 列的 `pandas.DataFrame`
+    """
+    sql = (
+        "SELECT symbol, MAX(fetched_at) AS fetched_at, MAX(end) AS end, "
+        "COUNT(*) AS files FROM files WHERE dataset = ?"
+    )
+    args = [dataset]
+    if symbols is not None:
+        symbols = list(symbols)
+        sql += " AND symbol IN (%s)" % ",".join("?" * len(symbols))
+        args.extend(symbols)
+    sql += " GROUP BY symbol"
+    with closing(_connect(data_path)) as conn:
+        df = pd.read_sql_query(sql, conn, params=args)
+    return df.set_index("symbol")
+
+
+def prune(data_path):
+    """删除文件已经不存在的登记记录，返回删除的条数"""
+    root = Path(data_path).expanduser()
+    with closing(_connect(root)) as conn, conn:
+        paths = [row[0] for row in conn.execute("SELECT path FROM files")]
+        missing = [(path,) for path in paths if not (root / path).exists()]
+        conn.executemany("DELETE FROM files WHERE path = ?", missing)
+    return len(missing)
+
+
+def _guess_entry(rel_path):
+    """根据文件路径猜测数据集及股票代码"""
+    parts = rel_path.parts
+    if len(parts) >= 4 and parts[2] in SYMBOL_DIRS:
+        return parts[2], parts[1]
+    if len(parts) >= 3:
+        return parts[1], rel_path.name.split("-")[0]
+    return parts[0], None
+
+
+def rebuild(data_path):
+    """登记数据保存路径下所有未登记的文件，返回新登记的文件数"""
+    root = Path(data_path).expanduser()
+    stock_dir = root / STOCK_DATA_DIR
+    if not stock_dir.is_dir():
+        return 0
+    with closing(_connect(root)) as conn:
+        known = set(row[0] for row in conn.execute("SELECT path FROM files"))
+    count = 0
+    for fpath in stock_dir.rglob("*"):
+        if not fpath.is_file() or fpath.name.startswith(".") or fpath.suffix == ".part":
+            continue
+        rel_path = fpath.relative_to(root)
+        if rel_path.as_posix() in known:
+            continue
+        dataset, symbol = _guess_entry(rel_path)
+        record_file(fpath, dataset, symbol, fetched_at=fpath.stat().st_mtime)
+        count += 1
+    return count
+
+
+@cli.group("catalog")
+def catalog_cli_group():
+    """数据文件目录"""
+    pass
+
+
+@click.option("-ds", "--dataset", default=None, help="数据集名称")
+@click.option("-s", "--symbol", default=None, help="股票代码")
+@click.option("-st", "--start", default=None, help="数据时间范围的开始时间")
+@click.option("-ed", "--end", default=None, help="数据时间范围的截止时间")
+@click.option("-n", "--limit", default=50, show_default=True, help="最多显示的条数")
+@catalog_cli_group.command("ls")
+@click.pass_context
+def catalog_ls_cli(ctx, dataset, symbol, start, end, limit):
+    """查询登记的数据文件"""
+    df = query(ctx.obj["data_path"], dataset, symbol, start, end, limit=limit)
+    df["fetched_at"] = pd.to_datetime(df.fetched_at, unit="s")
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60):
+        click.echo(df.drop(columns=["hash", "params"]))
+
+
+@click.option("-ds", "--dataset", required=True, help="数据集名称")
+@click.option("-a", "--max-age", default=86400, show_default=True, help="过期时间（秒）")
+@catalog_cli_group.command("fresh")
+@click.pass_context
+def catalog_fresh_cli(ctx, dataset, max_age):
+    """列出数据集中超过 max-age 没有更新的股票"""
+    df = freshness(ctx.obj["data_path"], dataset)
+    stale = df[df.fetched_at < time.time() - max_age].copy()
+    stale["fetched_at"] = pd.to_datetime(stale.fetched_at, unit="s")
+    click.echo(f"{len(stale)}/{len(df)} symbols are stale")
+    click.echo(stale)
+
+
+@catalog_cli_group.command("rebuild")
+@click.pass_context
+def catalog_rebuild_cli(ctx):
+    """登记数据保存路径下所有未登记的文件"""
+    click.echo(f"{rebuild(ctx.obj['data_path'])} files recorded")
+
+
+@catalog_cli_group.command("prune")
+@click.pass_context
+def catalog_prune_cli(ctx):
+    """删除文件已经不存在的登记记录"""
+    click.echo(f"{prune(ctx.obj['data_path'])} records removed")
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""离线读取已保存的数据
+
+各数据模块的 ``load_*`` 接口通过本模块从数据保存路径读取数据，不访问网络：
+先按股票代码选出要读取的文件（每只股票只读取最新保存的一份），
+parquet 文件只读取需要的列，最后按日期范围过滤，返回与抓取接口相同结构的 `pandas.DataFrame` 。
+
+配置 ``"f10_store": "sql"`` 时 F10 数据从 `fintie.store.sql` 读取，
+股票代码及列的选择在 SQL 查询中完成。
+"""
+import re
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from ..config import get_config
+from .ticks import TRADE_TZ
+from .writer import read_frame, data_suffixes
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pq = None
+
+
+logger = logging.getLogger(__name__)
+__all__ = ["symbol_files", "read_columns", "filter_dates", "load_records"]
+DATE_RE = r"\d{4}-\d{2}-\d{2}|\d{14}"
+
+
+def symbol_files(data_dir, symbols=None, infix=None):
+    """每只股票最新保存的数据文件
+
+    文件名为 ``<symbol>[-<infix>]-<日期>.<后缀>`` ，按文件名中的日期取最新的一份
+
+    :param data_dir: 数据文件所在目录
+    :param symbols: 股票代码列表，`None` 表示目录下所有股票
+    :param infix: 文件名中股票代码与日期之间的部分，如股东类型、报表名称
+    :returns: ``{symbol: path}``
+    """
+    data_dir = Path(data_dir)
+    infix = re.escape(infix) + "-" if infix else ""
+    pattern = re.compile(rf"^(?P<symbol>[^-.]+)-{infix}(?P<date>{DATE_RE})\.")
+    if symbols is None:
+        candidates = data_dir.glob("*") if data_dir.is_dir() else []
+    else:
+        candidates = [
+            fpath for symbol in symbols for fpath in data_dir.glob(f"{symbol}-*")
+        ]
+    latest = {}
+    for fpath in candidates:
+        match = pattern.match(fpath.name)
+        if match is None:
+            continue
+        symbol, date_str = match.group("symbol"), match.group("date")
+        if symbol not in latest or date_str > latest[symbol][0]:
+            latest[symbol] = (date_str, fpath)
+    return {symbol: fpath for symbol, (_, fpath) in latest.items()}
+
+
+def read_columns(fpath, columns=None):
+    """读取数据文件为 `pandas.DataFrame` ，parquet 文件只读取 columns 中存在的列"""
+    if columns is not None and pq is not None and data_suffixes(fpath)[0] == "parquet":
+        names = pq.read_schema(fpath).names
+        table = pq.read_table(fpath, columns=[c for c in columns if c in names])
+        return table.to_pandas()
+    df = read_frame(fpath)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def _to_datetime(series):
+    """日期列转为不带时区的北京时间，毫秒时间戳为北京时间零点对应的 UTC 时间"""
+    if pd.api.types.is_numeric_dtype(series):
+        dates = pd.to_datetime(series, unit="ms", utc=True)
+        return dates.dt.tz_convert(TRADE_TZ).dt.tz_localize(None)
+    return pd.to_datetime(series, errors="coerce")
+
+
+def _to_market_time(value):
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(TRADE_TZ).tz_localize(None)
+    return value
+
+
+def filter_dates(df, date_column, start=None, end=None):
+    """按日期列过滤，日期列可以是毫秒时间戳或日期字符串
+
+    :param start: 开始时间（包含），不带时区时按北京时间，`None` 表示不限制
+    :param end: 截止时间（包含），不带时区时按北京时间，`None` 表示不限制
+    """
+    if start is None and end is None:
+        return df
+    if date_column not in df.columns:
+        raise ValueError(f"按时间过滤需要日期列，数据中没有 {date_column} 列")
+    dates = _to_datetime(df[date_column])
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= dates >= _to_market_time(start)
+    if end is not None:
+        mask &= dates <= _to_market_time(end)
+    return df[mask]
+
+
+def load_records(
+    dataset,
+    data_dir,
+    data_path=None,
+    symbols=None,
+    infix=None,
+    columns=None,
+    start=None,
+    end=None,
+    date_column=None,
+):
+    """读取各股票保存的记录列表数据
+
+    :param dataset: 数据集名称，同 `fintie.store.sql` 中的表名
+    :param data_dir: 数据文件所在目录
+    :param data_path: 数据保存路径，从 SQL 存储读取时使用
+    :param symbols: 股票代码或代码列表，`None` 表示所有股票
+    :param infix: 文件名中股票代码与日期之间的部分，见 `symbol_files`
+    :param columns: 要读取的列，`None` 表示所有列
+    :param start: 开始时间（包含），按 date_column 过滤
+    :param end: 截止时间（包含），按 date_column 过滤
+    :param date_column: 日期列
+    :returns: `pandas.DataFrame` ，symbols 为单个代码时与抓取接口返回的结构相同，
+              否则增加 symbol 列
+    """
+    if (start is not None or end is not None) and date_column is None:
+        raise ValueError("按时间过滤需要指定 date_column")
+    single = isinstance(symbols, str)
+    if single:
+        symbols = [symbols]
+    read_cols = columns
+    if columns is not None and date_column is not None and date_column not in columns:
+        read_cols = list(columns) + [date_column]
+
+    if get_config("f10_store", "json") == "sql":
+        from .sql import read_records
+
+        if read_cols is not None:
+            read_cols = ["symbol"] + [c for c in read_cols if c != "symbol"]
+        df = read_records(dataset, data_path, symbols, read_cols)
+        df = df.drop(columns=[c for c in df.columns if c.startswith("_")])
+        dfs = [filter_dates(df, date_column, start, end)] if date_column else [df]
+    else:
+        dfs = []
+        for symbol, fpath in sorted(symbol_files(data_dir, symbols, infix).items()):
+            df = read_columns(fpath, read_cols)
+            if date_column is not None:
+                df = filter_dates(df, date_column, start, end)
+            dfs.append(df.assign(symbol=symbol))
+    if not dfs:
+        return pd.DataFrame()
+    df = pd.concat(dfs, ignore_index=True, sort=False)
+    if columns is not None:
+        df = df[["symbol"] + [c for c in columns if c in df.columns and c != "symbol"]]
+    if single:
+        df = df.drop(columns="symbol", errors="ignore")
+    return df
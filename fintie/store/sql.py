@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""F10 数据的 SQL 存储
+
+每个数据集一张表，除了接口返回的字段外还有 ``symbol`` 及 ``_fetched_at`` （抓取时间）两列，
+``(symbol, 自然键)`` 上建唯一索引，重复写入同一条数据时更新而不是重复插入。
+接口返回了新的字段时自动为表增加对应的列。
+
+自然键按 `DATASET_KEYS` 中的候选列依次匹配，选第一组在数据中全部存在并且有值的列，
+都不存在时使用整行内容的哈希值 ``_rowhash`` 作为自然键。
+单条记录的自然键为空时（如尚未实施的分红预案没有实施日期），该列以整行内容的哈希值填充，
+记录内容变化后会写入为新的一行。
+
+配置项：
+
+    * sql_store_url: SQLAlchemy 数据库 url ，
+      默认为数据保存路径下的 sqlite 数据库 ``<data_path>/stock/f10.db``
+
+查询::
+
+    from fintie.store.sql import read_records, latest_records
+
+    # 下周除权除息的分红
+    df = read_records(
+        "fhsp", data_path, where="exrightdate between :start and :end",
+        params={"start": "20181112", "end": "20181116"},
+    )
+    # 所有股票最新一期的资产负债表
+    df = latest_records("funda2_ZCFZB", "reportdate", data_path)
+"""
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+import pandas as pd
+import sqlalchemy as sa
+
+from ..config import get_config
+from ..utils.codec import json_dumps
+
+
+logger = logging.getLogger(__name__)
+__all__ = [
+    "DATASET_KEYS",
+    "get_engine",
+    "upsert_records",
+    "read_records",
+    "latest_records",
+]
+
+DATASET_KEYS = {
+    "fhsp": (("bonusimpdate",), ("exrightdate",)),
+    "guben": (("begindate",), ("publishdate",)),
+    "zengfa": (("publishdate",), ("issuebegdate",)),
+    "inside_trade": (("chgdate", "personname"), ("chgdate", "name")),
+    "gudong_main": (("enddate", "shholdername"), ("enddate", "shholdercode")),
+    "gudong_public": (("enddate", "shholdername"), ("enddate", "shholdercode")),
+    "gudong_limit": (("enddate", "shholdername"), ("enddate", "shholdercode")),
+    "gudong_count": (("enddate",),),
+    "funda2_ZYCWZB": (("reportdate",),),
+    "funda2_DJCWZB": (("reportdate",), ("enddate",)),
+    "funda2_GSLRB": (("reportdate",), ("enddate",)),
+    "funda2_ZCFZB": (("reportdate",), ("enddate",)),
+    "funda2_XJLLB": (("reportdate",), ("enddate",)),
+}
+ROW_HASH = "_rowhash"
+FETCHED_AT = "_fetched_at"
+
+_engines = {}
+_tables = {}
+# 不同股票的写入可能在多个线程中并发执行，建表和增加列需要串行
+_table_lock = threading.Lock()
+
+
+def get_engine(data_path=None):
+    """获取 SQL 存储使用的 `sqlalchemy.engine.Engine`
+
+    :param data_path: 数据保存路径，没有配置 sql_store_url 时数据库保存在此路径下
+    """
+    url = get_config("sql_store_url")
+    if not url:
+        if data_path is None:
+            raise ValueError("没有配置 sql_store_url 时需要指定 data_path")
+        db_file = Path(data_path).expanduser() / "stock" / "f10.db"
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        url = f"sqlite:///{db_file}"
+    engine = _engines.get(url)
+    if engine is None:
+        engine = sa.create_engine(url)
+        _engines[url] = engine
+    return engine
+
+
+def _column_type(values):
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, (bool, int, float)):
+            return sa.Float
+        return sa.Text
+    return sa.Text
+
+
+def _normalize_value(value):
+    if isinstance(value, (dict, list)):
+        return json_dumps(value, compact=True)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _choose_keys(dataset, records):
+    for keys in DATASET_KEYS.get(dataset, ()):
+        if all(key in record for record in records for key in keys) and any(
+            all(record[key] is not None for key in keys) for record in records
+        ):
+            return list(keys)
+    return [ROW_HASH]
+
+
+def _row_hash(record):
+    content = json_dumps(record, compact=True).encode("utf-8")
+    return hashlib.sha1(content).hexdigest()
+
+
+def _get_table(engine, dataset, rows, keys):
+    """获取数据集对应的表，不存在时创建，缺少的列自动增加"""
+    cache_key = (str(engine.url), dataset)
+    table = _tables.get(cache_key)
+    if table is None:
+        metadata = sa.MetaData()
+        if sa.inspect(engine).has_table(dataset):
+            table = sa.Table(dataset, metadata, autoload_with=engine)
+        else:
+            columns = [sa.Column("symbol", sa.String(32), nullable=False)]
+            for key in keys:
+                col_type = _column_type(row.get(key) for row in rows)
+                columns.append(sa.Column(key, col_type, nullable=False))
+            columns.append(sa.Column(FETCHED_AT, sa.Float))
+            table = sa.Table(
+                dataset,
+                metadata,
+                *columns,
+                sa.Index(f"ux_{dataset}_key", "symbol", *keys, unique=True),
+            )
+            metadata.create_all(engine)
+        _tables[cache_key] = table
+
+    missing = sorted(set(name for row in rows for name in row) - set(table.c.keys()))
+    if missing:
+        preparer = engine.dialect.identifier_preparer
+        with engine.begin() as conn:
+            for name in missing:
+                col_type = _column_type(row.get(name) for row in rows)()
+                conn.execute(
+                    sa.text(
+                        "ALTER TABLE %s ADD COLUMN %s %s"
+                        % (
+                            preparer.quote(dataset),
+                            preparer.quote(name),
+                            col_type.compile(dialect=engine.dialect),
+                        )
+                    )
+                )
+        _tables.pop(cache_key)
+        return _get_table(engine, dataset, rows, keys)
+    return table
+
+
+def _unique_keys(table):
+    for index in table.indexes:
+        if index.unique:
+            return [col.name for col in index.columns if col.name != "symbol"]
+    return [ROW_HASH]
+
+
+def _upsert(conn, table, keys, rows):
+    dialect = conn.dialect.name
+    index_elements = ["symbol"] + keys
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        update_cols = {
+            col.name: stmt.excluded[col.name]
+            for col in table.columns
+            if col.name not in index_elements
+        }
+        conn.execute(
+            stmt.on_conflict_do_update(index_elements=index_elements, set_=update_cols),
+            rows,
+        )
+        return
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table)
+        update_cols = {
+            col.name: stmt.inserted[col.name]
+            for col in table.columns
+            if col.name not in index_elements
+        }
+        conn.execute(stmt.on_duplicate_key_update(**update_cols), rows)
+        return
+    # 其他数据库先删除再插入
+    for row in rows:
+        conn.execute(
+            table.delete().where(
+                sa.and_(*[table.c[name] == row[name] for name in index_elements])
+            )
+        )
+    conn.execute(table.insert(), rows)
+
+
+def upsert_records(dataset, symbol, records, data_path=None):
+    """写入数据集的记录，自然键相同的记录会被更新
+
+    :param dataset: 数据集名称，即表名，如 fhsp/guben/funda2_ZCFZB
+    :param symbol: 股票代码
+    :param records: 接口返回的记录列表，或者单条记录的字典
+    :param data_path: 数据保存路径，见 `get_engine`
+    :returns: 写入的记录数
+    """
+    if isinstance(records, dict):
+        records = [records]
+    if not records:
+        return 0
+    engine = get_engine(data_path)
+    keys = _choose_keys(dataset, records)
+    fetched_at = time.time()
+    rows = []
+    for record in records:
+        row = {name: _normalize_value(value) for name, value in record.items()}
+        if ROW_HASH in keys:
+            row[ROW_HASH] = _row_hash(record)
+        row["symbol"] = symbol
+        row[FETCHED_AT] = fetched_at
+        rows.append(row)
+
+    with _table_lock:
+        table = _get_table(engine, dataset, rows, keys)
+    keys = _unique_keys(table)
+    for record, row in zip(records, rows):
+        for key in keys:
+            if row.get(key) is None:
+                # 自然键为空的记录以整行内容区分，不与其他记录冲突
+                row[key] = _row_hash(record)
+        for name in table.c.keys():
+            row.setdefault(name, None)
+    with engine.begin() as conn:
+        _upsert(conn, table, keys, rows)
+    logger.debug("upsert %s records of %s into %s", len(rows), symbol, dataset)
+    return len(rows)
+
+
+def read_records(
+    dataset, data_path=None, symbols=None, columns=None, where=None, params=None
+):
+    """读取数据集的记录
+
+    :param dataset: 数据集名称
+    :param data_path: 数据保存路径，见 `get_engine`
+    :param symbols: 股票代码列表，`None` 表示所有股票
+    :param columns: 要读取的列，`None` 表示所有列
+    :param where: 额外的 SQL 过滤条件，如 ``"reportdate >= :start"``
+    :param params: where 中的绑定参数
+    :returns: `pandas.DataFrame`
+    """
+    engine = get_engine(data_path)
+    table = sa.Table(dataset, sa.MetaData(), autoload_with=engine)
+    cols = [table.c[name] for name in columns] if columns else [table]
+    stmt = sa.select(*cols)
+    if symbols is not None:
+        stmt = stmt.where(table.c.symbol.in_(list(symbols)))
+    if where:
+        stmt = stmt.where(sa.text(where))
+    with engine.connect() as conn:
+        return pd.read_sql(stmt, conn, params=params)
+
+
+def latest_records(dataset, date_column, data_path=None, symbols=None):
+    """每只股票 date_column 最新的记录，如最新一期的财务报表
+
+    :param dataset: 数据集名称
+    :param date_column: 日期列，如 reportdate
+    :param data_path: 数据保存路径，见 `get_engine`
+    :param symbols: 股票代码列表，`None` 表示所有股票
+    :returns: `pandas.DataFrame`
+    """
+    engine = get_engine(data_path)
+    table = sa.Table(dataset, sa.MetaData(), autoload_with=engine)
+    latest = sa.select(
+        table.c.symbol, sa.func.max(table.c[date_column]).label("latest")
+    ).group_by(table.c.symbol)
+    if symbols is not None:
+        latest = latest.where(table.c.symbol.in_(list(symbols)))
+    latest = latest.subquery()
+    stmt = sa.select(table).join(
+        latest,
+        sa.and_(
+            table.c.symbol == latest.c.symbol,
+            table.c[date_column] == latest.c.latest,
+        ),
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(stmt, conn)
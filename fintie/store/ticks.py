@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""逐笔成交的二进制存储
+
+每只股票每个交易日一个文件，记录为定长的 `TICK_DTYPE` 结构，只追加写入::
+
+    <data_path>/stock/<symbol>/ticks/<YYYYMMDD>.ticks
+
+轮询最近成交记录时，与已写入的记录重叠的部分会被跳过，只追加新的成交。
+读取时使用 `numpy.memmap` 直接映射文件，不需要解析也不复制数据::
+
+    from fintie.store.ticks import read_ticks
+
+    ticks = read_ticks(data_path, "SZ002353", "20181019")
+    vwap = (ticks["price"] * ticks["volume"]).sum() / ticks["volume"].sum()
+"""
+import os
+import atexit
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .catalog import record_file
+
+
+logger = logging.getLogger(__name__)
+__all__ = ["TICK_DTYPE", "TickWriter", "tick_file", "get_tick_writer", "read_ticks"]
+TICK_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),  # 毫秒时间戳
+        ("price", "<f8"),
+        ("volume", "<i8"),
+        ("side", "i1"),  # 1 主动买入，-1 主动卖出，0 未知
+        ("level", "i1"),
+    ]
+)
+TRADE_TZ = timezone(timedelta(hours=8))
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _trade_day(timestamp):
+    return datetime.fromtimestamp(timestamp / 1000, TRADE_TZ).strftime("%Y%m%d")
+
+
+def tick_file(data_path, symbol, day):
+    """逐笔成交文件路径
+
+    :param day: 交易日，``YYYYMMDD`` 字符串或者 `datetime.date`
+    """
+    if not isinstance(day, str):
+        day = day.strftime("%Y%m%d")
+    day = day.replace("-", "")
+    return Path(data_path) / "stock" / symbol / "ticks" / f"{day}.ticks"
+
+
+def _to_records(items):
+    """雪球成交记录列表转为按时间排序的 `TICK_DTYPE` 数组"""
+    records = np.zeros(len(items), dtype=TICK_DTYPE)
+    for idx, item in enumerate(items):
+        records[idx] = (
+            item["timestamp"],
+            item.get("current") or 0.0,
+            item.get("trade_volume") or 0,
+            item.get("side") or 0,
+            item.get("level") or 0,
+        )
+    return records[np.argsort(records["timestamp"], kind="stable")]
+
+
+class _TickFile(object):
+    def __init__(self, fpath, symbol):
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        self.fpath = fpath
+        self.symbol = symbol
+        self.fobj = open(fpath, "ab", buffering=0)
+        size = os.path.getsize(fpath)
+        if size % TICK_DTYPE.itemsize:
+            # 上次写入中断留下的不完整记录
+            self.fobj.truncate(size - size % TICK_DTYPE.itemsize)
+            size -= size % TICK_DTYPE.itemsize
+        self.last_ts = -1
+        self.last_cnt = 0
+        if size:
+            timestamps = np.memmap(fpath, dtype=TICK_DTYPE, mode="r")["timestamp"]
+            self.last_ts = int(timestamps[-1])
+            self.last_cnt = int((timestamps == self.last_ts).sum())
+
+    def append(self, records):
+        """跳过与已写入记录重叠的部分，返回追加的记录数"""
+        timestamps = records["timestamp"]
+        start = np.searchsorted(timestamps, self.last_ts, side="left")
+        same = np.searchsorted(timestamps, self.last_ts, side="right") - start
+        # 时间戳相同的成交按出现的顺序对应，多出来的才是新成交
+        records = records[start + min(same, self.last_cnt):]
+        if not len(records):
+            return 0
+        self.fobj.write(records.tobytes())
+        new_last = int(records["timestamp"][-1])
+        new_cnt = int((records["timestamp"] == new_last).sum())
+        if new_last == self.last_ts:
+            self.last_cnt += new_cnt
+        else:
+            self.last_ts, self.last_cnt = new_last, new_cnt
+        return len(records)
+
+    def close(self):
+        self.fobj.close()
+        if not os.path.getsize(self.fpath):
+            return
+        timestamps = np.memmap(self.fpath, dtype=TICK_DTYPE, mode="r")["timestamp"]
+        record_file(
+            self.fpath,
+            "ticks",
+            self.symbol,
+            start=int(timestamps[0]),
+            end=int(timestamps[-1]),
+            rows=len(timestamps),
+        )
+
+
+class TickWriter(object):
+    """逐笔成交写入器
+
+    打开的文件在写入器内缓存，每次追加只有一次 write 系统调用；
+    `append_async` 在写入器自己的线程中执行文件写入，不阻塞事件循环。
+
+    :param data_path: 数据保存路径
+    """
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self._files = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="fintie-ticks")
+
+    def append(self, symbol, items):
+        """追加成交记录
+
+        :param symbol: 股票代码
+        :param items: 雪球 trade.json 返回的成交记录列表
+        :returns: 实际追加的记录数
+        """
+        if not items:
+            return 0
+        records = _to_records(items)
+        days = np.array([_trade_day(ts) for ts in records["timestamp"]])
+        written = 0
+        with self._lock:
+            for day in np.unique(days):
+                key = (symbol, day)
+                tfile = self._files.get(key)
+                if tfile is None:
+                    # 同一只股票只保持当天的文件打开
+                    for old_key in [k for k in self._files if k[0] == symbol]:
+                        self._files.pop(old_key).close()
+                    tfile = _TickFile(tick_file(self.data_path, symbol, day), symbol)
+                    self._files[key] = tfile
+                written += tfile.append(records[days == day])
+        return written
+
+    async def append_async(self, symbol, items):
+        """同 `append` ，在后台线程中写入"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.append, symbol, items)
+
+    def close(self):
+        """关闭打开的文件"""
+        with self._lock:
+            for tfile in self._files.values():
+                tfile.close()
+            self._files.clear()
+        self._executor.shutdown(wait=True)
+
+
+def get_tick_writer(data_path):
+    """获取 data_path 对应的进程内共享的 `TickWriter`"""
+    key = str(Path(data_path).expanduser())
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = TickWriter(key)
+    return writer
+
+
+@atexit.register
+def _close_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+def read_ticks(data_path, symbol, day, as_df=False):
+    """读取一个交易日的逐笔成交
+
+    :param data_path: 数据保存路径
+    :param symbol: 股票代码
+    :param day: 交易日，``YYYYMMDD`` 字符串或者 `datetime.date`
+    :param as_df: 是否返回 `pandas.DataFrame` ，会复制数据
+    :returns: 只读的 `numpy.memmap` 结构化数组，或以 timestamp 为索引的 `pandas.DataFrame`
+    """
+    fpath = tick_file(data_path, symbol, day)
+    size = os.path.getsize(fpath) if fpath.exists() else 0
+    count = size // TICK_DTYPE.itemsize
+    if count:
+        ticks = np.memmap(fpath, dtype=TICK_DTYPE, mode="r", shape=(count,))
+    else:
+        ticks = np.zeros(0, dtype=TICK_DTYPE)
+    if not as_df:
+        return ticks
+    df = pd.DataFrame(ticks)
+    df["timestamp"] = pd.to_datetime(df.timestamp, unit="ms")
+    return df.set_index("timestamp")
@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""数据文件的写入及读取
+
+所有模块保存数据都通过 `save_data` ：先写入同目录下的临时文件再原子地重命名，
+进程中断不会留下不完整的文件；文件格式及压缩方式由配置决定，
+`read_data` 根据文件后缀读取任意格式保存的数据，返回与接口原始数据相同的结构。
+
+配置项：
+
+    * store_format: 数据文件格式，默认 json
+
+      - json: 与接口返回的数据结构相同的 json 文件
+      - jsonl: 每行一条记录，只适用于记录列表，其他数据仍然保存为 json
+      - parquet: 列式存储，适用于记录列表及 ``column``/``item`` 结构的行情数据，
+        需要安装 pyarrow ，其他数据仍然保存为 json
+
+    * store_compression: 压缩方式，默认不压缩
+
+      - gzip: 后缀 ``.gz``
+      - zstd: 后缀 ``.zst`` ，需要安装 zstandard
+      - lz4: 后缀 ``.lz4`` ，需要安装 lz4
+
+      parquet 文件使用其内置的压缩，不增加后缀
+
+文本或二进制的数据（如网易财经的 csv 报表）保持原始内容（raw）写入，
+文件后缀不变，只增加压缩后缀。
+
+指定 dataset 参数时，写入的文件登记到 `fintie.store.catalog` 数据文件目录中。
+
+后台写入
+
+    协程中通过 `async_save_data` 保存数据：数据交给后台线程池写入，协程继续执行，
+    文件创建、序列化、压缩及写入都不占用事件循环。等待写入的数据超过
+    write_queue_size 时提交方等待，避免内存无限增长；同一文件的写入按提交顺序执行。
+    `flush_writes` / `async_flush_writes` 等待已提交的写入全部完成，
+    进程退出时自动等待，并报告写入失败的文件。
+
+    * write_behind: 是否后台写入，默认 `True` ，`False` 时在协程中直接写入
+    * write_workers: 写入线程数，默认 4
+    * write_queue_size: 最多等待写入的数据数，默认 256
+    * write_exit_timeout: 进程退出时最长等待写入的时间（秒），默认 60
+"""
+import io
+import os
+import gzip
+import atexit
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import wait as wait_futures
+
+import pandas as pd
+
+from ..config import get_config
+from ..utils.codec import json_dumps, json_loads
+from .catalog import record_file
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+
+logger = logging.getLogger(__name__)
+__all__ = [
+    "save_data",
+    "async_save_data",
+    "async_submit_write",
+    "flush_writes",
+    "async_flush_writes",
+    "get_write_queue",
+    "WriteQueue",
+    "read_data",
+    "read_frame",
+    "data_suffixes",
+]
+FORMAT_SUFFIXES = {"json": ".json", "jsonl": ".jsonl", "parquet": ".parquet"}
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "lz4": ".lz4"}
+PARQUET_LAYOUT_KEY = b"fintie.layout"
+PARQUET_META_KEY = b"fintie.meta"
+
+
+def _compress(content, compression):
+    if compression == "gzip":
+        return gzip.compress(content, compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd 压缩需要安装 zstandard: pip install zstandard")
+        return zstandard.ZstdCompressor().compress(content)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise ImportError("lz4 压缩需要安装 lz4: pip install lz4")
+        return lz4_frame.compress(content)
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+def _decompress(content, compression):
+    if compression == "gzip":
+        return gzip.decompress(content)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd 压缩需要安装 zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise ImportError("lz4 压缩需要安装 lz4: pip install lz4")
+        return lz4_frame.decompress(content)
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+def _layout(data):
+    """数据的表格结构：records 记录列表，columns 为 column/item 结构，否则为 None"""
+    if isinstance(data, list) and data and all(isinstance(r, dict) for r in data):
+        return "records"
+    if (
+        isinstance(data, dict)
+        and isinstance(data.get("column"), list)
+        and isinstance(data.get("item"), list)
+    ):
+        return "columns"
+    return None
+
+
+def _to_table(data, layout):
+    if layout == "records":
+        return pa.Table.from_pylist(data), {}
+    items = data["item"]
+    arrays = {
+        name: [row[idx] for row in items] for idx, name in enumerate(data["column"])
+    }
+    meta = {key: value for key, value in data.items() if key not in ("column", "item")}
+    return pa.Table.from_pydict(arrays), meta
+
+
+def _from_table(table):
+    metadata = table.schema.metadata or {}
+    if metadata.get(PARQUET_LAYOUT_KEY) != b"columns":
+        return table.to_pylist()
+    data = json_loads(metadata.get(PARQUET_META_KEY, b"{}"))
+    data["column"] = table.column_names
+    data["item"] = [list(row.values()) for row in table.to_pylist()]
+    return data
+
+
+def _atomic_write(fpath, write):
+    tmp_path = fpath.with_name(f".{fpath.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, fpath)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _write_parquet(data, layout, fpath, compression):
+    try:
+        table, meta = _to_table(data, layout)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # 同一列的数据类型不一致等无法转为列式存储的情况
+        logger.info("can not save %s as parquet, fallback to json: %s", fpath, e)
+        return None
+    metadata = dict(table.schema.metadata or {})
+    metadata[PARQUET_LAYOUT_KEY] = layout.encode("utf-8")
+    metadata[PARQUET_META_KEY] = json_dumps(meta, compact=True).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+    fpath = fpath.with_name(fpath.name + FORMAT_SUFFIXES["parquet"])
+    _atomic_write(
+        fpath, lambda p: pq.write_table(table, p, compression=compression or "none")
+    )
+    return fpath
+
+
+def _summarize(data, layout):
+    """数据的 (记录数, 开始时间, 截止时间)，时间取自 timestamp 字段"""
+    if isinstance(data, (str, bytes)):
+        newline = "\n" if isinstance(data, str) else b"\n"
+        return max(data.count(newline) - 1, 0), None, None
+    timestamps = []
+    if layout == "records":
+        rows = len(data)
+        timestamps = [r["timestamp"] for r in data if r.get("timestamp") is not None]
+    elif layout == "columns":
+        rows = len(data["item"])
+        if "timestamp" in data["column"]:
+            idx = data["column"].index("timestamp")
+            timestamps = [r[idx] for r in data["item"] if r[idx] is not None]
+    else:
+        return None, None, None
+    try:
+        return rows, min(timestamps, default=None), max(timestamps, default=None)
+    except TypeError:
+        return rows, None, None
+
+
+def save_data(
+    data,
+    fpath,
+    fmt=None,
+    compression=None,
+    dataset=None,
+    symbol=None,
+    params=None,
+    start=None,
+    end=None,
+):
+    """保存数据到文件
+
+    :param data: 接口返回的原始数据，`str`/`bytes` 按原样写入
+    :param fpath: 文件路径，``.json`` 后缀会被替换为所用格式的后缀
+    :param fmt: 文件格式，默认由 store_format 配置决定
+    :param compression: 压缩方式，默认由 store_compression 配置决定，none 为不压缩
+    :param dataset: 数据集名称，指定时将文件登记到数据文件目录
+    :param symbol: 登记的股票代码
+    :param params: 登记的请求参数
+    :param start: 数据覆盖的开始时间，默认取数据中最早的 timestamp
+    :param end: 数据覆盖的截止时间，默认取数据中最晚的 timestamp
+    :returns: 实际写入的文件路径
+    """
+    fpath = _save_data(data, fpath, fmt, compression)
+    if dataset is not None:
+        rows, first, last = _summarize(data, _layout(data))
+        record_file(
+            fpath,
+            dataset,
+            symbol,
+            params,
+            start if start is not None else first,
+            end if end is not None else last,
+            rows,
+        )
+    return fpath
+
+
+def _save_data(data, fpath, fmt, compression):
+    fpath = Path(fpath)
+    fmt = fmt or get_config("store_format", "json")
+    compression = compression or get_config("store_compression") or "none"
+    if compression == "none":
+        compression = None
+    if compression is not None and compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"不支持的压缩方式: {compression}")
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+
+    if isinstance(data, (str, bytes)):
+        content = data.encode("utf-8") if isinstance(data, str) else data
+    else:
+        if fpath.suffix == FORMAT_SUFFIXES["json"]:
+            fpath = fpath.with_suffix("")
+        layout = _layout(data)
+        if fmt == "parquet" and layout is not None:
+            if pq is None:
+                raise ImportError("parquet 格式需要安装 pyarrow: pip install fintie[store]")
+            written = _write_parquet(data, layout, fpath, compression)
+            if written is not None:
+                return written
+        if fmt == "jsonl" and layout == "records":
+            content = "\n".join(json_dumps(r, compact=True) for r in data) + "\n"
+            fpath = fpath.with_name(fpath.name + FORMAT_SUFFIXES["jsonl"])
+        else:
+            content = json_dumps(data)
+            fpath = fpath.with_name(fpath.name + FORMAT_SUFFIXES["json"])
+        content = content.encode("utf-8")
+
+    if compression is not None:
+        content = _compress(content, compression)
+        fpath = fpath.with_name(fpath.name + COMPRESSION_SUFFIXES[compression])
+    _atomic_write(fpath, lambda p: p.write_bytes(content))
+    return fpath
+
+
+def data_suffixes(fpath):
+    """解析文件的 (格式, 压缩方式)，格式为 json/jsonl/parquet/raw"""
+    fpath = Path(fpath)
+    compression = None
+    for name, suffix in COMPRESSION_SUFFIXES.items():
+        if fpath.suffix == suffix:
+            compression = name
+            fpath = fpath.with_suffix("")
+            break
+    for name, suffix in FORMAT_SUFFIXES.items():
+        if fpath.suffix == suffix:
+            return name, compression
+    return "raw", compression
+
+
+def read_data(fpath):
+    """读取 `save_data` 保存的文件
+
+    :param fpath: 文件路径
+    :returns: 与保存时相同结构的数据，raw 格式返回 `str` （无法按 utf-8 解码时返回 `bytes` ）
+    """
+    fpath = Path(fpath)
+    fmt, compression = data_suffixes(fpath)
+    if fmt == "parquet":
+        if pq is None:
+            raise ImportError("parquet 格式需要安装 pyarrow: pip install fintie[store]")
+        return _from_table(pq.read_table(fpath))
+    content = fpath.read_bytes()
+    if compression is not None:
+        content = _decompress(content, compression)
+    if fmt == "json":
+        return json_loads(content)
+    if fmt == "jsonl":
+        return [json_loads(line) for line in content.splitlines() if line.strip()]
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content
+
+
+def read_frame(fpath):
+    """读取 `save_data` 保存的表格数据为 `pandas.DataFrame`
+
+    记录列表每条记录一行，``column``/``item`` 结构按 column 为列名，
+    raw 格式按 csv 解析，第一列为索引
+    """
+    fpath = Path(fpath)
+    fmt, _ = data_suffixes(fpath)
+    if fmt == "parquet" and pq is not None:
+        return pq.read_table(fpath).to_pandas()
+    data = read_data(fpath)
+    if fmt == "raw":
+        return pd.read_csv(io.StringIO(data), index_col=0)
+    if _layout(data) == "columns":
+        return pd.DataFrame(data=data["item"], columns=data["column"])
+    return pd.DataFrame(data)
+
+
+class WriteQueue(object):
+    """后台写入队列
+
+    提交的写入函数在线程池中执行，同一 key 的写入按提交顺序依次执行；
+    等待执行的写入达到 max_pending 时，提交方等待直到有写入完成。
+
+    :param workers: 写入线程数
+    :param max_pending: 最多等待执行的写入数
+    """
+
+    def __init__(self, workers=4, max_pending=256):
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="fintie-write")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._tails = {}
+        # 队列满时等待的协程，[(事件循环, asyncio.Future)]
+        self._waiters = []
+        self.failed = []
+
+    def _run(self, future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def _start(self, future, func, args, kwargs):
+        try:
+            self._executor.submit(self._run, future, func, args, kwargs)
+        except RuntimeError as e:
+            # 线程池已经关闭
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+
+    def _done(self, key, future):
+        self._slots.release()
+        with self._lock:
+            self._pending.discard(future)
+            if self._tails.get(key) is future:
+                del self._tails[key]
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # 等待的事件循环已经关闭
+                pass
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            self.failed.append(exc)
+            logger.error("background write %s failed: %s", key, exc)
+
+    def _submit(self, func, args, kwargs, key):
+        future = Future()
+        with self._lock:
+            prev = self._tails.get(key) if key is not None else None
+            self._pending.add(future)
+            if key is not None:
+                self._tails[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        if prev is None:
+            self._start(future, func, args, kwargs)
+        else:
+            # 上一个写入完成时才提交到线程池，不占用写入线程等待
+            prev.add_done_callback(lambda f: self._start(future, func, args, kwargs))
+        return future
+
+    def submit(self, func, *args, key=None, **kwargs):
+        """提交写入，队列已满时阻塞等待
+
+        :param func: 写入函数
+        :param key: 写入对象的标识（如文件路径），相同 key 的写入按提交顺序执行
+        :returns: `concurrent.futures.Future` ，结果为 func 的返回值
+        """
+        self._slots.acquire()
+        return self._submit(func, args, kwargs, key)
+
+    async def async_submit(self, func, *args, key=None, **kwargs):
+        """同 `submit` ，队列已满时让出事件循环，有写入完成时被唤醒"""
+        loop = asyncio.get_event_loop()
+        while not self._slots.acquire(blocking=False):
+            waiter = loop.create_future()
+            with self._lock:
+                self._waiters.append((loop, waiter))
+            # 登记后再检查一次，避免错过登记前完成的写入
+            if self._slots.acquire(blocking=False):
+                break
+            await waiter
+        return self._submit(func, args, kwargs, key)
+
+    def pending(self):
+        """等待及正在执行的写入数"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """等待已提交的写入完成
+
+        :param timeout: 最长等待时间（秒），`None` 表示一直等待
+        :returns: 超时后仍未完成的写入数
+        """
+        with self._lock:
+            futures = list(self._pending)
+        _, not_done = wait_futures(futures, timeout)
+        return len(not_done)
+
+    async def async_flush(self):
+        """同 `flush` ，在协程中等待"""
+        with self._lock:
+            futures = list(self._pending)
+        await asyncio.gather(
+            *[asyncio.wrap_future(f) for f in futures], return_exceptions=True
+        )
+
+    def close(self, timeout=None):
+        """等待写入完成并关闭线程池，返回未完成的写入数"""
+        not_done = self.flush(timeout)
+        self._executor.shutdown(wait=not not_done)
+        return not_done
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    """进程内共享的 `WriteQueue` ，线程数及队列长度由配置决定"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue(
+                get_config("write_workers", 4), get_config("write_queue_size", 256)
+            )
+    return _write_queue
+
+
+async def async_submit_write(func, *args, key=None, **kwargs):
+    """在协程中提交写入函数到 `get_write_queue` ，参数同 `WriteQueue.submit`
+
+    write_behind 配置为 `False` 时直接执行写入函数
+
+    :returns: 结果为 func 返回值的 `concurrent.futures.Future`
+    """
+    if get_config("write_behind", True):
+        return await get_write_queue().async_submit(func, *args, key=key, **kwargs)
+    future = Future()
+    future.set_result(func(*args, **kwargs))
+    return future
+
+
+async def async_save_data(data, fpath, *args, wait=False, **kwargs):
+    """在后台线程中执行 `save_data` ，参数同 `save_data`
+
+    :param wait: 是否等待写入完成
+    :returns: wait 为 `True` 时返回实际写入的文件路径，
+              否则返回结果为文件路径的 `concurrent.futures.Future`
+    """
+    future = await async_submit_write(
+        save_data, data, fpath, *args, key=str(fpath), **kwargs
+    )
+    if wait:
+        return await asyncio.wrap_future(future)
+    return future
+
+
+def flush_writes(timeout=None):
+    """等待所有后台写入完成，返回超时后仍未完成的写入数"""
+    if _write_queue is None:
+        return 0
+    return _write_queue.flush(timeout)
+
+
+async def async_flush_writes():
+    """在协程中等待所有后台写入完成"""
+    if _write_queue is not None:
+        await _write_queue.async_flush()
+
+
+@atexit.register
+def _close_write_queue():
+    if _write_queue is None:
+        return
+    pending = _write_queue.pending()
+    if pending:
+        logger.info("waiting for %s background writes to finish", pending)
+    not_done = _write_queue.close(get_config("write_exit_timeout", 60))
+    if not_done:
+        logger.error("%s background writes are not finished, data lost", not_done)
+    if _write_queue.failed:
+        logger.error("%s background writes failed", len(_write_queue.failed))
@@ -14,16 +14,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import atexit
 import logging
 import asyncio
+import threading
 
 from dateutil.relativedelta import relativedelta
 from dateutil.parser import parse as parse_datetime
 
-from fintie.env import get_http_session
+from fintie.env import get_http_session, close_http_session
 
 
 logger = logging.getLogger(__name__)
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
 
 
 def convert_number(num_str, cls=int):
@@ -75,31 +80,200 @@ def parse_dt(date_str, return_date=False):
 
 
 async def wrap_session_run(func, *args, **kwargs):
-    async with get_http_session(force=True) as session:
-        ret = await func(session, *args, **kwargs)
-        return ret
+    """使用进程内共享的 http 会话运行异步接口，会话在多次调用间复用"""
+    session = get_http_session()
+    return await func(session, *args, **kwargs)
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_background_loop():
+    """获取后台线程中运行的事件循环，第一次调用时启动该线程
+
+    同步接口都提交到这个事件循环中执行，共享的 http 会话也属于这个事件循环，
+    因此重复调用同步接口不需要反复创建和销毁事件循环，
+    在已经运行了事件循环的环境（如 Jupyter Notebook）中也可以使用同步接口。
+    """
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed() or not _loop_thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_run_loop, args=(_loop,), name="fintie-loop", daemon=True
+            )
+            _loop_thread.start()
+    return _loop
+
+
+def submit_coroutine(coro):
+    """将协程提交到后台事件循环中执行
+
+    :params coro: 协程对象
+    :returns: `concurrent.futures.Future` 对象
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop())
 
 
 def async2sync_run(*aws, return_exceptions=True):
-    """将异步函数转为同步函数
+    """将异步函数转为同步函数，协程在后台事件循环中执行，当前线程阻塞等待结果
 
     :params aws: 异步协程列表
     :params return_exceptions: 是否运行返回异常，不 允许的话任何一个协程异常都会导致本函数异常
     :returns: 一个列表包含了所有协程的返回值
     """
-    loop = asyncio.get_event_loop()
-    if loop.is_running():
-        logger.warning("EventLoop 已经在运行，请调用异步接口！（或许您是在新版的 Notebook 中？）")
-        return None
-    # TODO: use ayncio.run for Python 3.7
-    return loop.run_until_complete(
-        asyncio.gather(*aws, return_exceptions=return_exceptions)
-    )
+    if threading.current_thread() is _loop_thread:
+        for aw in aws:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+        raise RuntimeError("不能在 fintie 的后台事件循环中调用同步接口，请调用异步接口！")
+
+    async def gather():
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+    return submit_coroutine(gather()).result()
 
 
 def fetch_http_data(func, *args, **kwargs):
-    """将异步的http取数据接口转为同步方式"""
-    return async2sync_run(wrap_session_run(func, *args, **kwargs))[0]
+    """将异步的http取数据接口转为同步方式
+
+    接口中提交的后台写入完成后才返回，返回时数据已经保存到文件
+    """
+    from ..store.writer import flush_writes
+
+    ret = async2sync_run(wrap_session_run(func, *args, **kwargs))[0]
+    flush_writes()
+    return ret
+
+
+def submit_http_data(func, *args, **kwargs):
+    """将异步的http取数据接口提交到后台事件循环，不阻塞当前线程
+
+    与 `fetch_http_data` 一样，接口中提交的后台写入完成后 future 才完成
+
+    :returns: `concurrent.futures.Future` 对象，接口的返回值或异常通过它获取
+    """
+    from ..store.writer import async_flush_writes
+
+    async def run():
+        try:
+            return await wrap_session_run(func, *args, **kwargs)
+        finally:
+            await async_flush_writes()
+
+    return submit_coroutine(run())
+
+
+def fetch_http_iter(func, *args, **kwargs):
+    """将异步生成器形式的http取数据接口转为同步的生成器，每一项产生后立即返回
+
+    生成器在后台事件循环中运行，提前结束迭代时会关闭异步生成器。
+    每一项返回前等待已提交的后台写入完成，返回时该项的数据已经保存到文件。
+    """
+    from ..store.writer import async_flush_writes
+
+    async def start():
+        return func(get_http_session(), *args, **kwargs)
+
+    agen = submit_coroutine(start()).result()
+
+    async def anext():
+        try:
+            return await agen.__anext__()
+        finally:
+            await async_flush_writes()
+
+    try:
+        while True:
+            try:
+                yield submit_coroutine(anext()).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        submit_coroutine(agen.aclose()).result()
+
+
+@atexit.register
+def _stop_background_loop():
+    loop = _loop
+    if loop is None or loop.is_closed() or not _loop_thread.is_alive():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_http_session(), loop).result(5)
+    except Exception as e:  # noqa
+        logger.warning("close http session at exit failed: %s", e)
+    loop.call_soon_threadsafe(loop.stop)
+    _loop_thread.join(5)
+    if not loop.is_running():
+        loop.close()
+
+
+def _unpack_call(call):
+    func, args, kwargs = (tuple(call) + ((), {}))[:3]
+    return func, args or (), kwargs or {}
+
+
+async def async_run_batch(session, calls, concurrency=16, progress=None):
+    """在同一个会话中并发执行一批异步接口调用
+
+    :param session: `aiohttp.ClientSession` 对象，同步接口不需要传
+    :param calls: 调用列表，每一项为 ``(func, args, kwargs)`` ，args/kwargs 可省略，
+                  func 为 `async_get_*` 这类以 session 为第一个参数的异步接口
+    :param concurrency: 同时执行的调用数上限
+    :param progress: 进度回调，每个调用完成时以 ``(done, total, index, result)`` 调用，
+                     回调抛出的异常只记录日志
+
+    :returns: 与 calls 顺序一致的结果列表，调用抛出的异常会作为该项的结果返回
+    """
+    calls = list(calls)
+    total = len(calls)
+    results = [None] * total
+    sem = asyncio.Semaphore(max(int(concurrency), 1))
+    done = 0
+
+    async def run_one(index, call):
+        nonlocal done
+        func, args, kwargs = _unpack_call(call)
+        async with sem:
+            try:
+                ret = await func(session, *args, **kwargs)
+            except Exception as e:
+                name = getattr(func, "__name__", repr(func))
+                logger.warning("batch call %s %s failed: %r", index, name, e)
+                ret = e
+        results[index] = ret
+        done += 1
+        if progress is not None:
+            # 进度回调出错不影响其他调用
+            try:
+                progress(done, total, index, ret)
+            except Exception as e:
+                logger.warning("batch progress callback failed: %r", e)
+
+    await asyncio.gather(*[run_one(index, call) for index, call in enumerate(calls)])
+    return results
+
+
+def run_batch(calls, concurrency=16, progress=None):
+    """`async_run_batch` 的同步接口，所有调用在一个事件循环及一个会话中完成::
+
+        from fintie.stock import async_get_hist_quotes
+        from fintie.utils import run_batch
+
+        calls = [
+            (async_get_hist_quotes, (symbol, end_dt, -200, "day"))
+            for symbol in symbols
+        ]
+        results = run_batch(calls, concurrency=32)
+
+    参数及返回值见 `async_run_batch`
+    """
+    ret = fetch_http_data(async_run_batch, calls, concurrency, progress)
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
 
 
 def add_doc(doc):
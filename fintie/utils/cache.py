@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""http 响应的磁盘缓存
+
+缓存以规范化后的 url 、查询参数及表单数据为键，忽略用于防止缓存的 ``_`` 时间戳参数。
+每类接口有各自的有效期，见 `default_ttl` ：
+
+    * 已经结束的 kline.json 时间窗口、已过去日期的 memoQuery 永久有效
+      （前复权行情会因除权而变化，只缓存 6 小时）
+    * 雪球 F10 数据及网易财报缓存 6 小时
+    * 盘口、实时行情、成交记录缓存 3 秒
+
+过期的缓存如果带有 ``ETag`` / ``Last-Modified`` ，会发送条件请求重新验证，
+服务端返回 304 时直接使用缓存内容。
+
+缓存默认关闭，相关配置::
+
+    {
+        "http_cache": true,
+        "http_cache_path": "~/.cache/fintie/http",
+        "http_cache_ttls": {"stocklist.json": 60, "pankou.json": 0}
+    }
+
+http_cache_ttls 按 url 子串匹配覆盖默认的有效期（秒），0 表示不缓存。
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from datetime import date, datetime
+from collections import namedtuple
+
+from yarl import URL
+
+from ..config import get_config
+
+
+logger = logging.getLogger(__name__)
+__all__ = ["HttpCache", "CacheEntry", "cache_key", "default_ttl", "get_http_cache"]
+IMMUTABLE = float("inf")
+IGNORED_PARAMS = ("_",)
+
+CacheEntry = namedtuple(
+    "CacheEntry",
+    ["body", "charset", "stored_at", "expires", "etag", "last_modified", "url"],
+    defaults=(None,),
+)
+
+_http_cache = None
+
+
+def _canonical_items(items):
+    if not items:
+        return []
+    if isinstance(items, dict):
+        items = items.items()
+    return sorted(
+        (str(k), str(v)) for k, v in items if str(k) not in IGNORED_PARAMS
+    )
+
+
+def cache_key(method, url, params=None, data=None):
+    """计算请求的缓存键
+
+    url 中的查询参数与 params 合并后排序，忽略 ``_`` 参数，
+    因此同一请求无论参数顺序及时间戳如何都会得到相同的键。
+    """
+    url = URL(url)
+    query = list(url.query.items())
+    query.extend(params.items() if isinstance(params, dict) else params or [])
+    canonical = [
+        method.upper(),
+        str(url.with_query(None).with_fragment(None)),
+        _canonical_items(query),
+        _canonical_items(data),
+    ]
+    raw = json.dumps(canonical, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _kline_ttl(params):
+    try:
+        begin = datetime.fromtimestamp(int(params["begin"]) / 1000)
+        count = int(params.get("count", 0))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if count < 0 and begin.date() < date.today():
+        # 前复权价格会因除权除息整体调整，不能永久缓存
+        if params.get("type") == "before":
+            return 6 * 3600
+        return IMMUTABLE
+    return 30
+
+
+def _memo_ttl(data):
+    try:
+        query_date = datetime.strptime(data["queryDate"], "%Y-%m-%d").date()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if query_date < date.today():
+        return IMMUTABLE
+    return 600
+
+
+def default_ttl(method, url, params=None, data=None):
+    """返回请求的默认缓存有效期（秒）， `None` 表示不缓存"""
+    url = URL(url)
+    path = url.path
+    params = dict(url.query, **(params or {}))
+    if path.endswith("/chart/kline.json"):
+        return _kline_ttl(params)
+    if path.endswith("/memo/memoQuery"):
+        return _memo_ttl(data)
+    if "/stock/f10/" in path or url.host == "quotes.money.163.com":
+        return 6 * 3600
+    if path.endswith(
+        ("/realtime/pankou.json", "/stock/quote.json", "/history/trade.json")
+    ):
+        return 3
+    return None
+
+
+class HttpCache(object):
+    """磁盘上的 http 响应缓存
+
+    每个响应保存为两个文件： ``<key>.body`` 为原始响应内容，
+    ``<key>.meta`` 为 json 格式的元信息，均先写临时文件再改名，避免读到写了一半的文件。
+
+    :param root: 缓存目录
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).expanduser()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def ttl_for(self, method, url, params=None, data=None):
+        """请求的缓存有效期（秒），配置中的 http_cache_ttls 优先"""
+        for pattern, ttl in get_config("http_cache_ttls", {}).items():
+            if pattern in str(url):
+                return ttl or None
+        return default_ttl(method, url, params, data)
+
+    def _paths(self, key):
+        base = self.root / key[:2] / key
+        return base.with_suffix(".meta"), base.with_suffix(".body")
+
+    def get(self, key):
+        """读取缓存，不存在时返回 `None` ，过期的缓存也会返回，由调用者判断"""
+        meta_file, body_file = self._paths(key)
+        try:
+            with meta_file.open(encoding="utf-8") as f:
+                meta = json.load(f)
+            body = body_file.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(
+            body,
+            meta.get("charset"),
+            meta["stored_at"],
+            meta.get("expires"),
+            meta.get("etag"),
+            meta.get("last_modified"),
+            meta.get("url"),
+        )
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry.expires is None or entry.expires > time.time()
+
+    @staticmethod
+    def _write(path, content):
+        tmp_path = path.with_name(path.name + ".%s.tmp" % os.getpid())
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, key, meta):
+        meta_file, _ = self._paths(key)
+        self._write(meta_file, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    def _expires(ttl):
+        return None if ttl == IMMUTABLE else time.time() + ttl
+
+    def put(self, key, body, charset, ttl, etag=None, last_modified=None, url=None):
+        """保存响应内容"""
+        meta_file, body_file = self._paths(key)
+        try:
+            meta_file.parent.mkdir(parents=True, exist_ok=True)
+            self._write(body_file, body)
+            self._write_meta(
+                key,
+                {
+                    "url": url,
+                    "charset": charset,
+                    "stored_at": time.time(),
+                    "expires": self._expires(ttl),
+                    "etag": etag,
+                    "last_modified": last_modified,
+                },
+            )
+        except OSError as e:
+            logger.warning("write http cache for %s failed: %s", url, e)
+
+    def refresh(self, key, entry, ttl):
+        """重新验证通过后更新缓存的有效期"""
+        self.revalidated += 1
+        try:
+            self._write_meta(
+                key,
+                {
+                    "url": entry.url,
+                    "charset": entry.charset,
+                    "stored_at": time.time(),
+                    "expires": self._expires(ttl),
+                    "etag": entry.etag,
+                    "last_modified": entry.last_modified,
+                },
+            )
+        except OSError as e:
+            logger.warning("refresh http cache %s failed: %s", key, e)
+
+    @staticmethod
+    def conditional_headers(entry):
+        """过期缓存用于重新验证的请求头"""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+
+def get_http_cache():
+    """按配置返回 `HttpCache` 对象，缓存未开启时返回 `None`"""
+    global _http_cache
+    if not get_config("http_cache", False):
+        return None
+    root = Path(get_config("http_cache_path", "~/.cache/fintie/http")).expanduser()
+    if _http_cache is None or _http_cache.root != root:
+        _http_cache = HttpCache(root)
+    return _http_cache
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""json 编解码
+
+安装了 `orjson <https://github.com/ijl/orjson>`_ 或
+`ujson <https://github.com/ultrajson/ultrajson>`_ 时优先使用，
+它们解析及序列化大数据量（如全市场行情、选股器结果）时比标准库快很多，
+都没有安装时使用标准库 `json` 。
+
+配置项：
+
+    * json_codec: auto/orjson/ujson/json ，默认 auto 按上述顺序自动选择
+    * json_compact: 保存数据时是否使用紧凑格式（不缩进），默认 `False`
+
+**NOTICE** orjson 只支持 2 个空格的缩进
+"""
+import json
+import logging
+
+from ..config import get_config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+logger = logging.getLogger(__name__)
+__all__ = ["json_backend", "json_loads", "json_dumps", "json_dump"]
+_BACKENDS = {"orjson": orjson, "ujson": ujson, "json": json}
+
+
+def json_backend():
+    """当前使用的 json 库名称"""
+    name = get_config("json_codec", "auto")
+    if name != "auto":
+        if _BACKENDS.get(name) is None:
+            logger.warning("json codec %s is not available, fallback to auto", name)
+        else:
+            return name
+    if orjson is not None:
+        return "orjson"
+    if ujson is not None:
+        return "ujson"
+    return "json"
+
+
+def json_loads(data):
+    """解析 json 字符串或 utf-8 编码的 bytes
+
+    :param data: `str` 或 `bytes`
+    :returns: 解析后的对象
+    """
+    backend = json_backend()
+    if backend != "json":
+        try:
+            return _BACKENDS[backend].loads(data)
+        except ValueError:
+            # 超出 64 位的整数等第三方库不支持的内容交给标准库处理，
+            # 确实不是合法的 json 时标准库会抛出同样的异常
+            pass
+    return json.loads(data)
+
+
+def json_dumps(obj, compact=None):
+    """序列化为 json 字符串，非 ASCII 字符不转义
+
+    :param obj: 要序列化的对象
+    :param compact: 是否使用紧凑格式，默认按 json_compact 配置
+    :returns: `str`
+    """
+    if compact is None:
+        compact = get_config("json_compact", False)
+    backend = json_backend()
+    try:
+        if backend == "orjson":
+            option = orjson.OPT_NON_STR_KEYS
+            if not compact:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        if backend == "ujson":
+            return ujson.dumps(
+                obj,
+                ensure_ascii=False,
+                escape_forward_slashes=False,
+                indent=0 if compact else 4,
+            )
+    except (TypeError, OverflowError) as e:
+        logger.debug("%s dumps failed, fallback to json: %s", backend, e)
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(obj, ensure_ascii=False, indent=4)
+
+
+def json_dump(obj, fp, compact=None):
+    """序列化后写入文本文件对象，参数同 `json_dumps`"""
+    fp.write(json_dumps(obj, compact))
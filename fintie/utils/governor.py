@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""按 host 进行限速及并发控制
+
+所有抓取接口的 http 请求都会经过对应 host 的 `HostGovernor` ，
+每个 host 使用令牌桶限制请求速率，并限制同时在途的请求数。
+
+host 按后缀匹配，``www.cninfo.com.cn`` 会使用 ``cninfo.com.cn`` 的设置，
+匹配时优先使用最长的后缀。默认设置见 `DEFAULT_HOST_LIMITS` ，
+可以在配置文件中通过 ``host_limits`` 覆盖::
+
+    {
+        "host_limits": {
+            "stock.xueqiu.com": {"rate": 20, "burst": 40, "max_inflight": 32},
+            "*": {"rate": 10, "burst": 10, "max_inflight": 10}
+        }
+    }
+
+    * rate: 每秒允许发出的请求数，不设置表示不限速
+    * burst: 令牌桶容量，即允许的突发请求数
+    * max_inflight: 同时在途的请求数上限，不设置表示不限制
+    * "*": 未匹配到任何 host 时使用的设置
+"""
+import time
+import weakref
+import asyncio
+import logging
+
+from yarl import URL
+
+from ..config import get_config
+
+
+logger = logging.getLogger(__name__)
+__all__ = ["TokenBucket", "HostGovernor", "get_governor", "reset_governors"]
+DEFAULT_HOST_LIMITS = {
+    "xueqiu.com": {"rate": 5, "burst": 10, "max_inflight": 8},
+    "stock.xueqiu.com": {"rate": 10, "burst": 20, "max_inflight": 16},
+    "cninfo.com.cn": {"rate": 5, "burst": 10, "max_inflight": 8},
+    "quotes.money.163.com": {"rate": 5, "burst": 10, "max_inflight": 8},
+}
+
+# 事件循环 -> {host: `HostGovernor`}
+_governors = weakref.WeakKeyDictionary()
+
+
+class TokenBucket(object):
+    """令牌桶限速器
+
+    采用预约方式实现：每次 `acquire` 立即预约下一个可用的时间点，
+    等待者按调用顺序依次放行，不会出现惊群。
+
+    :param rate: 每秒生成的令牌数
+    :param burst: 令牌桶容量
+    """
+
+    def __init__(self, rate, burst=1):
+        assert rate > 0
+        self.rate = rate
+        self.burst = max(int(burst), 1)
+        self._interval = 1.0 / rate
+        self._tat = 0.0
+
+    def reserve(self):
+        """预约一个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        self._tat = tat + self._interval
+        return max(tat - now - (self.burst - 1) * self._interval, 0.0)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HostGovernor(object):
+    """单个 host 的请求调度器，组合了令牌桶限速和在途请求数限制
+
+    :param host: host 名称，仅用于日志及统计
+    :param rate: 每秒允许的请求数，`None` 表示不限速
+    :param burst: 令牌桶容量
+    :param max_inflight: 在途请求数上限，`None` 表示不限制
+    """
+
+    def __init__(self, host, rate=None, burst=1, max_inflight=None):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_inflight = max_inflight
+        self._sem = asyncio.Semaphore(max_inflight) if max_inflight else None
+        self.inflight = 0
+        self.total = 0
+
+    async def acquire(self):
+        if self._sem is not None:
+            await self._sem.acquire()
+        try:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+        except BaseException:
+            if self._sem is not None:
+                self._sem.release()
+            raise
+        self.inflight += 1
+        self.total += 1
+
+    def release(self):
+        self.inflight -= 1
+        if self._sem is not None:
+            self._sem.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def __repr__(self):
+        return "<HostGovernor %s inflight=%s total=%s>" % (
+            self.host,
+            self.inflight,
+            self.total,
+        )
+
+
+def _host_limits(host):
+    limits = dict(DEFAULT_HOST_LIMITS)
+    limits.update(get_config("host_limits", {}))
+    matched = None
+    for suffix in limits:
+        if suffix == "*":
+            continue
+        if host == suffix or host.endswith("." + suffix):
+            if matched is None or len(suffix) > len(matched):
+                matched = suffix
+    if matched is None:
+        return limits.get("*", {})
+    return limits[matched]
+
+
+def get_governor(url):
+    """获取 url 所属 host 的 `HostGovernor`
+
+    每个事件循环有自己的调度器，请在协程中调用。
+
+    :param url: 请求的 url 或 host
+    :returns: `HostGovernor` 对象
+    """
+    governors = _governors.setdefault(asyncio.get_event_loop(), {})
+    host = URL(url).host if "/" in url else url
+    governor = governors.get(host)
+    if governor is None:
+        limits = _host_limits(host)
+        governor = HostGovernor(
+            host,
+            rate=limits.get("rate"),
+            burst=limits.get("burst", 1),
+            max_inflight=limits.get("max_inflight"),
+        )
+        governors[host] = governor
+        logger.debug("governor created for %s: %s", host, limits)
+    return governor
+
+
+def reset_governors():
+    """清空所有调度器，修改 ``host_limits`` 配置后调用使之生效"""
+    _governors.clear()
@@ -0,0 +1,671 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""抓取接口共用的 http 请求通道
+
+所有的请求都经过 `fintie.utils.governor` 中对应 host 的调度器，
+保证请求速率及并发数不超过站点的限制。
+
+`fetch_json` / `fetch_text` / `fetch_bytes` 在此基础上提供统一的重试及熔断：
+
+    * 连接错误、超时以及 429/5xx 响应会按指数退避加随机抖动重试，
+      服务端返回 ``Retry-After`` 时至少等待其指定的时间
+    * 同一 host 连续失败达到阈值后熔断，熔断期间的请求直接失败，
+      冷却时间过后放行一个试探请求，成功则恢复
+    * 每个请求的结果以 `RequestOutcome` 报告给 `add_outcome_hook` 注册的回调，
+      批量任务可以借助 `record_outcomes` 收集失败的请求重新排队
+    * 开启缓存时，请求先查找 `fintie.utils.cache` 中的磁盘缓存，
+      只有通过 validate 检查的响应才会写入缓存，见 `fetch_json`
+    * 同时进行中的相同请求（键同缓存，忽略 ``_`` 参数）只发出一次，
+      所有调用者共享同一个解析后的结果，**请不要修改返回的数据**
+
+大文件请使用 `download_file` ，内容分块写入临时文件，中断后可以断点续传。
+
+配置项::
+
+    {
+        "http_retry": {"attempts": 4, "backoff": 0.5, "max_backoff": 30},
+        "circuit_breaker": {"threshold": 5, "cooldown": 30},
+        "http_coalesce": true
+    }
+"""
+import os
+import time
+import random
+import hashlib
+import weakref
+import asyncio
+import logging
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from collections import namedtuple
+
+import aiohttp
+from yarl import URL
+
+from ..config import get_config
+from .cache import get_http_cache, cache_key
+from .codec import json_loads
+from .governor import get_governor
+
+
+logger = logging.getLogger(__name__)
+__all__ = [
+    "request",
+    "fetch_json",
+    "fetch_text",
+    "fetch_bytes",
+    "error_code_ok",
+    "download_file",
+    "FetchError",
+    "RequestOutcome",
+    "CircuitBreaker",
+    "get_breaker",
+    "add_outcome_hook",
+    "remove_outcome_hook",
+    "record_outcomes",
+]
+RETRY_STATUS = (429, 500, 502, 503, 504)
+DEFAULT_RETRY = {"attempts": 4, "backoff": 0.5, "max_backoff": 30}
+DEFAULT_BREAKER = {"threshold": 5, "cooldown": 30}
+
+RequestOutcome = namedtuple(
+    "RequestOutcome",
+    ["method", "url", "params", "data", "ok", "status", "attempts", "error", "elapsed"],
+)
+RequestOutcome.__doc__ = """单个请求的最终结果
+
+ok 为 `True` 表示请求成功，否则 error 为失败原因，
+status 为最后一次收到的 http 状态码（没有收到响应为 `None`），
+attempts 为实际发出的请求次数。
+"""
+
+_breakers = {}
+_outcome_hooks = []
+# 事件循环 -> {请求: 进行中的 `asyncio.Task`}
+_inflight = weakref.WeakKeyDictionary()
+
+
+class FetchError(Exception):
+    """请求重试后仍然失败，`outcome` 属性为对应的 `RequestOutcome`"""
+
+    def __init__(self, outcome):
+        super().__init__(outcome)
+        self.outcome = outcome
+
+    def __str__(self):
+        outcome = self.outcome
+        return "%s %s failed after %s attempts: %s" % (
+            outcome.method,
+            outcome.url,
+            outcome.attempts,
+            outcome.error,
+        )
+
+
+class CircuitBreaker(object):
+    """单个 host 的熔断器
+
+    :param host: host 名称
+    :param threshold: 连续失败多少次后熔断
+    :param cooldown: 熔断持续的秒数，之后进入半开状态放行一个试探请求
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, host, threshold=5, cooldown=30):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        # 进行中的试探请求的标识，没有时为 `None`
+        self._trial = None
+
+    def allow(self):
+        """当前是否允许发出请求，放行的请求是否为试探请求见 `trial`"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial = None
+        if self._trial is not None:
+            return False
+        self._trial = object()
+        return True
+
+    def trial(self):
+        """`allow` 放行后立即调用，放行的是试探请求时返回其标识，否则返回 `None`"""
+        return self._trial if self.state == self.HALF_OPEN else None
+
+    def release(self, trial):
+        """试探请求被取消没有结果时释放试探名额，状态不变
+
+        :param trial: `trial` 返回的标识，不是当前的试探请求时不做任何事
+        """
+        if trial is not None and trial is self._trial:
+            self._trial = None
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("circuit breaker for %s closed", self.host)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    "circuit breaker for %s opened after %s failures",
+                    self.host,
+                    self.failures,
+                )
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial = None
+
+    def __repr__(self):
+        return "<CircuitBreaker %s %s failures=%s>" % (
+            self.host,
+            self.state,
+            self.failures,
+        )
+
+
+def get_breaker(url):
+    """获取 url 所属 host 的熔断器"""
+    host = URL(url).host if "/" in url else url
+    breaker = _breakers.get(host)
+    if breaker is None:
+        conf = dict(DEFAULT_BREAKER)
+        conf.update(get_config("circuit_breaker", {}))
+        breaker = CircuitBreaker(host, conf["threshold"], conf["cooldown"])
+        _breakers[host] = breaker
+    return breaker
+
+
+def add_outcome_hook(hook):
+    """注册请求结果回调，每个请求结束时以 `RequestOutcome` 为参数调用"""
+    _outcome_hooks.append(hook)
+
+
+def remove_outcome_hook(hook):
+    """取消注册请求结果回调"""
+    _outcome_hooks.remove(hook)
+
+
+@contextmanager
+def record_outcomes(failed_only=False):
+    """在上下文期间收集所有请求的 `RequestOutcome` ::
+
+        with record_outcomes(failed_only=True) as failed:
+            await async_get_market_events(session, start, end)
+        for outcome in failed:
+            ...  # 重新排队
+
+    :param failed_only: 是否只收集失败的请求
+    """
+    outcomes = []
+
+    def hook(outcome):
+        if not failed_only or not outcome.ok:
+            outcomes.append(outcome)
+
+    add_outcome_hook(hook)
+    try:
+        yield outcomes
+    finally:
+        remove_outcome_hook(hook)
+
+
+def _report(outcome):
+    for hook in list(_outcome_hooks):
+        try:
+            hook(outcome)
+        except Exception as e:  # noqa
+            logger.warning("outcome hook %s failed: %s", hook, e)
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_dt.tzinfo is None:
+        retry_dt = retry_dt.replace(tzinfo=timezone.utc)
+    return max((retry_dt - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _backoff_delay(attempt, conf, retry_after=None):
+    delay = random.uniform(0, min(conf["max_backoff"], conf["backoff"] * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, conf["max_backoff"]))
+    return delay
+
+
+class _GovernedRequest(object):
+    def __init__(self, session, method, url, kwargs):
+        self._session = session
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+        self._governor = None
+        self._resp = None
+
+    async def __aenter__(self):
+        self._governor = get_governor(self._url)
+        await self._governor.acquire()
+        try:
+            self._resp = await self._session.request(
+                self._method, self._url, **self._kwargs
+            )
+        except BaseException:
+            self._governor.release()
+            raise
+        return self._resp
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            self._resp.release()
+        finally:
+            self._governor.release()
+
+
+def request(session, method, url, **kwargs):
+    """经过 host 调度器的 http 请求，用法同 `aiohttp.ClientSession.request` ::
+
+        async with request(session, "GET", url, params=params) as resp:
+            data = await resp.json()
+
+    在途请求数在响应体读取完成、退出 `async with` 时才释放。
+    本接口不做重试，需要重试请使用 `fetch_json` 等接口。
+
+    :param session: `aiohttp.ClientSession` 对象
+    :param method: http 方法
+    :param url: 请求的 url
+    :param kwargs: 传递给 `aiohttp.ClientSession.request` 的参数
+    """
+    return _GovernedRequest(session, method, url, kwargs)
+
+
+def _forget_inflight(inflight, key, task):
+    if inflight.get(key) is task:
+        del inflight[key]
+    if not task.cancelled():
+        # 所有调用者都已取消时避免 "exception was never retrieved" 警告
+        task.exception()
+
+
+async def _fetch(
+    session, method, url, decode, params=None, data=None, retry=True, validate=None
+):
+    if not get_config("http_coalesce", True):
+        return await _fetch_once(
+            session, method, url, decode, params, data, retry, validate
+        )
+
+    inflight = _inflight.setdefault(asyncio.get_event_loop(), {})
+    key = (cache_key(method, url, params, data), decode, retry)
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _fetch_once(session, method, url, decode, params, data, retry, validate)
+        )
+        inflight[key] = task
+        task.add_done_callback(lambda t: _forget_inflight(inflight, key, t))
+    else:
+        logger.debug("%s %s coalesced with the in-flight request", method, url)
+    # 单个调用者取消不影响其他等待同一请求的调用者
+    return await asyncio.shield(task)
+
+
+async def _fetch_once(session, method, url, decode, params, data, retry, validate):
+    conf = dict(DEFAULT_RETRY)
+    conf.update(get_config("http_retry", {}))
+    max_attempts = conf["attempts"] if retry else 1
+    start = time.monotonic()
+    attempts = 0
+    status = error = None
+
+    def report(ok):
+        outcome = RequestOutcome(
+            method,
+            url,
+            params,
+            data,
+            ok,
+            status,
+            attempts,
+            error,
+            time.monotonic() - start,
+        )
+        _report(outcome)
+        return outcome
+
+    cache = get_http_cache()
+    cache_ttl = key = entry = None
+    if cache is not None:
+        cache_ttl = cache.ttl_for(method, url, params, data)
+    if cache_ttl:
+        key = cache_key(method, url, params, data)
+        entry = cache.get(key)
+        if entry is not None and cache.is_fresh(entry):
+            cache.hits += 1
+            result = decode(entry.body, entry.charset)
+            # attempts 为 0 表示直接使用了缓存
+            report(True)
+            return result
+        cache.misses += 1
+
+    headers = cache.conditional_headers(entry) if entry is not None else None
+    breaker = get_breaker(url)
+    while True:
+        if not breaker.allow():
+            error = "circuit open for %s" % breaker.host
+            break
+        trial = breaker.trial()
+        attempts += 1
+        retry_after = None
+        try:
+            async with request(
+                session, method, url, params=params, data=data, headers=headers
+            ) as resp:
+                status = resp.status
+                if status == 304 and entry is not None:
+                    body, charset = entry.body, entry.charset
+                    cache.refresh(key, entry, cache_ttl)
+                elif status == 200:
+                    body = await resp.read()
+                    charset = resp.get_encoding()
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+                else:
+                    error = "http %s" % status
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+            if error is None:
+                result = decode(body, charset)
+                breaker.record_success()
+                # 接口返回的错误信息不能缓存，否则会一直返回同样的错误
+                if key is not None and status == 200 and (validate or bool)(result):
+                    cache.put(
+                        key,
+                        body,
+                        charset,
+                        cache_ttl,
+                        etag,
+                        last_modified,
+                        url=str(resp.url),
+                    )
+                report(True)
+                return result
+            retryable = status in RETRY_STATUS
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = None
+            error = repr(e)
+            retryable = True
+        except ValueError as e:
+            # 响应内容解析失败，重试也无济于事
+            error = "decode failed: %s" % e
+            breaker.record_success()
+            break
+        except asyncio.CancelledError:
+            # 请求被取消，试探请求没有结果
+            breaker.release(trial)
+            raise
+
+        if retryable:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if not retryable or attempts >= max_attempts:
+            break
+        delay = _backoff_delay(attempts - 1, conf, retry_after)
+        logger.info(
+            "%s %s failed (%s), retry in %.2fs [%s/%s]",
+            method,
+            url,
+            error,
+            delay,
+            attempts,
+            max_attempts,
+        )
+        error = None
+        await asyncio.sleep(delay)
+
+    raise FetchError(report(False))
+
+
+def _decode_json(body, charset):
+    if charset and charset.lower().replace("-", "") != "utf8":
+        body = body.decode(charset)
+    return json_loads(body)
+
+
+def _decode_text(body, charset):
+    return body.decode(charset or "utf-8")
+
+
+def _decode_bytes(body, charset):
+    return body
+
+
+def error_code_ok(data):
+    """雪球等接口的成功检查，``error_code`` 为 0 时才是成功的响应"""
+    return isinstance(data, dict) and data.get("error_code", -1) in (0, "0")
+
+
+def _json_ok(data):
+    # 带有非 0 error_code 或者 success 为 false 的响应是接口返回的错误
+    if not isinstance(data, dict):
+        return data is not None
+    if data.get("error_code", 0) not in (0, "0"):
+        return False
+    return data.get("success", True) is not False
+
+
+async def fetch_json(
+    session, url, params=None, method="GET", data=None, retry=True, validate=None
+):
+    """请求 url 并将返回内容按 json 解析，失败会按配置重试
+
+    开启缓存时（见 `fintie.utils.cache` ），有效期内的请求直接返回缓存的内容。
+
+    :param session: `aiohttp.ClientSession` 对象
+    :param url: 请求的 url
+    :param params: url 查询参数
+    :param method: http 方法
+    :param data: POST 表单数据
+    :param retry: 是否允许重试，非幂等请求请传 `False`
+    :param validate: 检查解析后的数据是否为成功的响应，只有成功的响应才会写入缓存，
+                     默认排除带有非 0 error_code 或者 success 为 false 的响应
+
+    :returns: 解析后的 json 数据
+    :raises FetchError: 重试后仍然失败或者熔断中
+    """
+    validate = validate or _json_ok
+    return await _fetch(
+        session, method, url, _decode_json, params, data, retry, validate
+    )
+
+
+async def fetch_text(
+    session, url, params=None, method="GET", data=None, retry=True, validate=None
+):
+    """同 `fetch_json` ，返回解码后的文本，validate 默认只排除空内容"""
+    return await _fetch(
+        session, method, url, _decode_text, params, data, retry, validate
+    )
+
+
+async def fetch_bytes(
+    session, url, params=None, method="GET", data=None, retry=True, validate=None
+):
+    """同 `fetch_json` ，返回原始的二进制内容，validate 默认只排除空内容"""
+    return await _fetch(
+        session, method, url, _decode_bytes, params, data, retry, validate
+    )
+
+
+def _parse_range_start(value):
+    # Content-Range: bytes 200-1000/67589
+    try:
+        unit, spec = value.split(" ", 1)
+        return int(spec.split("-", 1)[0]) if unit == "bytes" else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def _md5_file(fpath, chunk_size):
+    md5 = hashlib.md5()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5
+
+
+async def download_file(
+    session, url, fpath, params=None, chunk_size=64 * 1024, retry=True
+):
+    """流式下载 url 的内容到文件，失败会按配置重试
+
+    内容分块写入 ``<fpath>.part`` ，完成后原子地重命名为 fpath ，
+    内存占用与文件大小无关；临时文件已存在时（上次下载中断）
+    使用 ``Range`` 请求从断点继续，服务端不支持时重新下载。
+
+    :param session: `aiohttp.ClientSession` 对象
+    :param url: 请求的 url
+    :param fpath: 保存的文件路径
+    :param params: url 查询参数
+    :param chunk_size: 每次读取写入的字节数
+    :param retry: 是否允许重试
+
+    :returns: ``(文件大小, md5 十六进制字符串)``
+    :raises FetchError: 重试后仍然失败或者熔断中
+    """
+    conf = dict(DEFAULT_RETRY)
+    conf.update(get_config("http_retry", {}))
+    max_attempts = conf["attempts"] if retry else 1
+    start = time.monotonic()
+    attempts = 0
+    status = error = None
+    part_path = "%s.part" % fpath
+
+    def report(ok):
+        outcome = RequestOutcome(
+            "GET",
+            url,
+            params,
+            None,
+            ok,
+            status,
+            attempts,
+            error,
+            time.monotonic() - start,
+        )
+        _report(outcome)
+        return outcome
+
+    breaker = get_breaker(url)
+    while True:
+        if not breaker.allow():
+            error = "circuit open for %s" % breaker.host
+            break
+        trial = breaker.trial()
+        attempts += 1
+        retry_after = None
+        restart = False
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": "bytes=%d-" % offset} if offset else None
+        try:
+            async with request(
+                session, "GET", url, params=params, headers=headers
+            ) as resp:
+                status = resp.status
+                range_start = _parse_range_start(resp.headers.get("Content-Range"))
+                if status == 206 and range_start == offset:
+                    # 大文件计算哈希较慢，放到线程池中避免阻塞事件循环
+                    md5 = await asyncio.get_event_loop().run_in_executor(
+                        None, _md5_file, part_path, chunk_size
+                    )
+                    mode = "ab"
+                elif status == 200:
+                    offset = 0
+                    md5 = hashlib.md5()
+                    mode = "wb"
+                elif status in (206, 416):
+                    # 临时文件与服务端的内容不一致，丢弃后重新下载
+                    if offset:
+                        os.remove(part_path)
+                    restart = True
+                    error = "range %s mismatch with http %s" % (offset, status)
+                else:
+                    error = "http %s" % status
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                if error is None:
+                    size = offset
+                    with open(part_path, mode) as f:
+                        async for chunk in resp.content.iter_chunked(chunk_size):
+                            f.write(chunk)
+                            md5.update(chunk)
+                            size += len(chunk)
+            if error is None:
+                os.replace(part_path, fpath)
+                breaker.record_success()
+                report(True)
+                return size, md5.hexdigest()
+            retryable = restart or status in RETRY_STATUS
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # 已经写入的部分保留在临时文件中，下次重试从断点继续
+            status = None
+            error = repr(e)
+            retryable = True
+        except asyncio.CancelledError:
+            breaker.release(trial)
+            raise
+
+        if retryable and not restart:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if not retryable or attempts >= max_attempts:
+            break
+        delay = _backoff_delay(attempts - 1, conf, retry_after)
+        logger.info(
+            "download %s failed (%s), retry in %.2fs [%s/%s]",
+            url,
+            error,
+            delay,
+            attempts,
+            max_attempts,
+        )
+        error = None
+        await asyncio.sleep(delay)
+
+    raise FetchError(report(False))
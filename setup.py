@@ -41,6 +41,12 @@ setup(
         "pandas",
         "pytest",
     ],
+    extras_require={
+        "fast": ["orjson"],
+        "store": ["pyarrow"],
+        "zstd": ["zstandard"],
+        "lz4": ["lz4"],
+    },
     license=about["__license__"],
     zip_safe=True,
     keywords="fintie",
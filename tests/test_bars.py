@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pandas as pd
+import pytest
+
+from fintie.store import bars
+from fintie.store.bars import last_bar_timestamp, read_bars, read_bars_many, write_bars
+from fintie.store.ticks import TRADE_TZ
+
+
+pytest.importorskip("pyarrow")
+
+
+def make_bars(dates, close, tz=None):
+    return pd.DataFrame(
+        {
+            "timestamp": [
+                pd.Timestamp(date, tz=tz).value // 10 ** 6 for date in dates
+            ],
+            "open": close,
+            "close": close,
+            "volume": [100] * len(dates),
+        }
+    ).set_index("timestamp")
+
+
+def test_write_bars_merges_and_dedups(tmp_path):
+    df = make_bars(["2018-12-27", "2018-12-28", "2019-01-02"], [1.0, 2.0, 3.0])
+    write_bars(tmp_path, "SZ002353", "day", "normal", df)
+    df = make_bars(["2019-01-02", "2019-01-03"], [30.0, 4.0])
+    files = write_bars(tmp_path, "SZ002353", "day", "normal", df)
+    assert [f.stem for f in files] == ["2019"]
+    df = read_bars(tmp_path, "SZ002353", "day", "normal")
+    assert list(df.index.strftime("%Y-%m-%d")) == [
+        "2018-12-27",
+        "2018-12-28",
+        "2019-01-02",
+        "2019-01-03",
+    ]
+    # 新数据覆盖旧数据
+    assert list(df["close"]) == [1.0, 2.0, 30.0, 4.0]
+
+
+def test_write_bars_partitions_by_year(tmp_path):
+    df = make_bars(["2017-06-01", "2018-06-01", "2019-06-01"], [1.0, 2.0, 3.0])
+    write_bars(tmp_path, "SZ002353", "day", "normal", df)
+    bar_dir = bars.bars_dir(tmp_path, "SZ002353", "day", "normal")
+    assert sorted(bars._year_files(bar_dir)) == [2017, 2018, 2019]
+    df = read_bars(tmp_path, "SZ002353", "day", "normal", "2018-01-01", "2018-12-31")
+    assert list(df["close"]) == [2.0]
+
+
+def test_write_bars_replace(tmp_path):
+    df = make_bars(["2017-06-01", "2018-06-01"], [1.0, 2.0])
+    write_bars(tmp_path, "SZ002353", "day", "normal", df)
+    write_bars(
+        tmp_path,
+        "SZ002353",
+        "day",
+        "normal",
+        make_bars(["2018-06-02"], [5.0]),
+        replace=True,
+    )
+    df = read_bars(tmp_path, "SZ002353", "day", "normal")
+    assert list(df["close"]) == [5.0]
+    bar_dir = bars.bars_dir(tmp_path, "SZ002353", "day", "normal")
+    assert sorted(bars._year_files(bar_dir)) == [2018]
+
+
+def test_last_bar_timestamp(tmp_path):
+    assert last_bar_timestamp(tmp_path, "SZ002353", "day", "normal") is None
+    df = make_bars(["2018-06-01", "2019-06-01"], [1.0, 2.0])
+    write_bars(tmp_path, "SZ002353", "day", "normal", df)
+    last = last_bar_timestamp(tmp_path, "SZ002353", "day", "normal")
+    assert pd.Timestamp(last).strftime("%Y-%m-%d") == "2019-06-01"
+
+
+def test_read_bars_market_dates(tmp_path):
+    # 日线的 timestamp 为北京时间零点，保存为前一天 16:00 的 UTC 时间
+    dates = ["2018-06-28", "2018-06-29", "2019-01-02"]
+    df = make_bars(dates, [1.0, 2.0, 3.0], tz=TRADE_TZ)
+    write_bars(tmp_path, "SZ002353", "day", "before", df)
+    df = read_bars(tmp_path, "SZ002353", "day", "before", "2018-06-29", "2018-06-29")
+    assert list(df.close) == [2.0]
+    assert list(df.index) == [pd.Timestamp("2018-06-28 16:00")]
+    # 2019-01-02 保存在 2019 年的文件中，按 UTC 时间裁剪年份文件
+    df = read_bars(tmp_path, "SZ002353", "day", "before", start="2019-01-01")
+    assert list(df.close) == [3.0]
+    df = read_bars_many(
+        tmp_path, ["SZ002353"], "day", "before", "2018-06-29", "2019-01-02"
+    )
+    assert list(df.close) == [2.0, 3.0]
+    start = pd.Timestamp("2018-06-28 16:00", tz="UTC")
+    df = read_bars_many(tmp_path, ["SZ002353"], "day", "before", start, start)
+    assert list(df.close) == [2.0]
+
+
+def test_read_bars_many_empty(tmp_path):
+    df = make_bars(["2018-06-29"], [1.0], tz=TRADE_TZ)
+    write_bars(tmp_path, "SZ002353", "day", "before", df)
+    for start in ("2017-01-01", "2018-06-30"):
+        df = read_bars_many(
+            tmp_path, ["SZ002353", "SH600000"], "day", "before", start, "2017-12-31"
+        )
+        assert df.empty
+        assert df.index.names == ["symbol", "timestamp"]
+    df = read_bars_many(tmp_path, ["SH600000"], "day", "before", columns=["close"])
+    assert df.empty
+    assert list(df.columns) == ["close"]
+    assert df.index.names == ["symbol", "timestamp"]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import functools
+
+from fintie.utils import run_batch
+
+
+async def echo(session, value, delay=0):
+    await asyncio.sleep(delay)
+    if value < 0:
+        raise ValueError(value)
+    return value
+
+
+def test_run_batch_keeps_order():
+    calls = [(echo, (i,), {"delay": (5 - i) * 0.01}) for i in range(5)]
+    assert run_batch(calls, concurrency=5) == [0, 1, 2, 3, 4]
+
+
+def test_run_batch_per_item_errors():
+    calls = [(echo, (1,)), (echo, (-1,)), (functools.partial(echo, value=-2),), (echo,)]
+    results = run_batch(calls)
+    assert results[0] == 1
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ValueError)
+    # 参数错误同样作为该项的结果
+    assert isinstance(results[3], TypeError)
+
+
+def test_run_batch_progress_errors_ignored():
+    seen = []
+
+    def progress(done, total, index, result):
+        seen.append((done, total))
+        raise RuntimeError("progress bar broken")
+
+    calls = [(echo, (i,)) for i in range(3)]
+    assert run_batch(calls, progress=progress) == [0, 1, 2]
+    assert sorted(seen) == [(1, 3), (2, 3), (3, 3)]
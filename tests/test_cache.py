@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiohttp import web
+
+from fintie.utils import http
+from fintie.utils.cache import IMMUTABLE, HttpCache, cache_key, default_ttl
+from fintie.utils.http import fetch_json
+
+from .server import run_with_server
+
+
+KLINE_URL = "https://stock.xueqiu.com/v5/stock/chart/kline.json"
+
+
+class FixedTtlCache(HttpCache):
+    def __init__(self, root, ttl):
+        super().__init__(root)
+        self.ttl = ttl
+
+    def ttl_for(self, method, url, params=None, data=None):
+        return self.ttl
+
+
+@pytest.fixture
+def use_cache(monkeypatch, tmp_path):
+    def install(ttl):
+        cache = FixedTtlCache(tmp_path, ttl)
+        monkeypatch.setattr(http, "get_http_cache", lambda: cache)
+        return cache
+
+    http._breakers.clear()
+    return install
+
+
+def test_cache_key_ignores_param_order_and_cache_buster():
+    key = cache_key("GET", "https://example.com/a.json?x=1", {"y": 2, "_": 123})
+    params = {"_": 456, "y": "2", "x": 1}
+    assert key == cache_key("get", "https://example.com/a.json", params)
+    assert key != cache_key("GET", "https://example.com/a.json", {"x": 1, "y": 3})
+    assert key != cache_key("POST", "https://example.com/a.json", {"x": 1, "y": 2})
+
+
+def test_default_ttl():
+    past = int((datetime.now() - timedelta(days=30)).timestamp() * 1000)
+    closed = {"begin": past, "count": -100, "type": "normal"}
+    assert default_ttl("GET", KLINE_URL, closed) == IMMUTABLE
+    assert default_ttl("GET", KLINE_URL, dict(closed, type="before")) == 6 * 3600
+    assert default_ttl("GET", KLINE_URL, dict(closed, count=100)) == 30
+    pankou = "https://stock.xueqiu.com/v5/stock/realtime/pankou.json"
+    assert default_ttl("GET", pankou) == 3
+    f10 = "https://xueqiu.com/stock/f10/bonus.json"
+    assert default_ttl("GET", f10) == 6 * 3600
+    assert default_ttl("GET", "https://example.com/other") is None
+
+
+def test_put_get_and_expiry(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.put("ab12", b"{}", "utf-8", 60, etag='"v1"', url="https://example.com")
+    entry = cache.get("ab12")
+    assert entry.body == b"{}"
+    assert entry.etag == '"v1"'
+    assert entry.url == "https://example.com"
+    assert cache.is_fresh(entry)
+    cache.put("cd34", b"{}", "utf-8", IMMUTABLE)
+    assert cache.get("cd34").expires is None
+    assert cache.is_fresh(cache.get("cd34"))
+    assert cache.get("missing") is None
+    assert not cache.is_fresh(entry._replace(expires=time.time() - 1))
+
+
+def test_refresh_keeps_url(tmp_path):
+    cache = HttpCache(tmp_path)
+    cache.put("ab12", b"{}", "utf-8", 60, etag='"v1"', url="https://example.com")
+    cache.refresh("ab12", cache.get("ab12"), 120)
+    entry = cache.get("ab12")
+    assert entry.url == "https://example.com"
+    assert entry.etag == '"v1"'
+    assert cache.revalidated == 1
+
+
+def test_fresh_entry_served_from_cache(use_cache):
+    cache = use_cache(60)
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        return web.json_response({"error_code": 0, "data": len(hits)})
+
+    async def check(session, url):
+        first = await fetch_json(session, url, params={"_": 1})
+        second = await fetch_json(session, url, params={"_": 2})
+        return first, second
+
+    first, second = run_with_server(handler, check)
+    assert first == second == {"error_code": 0, "data": 1}
+    assert len(hits) == 1
+    assert cache.hits == 1
+
+
+def test_error_payload_not_cached(use_cache):
+    use_cache(IMMUTABLE)
+    payloads = [{"error_code": 400016, "error_description": "rate limited"}]
+    payloads.append({"error_code": 0, "data": 1})
+
+    async def handler(request):
+        return web.json_response(payloads.pop(0))
+
+    async def check(session, url):
+        first = await fetch_json(session, url)
+        second = await fetch_json(session, url)
+        third = await fetch_json(session, url)
+        return first, second, third
+
+    first, second, third = run_with_server(handler, check)
+    assert first["error_code"] == 400016
+    assert second == third == {"error_code": 0, "data": 1}
+
+
+def test_custom_validate(use_cache):
+    use_cache(60)
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        return web.json_response({"data": []})
+
+    async def check(session, url):
+        for _ in range(2):
+            await fetch_json(session, url, validate=lambda data: bool(data["data"]))
+
+    run_with_server(handler, check)
+    assert len(hits) == 2
+
+
+def test_expired_entry_revalidated(use_cache):
+    cache = use_cache(60)
+    statuses = []
+
+    async def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            statuses.append(304)
+            return web.Response(status=304)
+        statuses.append(200)
+        return web.json_response({"data": 1}, headers={"ETag": '"v1"'})
+
+    async def check(session, url):
+        first = await fetch_json(session, url)
+        key = cache_key("GET", url)
+        entry = cache.get(key)
+        # 让缓存过期
+        cache._write_meta(
+            key,
+            {
+                "url": entry.url,
+                "charset": entry.charset,
+                "stored_at": entry.stored_at,
+                "expires": time.time() - 1,
+                "etag": entry.etag,
+                "last_modified": None,
+            },
+        )
+        second = await fetch_json(session, url)
+        return first, second, cache.get(key)
+
+    first, second, entry = run_with_server(handler, check)
+    assert first == second == {"data": 1}
+    assert statuses == [200, 304]
+    assert cache.revalidated == 1
+    assert cache.is_fresh(entry)
+    assert entry.url is not None
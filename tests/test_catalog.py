@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+from fintie.store import catalog
+from fintie.store.writer import async_flush_writes
+
+
+def make_file(tmp_path, name, content=b"data"):
+    fpath = tmp_path / "stock" / "SZ002353" / "announcements" / name
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+    fpath.write_bytes(content)
+    return fpath
+
+
+def test_record_file_reuses_connection(tmp_path):
+    catalog.record_file(make_file(tmp_path, "a.pdf"), "announcement", "SZ002353")
+    conn = catalog._thread_connect(tmp_path.resolve())
+    catalog.record_file(make_file(tmp_path, "b.pdf"), "announcement", "SZ002353")
+    assert catalog._thread_connect(tmp_path.resolve()) is conn
+    df = catalog.query(tmp_path, dataset="announcement")
+    assert sorted(df.path) == [
+        "stock/SZ002353/announcements/a.pdf",
+        "stock/SZ002353/announcements/b.pdf",
+    ]
+
+
+def test_record_file_content_hash(tmp_path):
+    fpath = make_file(tmp_path, "a.pdf")
+    catalog.record_file(fpath, "announcement", "SZ002353", content_hash="md5")
+    df = catalog.query(tmp_path, symbol="SZ002353")
+    assert list(df.hash) == ["md5"]
+    assert list(df.bytes) == [4]
+
+
+def test_async_record_file(tmp_path):
+    fpath = make_file(tmp_path, "a.pdf")
+
+    async def main():
+        await catalog.async_record_file(
+            fpath, "announcement", "SZ002353", {"url": "http://x"}
+        )
+        await async_flush_writes()
+
+    asyncio.run(main())
+    df = catalog.query(tmp_path, dataset="announcement")
+    assert list(df.symbol) == ["SZ002353"]
+    assert list(df.params) == ['{"url": "http://x"}']
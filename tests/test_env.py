@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from fintie import env
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    conf = {"cookie_path": ""}
+    monkeypatch.setattr(
+        env, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+    monkeypatch.setattr(env, "WARM_UP_URLS", dict(env.WARM_UP_URLS))
+    env._warm_ups.clear()
+    env._warm_up_times.clear()
+    yield
+    env._warm_ups.clear()
+    env._warm_up_times.clear()
+
+
+def run_warm_up(statuses, coro_func):
+    """以依次返回 statuses 的本地服务作为预热地址运行 coro_func"""
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path)
+        return web.Response(status=statuses[min(len(hits), len(statuses)) - 1])
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        server = TestServer(app)
+        await server.start_server()
+        env.WARM_UP_URLS["test"] = str(server.make_url("/"))
+        try:
+            async with aiohttp.ClientSession() as session:
+                await coro_func(session)
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+    return hits
+
+
+def test_warm_up_single_flight():
+    async def check(session):
+        results = await asyncio.gather(
+            *[env.warm_up(session, "test") for _ in range(5)]
+        )
+        assert results == [True] * 5
+        assert await env.warm_up(session, "test")
+
+    assert len(run_warm_up([200], check)) == 1
+
+
+def test_warm_up_rejects_non_2xx():
+    async def check(session):
+        assert not await env.warm_up(session, "test")
+        assert "test" not in env._warm_up_times
+        # 失败后下一次调用重新预热
+        assert await env.warm_up(session, "test")
+
+    assert len(run_warm_up([403, 200], check)) == 2
+
+
+def test_warm_up_is_per_session():
+    async def check(session):
+        assert await env.warm_up(session, "test")
+        async with aiohttp.ClientSession() as other:
+            assert await env.warm_up(other, "test")
+
+    assert len(run_warm_up([200], check)) == 2
+
+
+def test_warm_up_forgotten_with_session():
+    async def check(session):
+        other = aiohttp.ClientSession()
+        assert await env.warm_up(other, "test")
+        assert other in env._warm_ups
+        await other.close()
+        del other
+        gc.collect()
+        # 回收的会话的预热结果不会被新会话继承
+        assert list(env._warm_ups) == []
+        async with aiohttp.ClientSession() as new:
+            assert await env.warm_up(new, "test")
+
+    assert len(run_warm_up([200], check)) == 2
+
+
+def test_session_per_loop():
+    from fintie.utils import submit_coroutine
+
+    async def get_session():
+        return env.get_http_session()
+
+    shared = submit_coroutine(get_session()).result(5)
+
+    async def main():
+        session = env.get_http_session()
+        assert session is not shared
+        assert env.get_http_session() is session
+        await env.close_http_session()
+        assert session.closed
+
+    asyncio.run(main())
+    # 其他事件循环中的调用不影响后台事件循环的会话
+    assert not shared.closed
+    assert submit_coroutine(get_session()).result(5) is shared
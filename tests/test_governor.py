@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+import pytest
+
+from fintie.utils import governor
+from fintie.utils.governor import (
+    DEFAULT_HOST_LIMITS,
+    HostGovernor,
+    TokenBucket,
+    get_governor,
+)
+
+
+def test_governor_per_loop():
+    async def get():
+        return get_governor("https://stock.xueqiu.com/v5/stock/quote.json")
+
+    async def main():
+        first = await get()
+        assert await get() is first
+        return first
+
+    assert asyncio.run(main()) is not asyncio.run(main())
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(governor.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(governor.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(5)] == [0, 0, 0, 0.5, 1.0]
+    # 空闲足够久之后令牌恢复到 burst 个，不会累积更多
+    clock.now += 10
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_token_bucket_acquire_waits(clock):
+    bucket = TokenBucket(rate=4)
+
+    async def main():
+        for _ in range(3):
+            await bucket.acquire()
+
+    asyncio.run(main())
+    assert clock.sleeps == [0.25, 0.25]
+
+
+def test_max_inflight():
+    gov = HostGovernor("example.com", max_inflight=2)
+
+    async def main():
+        await gov.acquire()
+        await gov.acquire()
+        third = asyncio.ensure_future(gov.acquire())
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        assert gov.inflight == 2
+        gov.release()
+        await asyncio.wait_for(third, 1)
+        assert gov.inflight == 2
+        assert gov.total == 3
+
+    asyncio.run(main())
+
+
+def test_cancelled_acquire_releases_slot(clock, monkeypatch):
+    gov = HostGovernor("example.com", rate=1, max_inflight=1)
+
+    async def cancel(delay):
+        raise asyncio.CancelledError()
+
+    async def main():
+        await gov.acquire()
+        gov.release()
+        # 第二个请求需要等待令牌，等待时被取消
+        monkeypatch.setattr(governor.asyncio, "sleep", cancel)
+        with pytest.raises(asyncio.CancelledError):
+            await gov.acquire()
+        assert gov.inflight == 0
+        assert not gov._sem.locked()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "host, limits",
+    [
+        ("xueqiu.com", DEFAULT_HOST_LIMITS["xueqiu.com"]),
+        ("stock.xueqiu.com", DEFAULT_HOST_LIMITS["stock.xueqiu.com"]),
+        ("a.stock.xueqiu.com", DEFAULT_HOST_LIMITS["stock.xueqiu.com"]),
+        ("www.cninfo.com.cn", DEFAULT_HOST_LIMITS["cninfo.com.cn"]),
+        ("notxueqiu.com", {"rate": 1}),
+        ("example.com", {"rate": 1}),
+    ],
+)
+def test_host_suffix_matching(monkeypatch, host, limits):
+    conf = {"host_limits": {"*": {"rate": 1}}}
+    monkeypatch.setattr(
+        governor, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+    assert governor._host_limits(host) == limits
+
+
+def test_get_governor_uses_limits(monkeypatch):
+    conf = {"host_limits": {"example.com": {"rate": 3, "burst": 6, "max_inflight": 2}}}
+    monkeypatch.setattr(
+        governor, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+
+    async def main():
+        gov = get_governor("https://api.example.com/x")
+        assert get_governor("api.example.com") is gov
+        return gov
+
+    gov = asyncio.run(main())
+    assert (gov.bucket.rate, gov.bucket.burst, gov.max_inflight) == (3, 6, 2)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from fintie.stock import hist_quotes
+from fintie.store.bars import read_bars, write_bars
+from fintie.store.ticks import TRADE_TZ
+from fintie.store.writer import async_flush_writes, save_data
+
+
+pytest.importorskip("pyarrow")
+
+
+def make_quotes(dates, opens):
+    index = pd.DatetimeIndex(pd.to_datetime(dates), name="timestamp")
+    return pd.DataFrame({"open": opens, "close": opens}, index=index, dtype=float)
+
+
+class FakeKline(object):
+    """按 ref_dt 及 count 从 market 中返回行情的 `async_get_hist_quotes`"""
+
+    def __init__(self, market, overlap=0):
+        self.market = market
+        # 向前翻页时额外返回 ref_dt 之后的条数，模拟相邻两页重叠
+        self.overlap = overlap
+        self.calls = []
+
+    async def __call__(self, session, symbol, ref_dt, count, freq, fq_type, **kwargs):
+        self.calls.append((ref_dt, count))
+        if symbol == "BAD":
+            raise ValueError("bad symbol")
+        ref_dt = pd.Timestamp(ref_dt)
+        if count > 0:
+            return self.market[self.market.index >= ref_dt].iloc[:count]
+        end = self.market.index.searchsorted(ref_dt, side="right") + self.overlap
+        end = min(end, len(self.market))
+        return self.market.iloc[max(end + count, 0) : end]
+
+
+@pytest.fixture
+def kline(monkeypatch):
+    def install(market, page_size=1000, overlap=0):
+        fake = FakeKline(market, overlap)
+        monkeypatch.setattr(hist_quotes, "async_get_hist_quotes", fake)
+        monkeypatch.setattr(hist_quotes, "KLINE_PAGE_SIZE", page_size)
+        return fake
+
+    return install
+
+
+def sync_one(data_path):
+    return asyncio.run(
+        hist_quotes._sync_one(None, "SZ002353", data_path, "day", "before", None)
+    )
+
+
+DATES = pd.date_range("2018-12-24", periods=8, freq="D").strftime("%Y-%m-%d")
+
+
+def test_sync_incremental(tmp_path, kline):
+    stored = make_quotes(DATES[:5], [1, 2, 3, 4, 5])
+    write_bars(tmp_path, "SZ002353", "day", "before", stored)
+    # 最后一条保存的是盘中的行情，收盘价已经变化
+    market = make_quotes(DATES, [1, 2, 3, 4, 5, 6, 7, 8])
+    market.loc[DATES[4], "close"] = 5.5
+    fake = kline(market, page_size=2)
+
+    assert sync_one(tmp_path) == 3
+    df = read_bars(tmp_path, "SZ002353", "day", "before")
+    assert list(df.open) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert df.close.iloc[4] == 5.5
+    # 从最后一条保存的行情开始向后翻页
+    assert fake.calls[0] == (pd.Timestamp(DATES[4]), 2)
+    assert all(count > 0 for _, count in fake.calls)
+
+
+def test_sync_up_to_date(tmp_path, kline):
+    stored = make_quotes(DATES, [1, 2, 3, 4, 5, 6, 7, 8])
+    write_bars(tmp_path, "SZ002353", "day", "before", stored)
+    kline(stored)
+    assert sync_one(tmp_path) == 0
+
+
+def test_sync_refetch_after_adjust(tmp_path, kline):
+    stored = make_quotes(["2017-06-01"] + list(DATES[:5]), [9, 1, 2, 3, 4, 5])
+    write_bars(tmp_path, "SZ002353", "day", "before", stored)
+    # 除权除息后前复权价格全部改变，最后一条保存的开盘价对不上
+    market = make_quotes(DATES, [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4])
+    fake = kline(market)
+
+    assert sync_one(tmp_path) == 8
+    df = read_bars(tmp_path, "SZ002353", "day", "before")
+    # 覆盖保存，旧数据全部替换
+    assert list(df.open) == [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+    assert any(count < 0 for _, count in fake.calls)
+
+
+def test_sync_first_time(tmp_path, kline):
+    kline(make_quotes(DATES, [1, 2, 3, 4, 5, 6, 7, 8]), page_size=3)
+    assert sync_one(tmp_path) == 8
+    df = read_bars(tmp_path, "SZ002353", "day", "before")
+    assert list(df.open) == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+MARKET = make_quotes(
+    pd.date_range("2018-12-24", periods=10, freq="D"), [float(i) for i in range(10)]
+)
+
+
+def page_backward(start_dt=None):
+    return asyncio.run(
+        hist_quotes._page_backward(
+            None, "SZ002353", datetime(2019, 1, 10), "day", "before", start_dt
+        )
+    )
+
+
+def test_page_backward_until_exhausted(kline):
+    fake = kline(MARKET, page_size=3)
+    df = page_backward()
+    assert df.equals(MARKET)
+    # 3 + 3 + 3 + 1 条，最后一页不满一页时结束
+    assert len(fake.calls) == 4
+
+
+def test_page_backward_until_start(kline):
+    fake = kline(MARKET, page_size=3)
+    df = page_backward(datetime(2018, 12, 29, tzinfo=timezone.utc))
+    assert df.equals(MARKET.loc["2018-12-29":])
+    # 第二页已经早于开始时间，不再继续翻页
+    assert len(fake.calls) == 2
+
+
+def test_page_backward_trims_overlap(kline):
+    fake = kline(MARKET, page_size=4, overlap=1)
+    df = page_backward()
+    assert df.equals(MARKET)
+    assert not df.index.duplicated().any()
+    assert len(fake.calls) == 4
+
+
+def test_page_backward_empty(kline):
+    kline(MARKET.iloc[:0])
+    assert page_backward().empty
+
+
+def test_hist_quotes_many(tmp_path, kline, monkeypatch):
+    async def no_warm_up(session, force=False):
+        return True
+
+    monkeypatch.setattr(hist_quotes, "_init", no_warm_up)
+    kline(MARKET, page_size=4)
+
+    async def main():
+        results = {}
+        async for symbol, df in hist_quotes.async_get_hist_quotes_many(
+            None,
+            ["SZ002353", "BAD"],
+            datetime(2018, 12, 30, tzinfo=timezone.utc),
+            datetime(2019, 1, 10),
+            data_path=tmp_path,
+        ):
+            results[symbol] = df
+        await async_flush_writes()
+        return results
+
+    results = asyncio.run(main())
+    assert results["BAD"] is None
+    assert results["SZ002353"].equals(MARKET.loc["2018-12-30":])
+    stored = read_bars(tmp_path, "SZ002353", "day", "before")
+    assert list(stored.open) == list(MARKET.loc["2018-12-30":].open)
+
+
+def market_quotes(dates, opens):
+    """timestamp 为北京时间零点对应的 UTC 时间的日线"""
+    df = make_quotes(dates, opens)
+    df.index = df.index.tz_localize(TRADE_TZ).tz_convert("UTC").tz_localize(None)
+    return df
+
+
+QUOTE_DATES = ["2018-06-28", "2018-06-29", "2018-07-02"]
+
+
+@pytest.fixture
+def quotes_path(tmp_path):
+    # SZ002353 已导入行情存储，SH600000 只有以前保存的 json 行情文件
+    write_bars(
+        tmp_path, "SZ002353", "day", "before", market_quotes(QUOTE_DATES, [1, 2, 3])
+    )
+    df = market_quotes(QUOTE_DATES, [4, 5, 6]).reset_index()
+    df.timestamp = [ts.value // 10 ** 6 for ts in df.timestamp]
+    quotes = {"column": list(df.columns), "item": df.values.tolist()}
+    fpath = tmp_path / "stock" / "SH600000" / "hist_quotes"
+    save_data(quotes, fpath / "SH600000-day-20180702-before.json", "json", "none")
+    return tmp_path
+
+
+@pytest.mark.parametrize("symbol, opens", [("SZ002353", [2]), ("SH600000", [5])])
+def test_load_hist_quotes_market_dates(quotes_path, symbol, opens):
+    df = hist_quotes.load_hist_quotes(quotes_path, symbol, "2018-06-29", "2018-06-29")
+    assert list(df.open) == opens
+    assert list(df.index) == [pd.Timestamp("2018-06-28 16:00")]
+
+
+def test_load_hist_quotes_many_market_dates(quotes_path):
+    df = hist_quotes.load_hist_quotes(
+        quotes_path, ["SZ002353", "SH600000"], "2018-06-29", "2018-07-02"
+    )
+    assert list(df.open) == [5, 6, 2, 3]
+    assert df.index.names == ["symbol", "timestamp"]
+
+
+@pytest.mark.parametrize("symbol", ["SZ002353", "SH600000", "SZ000001"])
+def test_load_hist_quotes_empty(quotes_path, symbol):
+    df = hist_quotes.load_hist_quotes(quotes_path, symbol, "2019-01-01")
+    assert df.empty
+    assert df.index.name == "timestamp"
+    df = hist_quotes.load_hist_quotes(quotes_path, [symbol], end="2018-06-27")
+    assert df.empty
+    assert df.index.names == ["symbol", "timestamp"]
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+import hashlib
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from fintie.utils import http
+from fintie.utils.http import (
+    CircuitBreaker,
+    FetchError,
+    download_file,
+    fetch_json,
+    get_breaker,
+)
+
+from .server import run_with_server
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    http._breakers.clear()
+    yield
+    http._breakers.clear()
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    breaker._opened_at = time.monotonic() - breaker.cooldown
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("example.com", threshold=3, cooldown=30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker("example.com", threshold=1, cooldown=30)
+    open_breaker(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_trial_reopens():
+    breaker = CircuitBreaker("example.com", threshold=1, cooldown=30)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_release_frees_trial():
+    breaker = CircuitBreaker("example.com", threshold=1, cooldown=30)
+    open_breaker(breaker)
+    assert breaker.allow()
+    trial = breaker.trial()
+    assert trial is not None
+    breaker.release(trial)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_breaker_release_only_by_trial_holder():
+    breaker = CircuitBreaker("example.com", threshold=1, cooldown=30)
+    # 熔断之前发出的请求
+    assert breaker.allow()
+    before = breaker.trial()
+    assert before is None
+    open_breaker(breaker)
+    assert breaker.allow()
+    trial = breaker.trial()
+    # 熔断之前发出的请求被取消，不释放试探名额
+    breaker.release(before)
+    assert not breaker.allow()
+    # 上一轮试探请求的标识也不能释放新一轮的名额
+    breaker.record_failure()
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.release(trial)
+    assert not breaker.allow()
+
+
+def test_cancelled_trial_releases_breaker(monkeypatch):
+    # 合并请求时调用者取消不会取消底层的请求，关闭合并才能取消试探请求
+    conf = {"http_coalesce": False}
+    monkeypatch.setattr(
+        http, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+    slow = {"delay": 1}
+
+    async def handler(request):
+        await asyncio.sleep(slow["delay"])
+        return web.json_response({"ok": True})
+
+    async def check(session, url):
+        breaker = get_breaker(url)
+        open_breaker(breaker)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(fetch_json(session, url, retry=False), 0.1)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        slow["delay"] = 0
+        assert await fetch_json(session, url, retry=False) == {"ok": True}
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    run_with_server(handler, check)
+
+
+def test_cancelled_download_releases_breaker(tmp_path):
+    slow = {"delay": 1}
+
+    async def handler(request):
+        await asyncio.sleep(slow["delay"])
+        return web.Response(body=b"data")
+
+    async def check(session, url):
+        breaker = get_breaker(url)
+        open_breaker(breaker)
+        fpath = tmp_path / "file"
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(download_file(session, url, fpath), 0.1)
+        slow["delay"] = 0
+        size, _ = await download_file(session, url, fpath, retry=False)
+        assert size == 4
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    run_with_server(handler, check)
+
+
+def test_fetch_fails_fast_when_open():
+    async def handler(request):
+        return web.json_response({"ok": True})
+
+    async def check(session, url):
+        breaker = get_breaker(url)
+        open_breaker(breaker)
+        breaker._opened_at = time.monotonic()
+        with pytest.raises(FetchError, match="circuit open"):
+            await fetch_json(session, url, retry=False)
+
+    run_with_server(handler, check)
+
+
+def test_identical_requests_coalesced():
+    hits = []
+
+    async def handler(request):
+        hits.append(request.query.get("x"))
+        await asyncio.sleep(0.1)
+        return web.json_response({"x": request.query.get("x")})
+
+    async def check(session, url):
+        same = [fetch_json(session, url, {"x": 1, "_": i}) for i in range(5)]
+        other = fetch_json(session, url, {"x": 2})
+        results = await asyncio.gather(*same, other)
+        assert not http._inflight[asyncio.get_event_loop()]
+        return results
+
+    results = run_with_server(handler, check)
+    assert results == [{"x": "1"}] * 5 + [{"x": "2"}]
+    assert sorted(hits) == ["1", "2"]
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        await asyncio.sleep(0.2)
+        return web.json_response({"ok": True})
+
+    async def check(session, url):
+        first = asyncio.ensure_future(fetch_json(session, url))
+        second = asyncio.ensure_future(fetch_json(session, url))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        return first, await second
+
+    first, second = run_with_server(handler, check)
+    assert first.cancelled()
+    assert second == {"ok": True}
+    assert len(hits) == 1
+
+
+def test_coalescing_can_be_disabled(monkeypatch):
+    conf = {"http_coalesce": False}
+    monkeypatch.setattr(
+        http, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        await asyncio.sleep(0.05)
+        return web.json_response({"ok": True})
+
+    async def check(session, url):
+        return await asyncio.gather(*[fetch_json(session, url) for _ in range(3)])
+
+    assert run_with_server(handler, check) == [{"ok": True}] * 3
+    assert len(hits) == 3
+
+
+def test_download_resumes_from_part_file(tmp_path):
+    content = b"0123456789" * 1000
+    ranges = []
+
+    async def handler(request):
+        ranges.append(request.headers.get("Range"))
+        start = int(request.http_range.start or 0)
+        headers = {}
+        status = 200
+        if start:
+            status = 206
+            headers["Content-Range"] = "bytes %d-%d/%d" % (
+                start,
+                len(content) - 1,
+                len(content),
+            )
+        return web.Response(body=content[start:], status=status, headers=headers)
+
+    fpath = tmp_path / "file"
+    (tmp_path / "file.part").write_bytes(content[:4000])
+
+    async def check(session, url):
+        return await download_file(session, url, fpath)
+
+    size, md5 = run_with_server(handler, check)
+    assert ranges == ["bytes=4000-"]
+    assert size == len(content)
+    assert md5 == hashlib.md5(content).hexdigest()
+    assert fpath.read_bytes() == content
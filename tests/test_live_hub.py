@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+from fintie.stock import live_hub
+from fintie.stock.live_hub import LiveHub
+
+
+def test_publish_does_not_wait_for_blocked_subscriber():
+    hub = LiveHub(intervals={"pankou": 1})
+    key = ("pankou", "SZ002353")
+
+    async def main():
+        fast = hub.subscribe("SZ002353", ["pankou"], maxsize=1)
+        slow = hub.subscribe("SZ002353", ["pankou"], maxsize=1, policy="block")
+        # 固定顺序，阻塞策略的订阅者在前
+        hub._subs[key] = [slow, fast]
+        await hub._publish(key, 1)
+        task = asyncio.ensure_future(hub._publish(key, 2))
+        await asyncio.sleep(0.01)
+        # 阻塞策略的订阅者还没有取走数据，drop_oldest 的订阅者已经收到新数据
+        assert not task.done()
+        assert fast.queue.get_nowait() == ("pankou", "SZ002353", 2)
+        assert fast.dropped == 1
+        assert await slow.get() == ("pankou", "SZ002353", 1)
+        await asyncio.wait_for(task, 1)
+        assert await slow.get() == ("pankou", "SZ002353", 2)
+
+    asyncio.run(main())
+
+
+def test_run_stats_include_pollers(monkeypatch):
+    async def fetch(session, symbol, data_path):
+        return {"symbol": symbol}
+
+    monkeypatch.setitem(live_hub.FETCHERS, "pankou", fetch)
+    hub = LiveHub(intervals={"pankou": 0.01})
+
+    async def main():
+        sub = hub.subscribe(["SZ002353", "SH600000"], ["pankou"])
+        stats = await hub.run(None, duration=0.1)
+        assert sub.closed
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["pollers"] == 2
+    assert stats["subscribers"] == 1
+    assert stats["pankou_published"] == 2
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+from collections import Counter
+from concurrent.futures import Future
+
+import pytest
+
+from fintie.stock import live_quotes
+from fintie.store.writer import async_flush_writes, save_data
+from fintie.utils.http import FetchError, RequestOutcome
+
+
+@pytest.fixture(autouse=True)
+def snapshot_state(monkeypatch):
+    monkeypatch.setattr(live_quotes, "get_config", lambda key, default=None: default)
+    monkeypatch.setattr(live_quotes, "_snapshot_hashes", {})
+    monkeypatch.setattr(live_quotes, "_snapshot_pending", {})
+    monkeypatch.setattr(live_quotes, "_snapshot_counter", Counter())
+
+
+def save(data_dir, data, name):
+    async def main():
+        await live_quotes._save_snapshot(
+            data_dir, "SZ002353", "pankou", data, data_dir / name, None
+        )
+        await async_flush_writes()
+
+    asyncio.run(main())
+
+
+def test_snapshot_seeded_from_saved_file(tmp_path):
+    save_data({"current": 1}, tmp_path / "SZ002353-pankou-20181019100000.json")
+    save(tmp_path, {"current": 1}, "SZ002353-pankou-20181019100003.json")
+    save(tmp_path, {"current": 2}, "SZ002353-pankou-20181019100006.json")
+    save(tmp_path, {"current": 2}, "SZ002353-pankou-20181019100009.json")
+    assert live_quotes.snapshot_stats() == {"pankou_unchanged": 2, "pankou_written": 1}
+    assert len(list(tmp_path.glob("SZ002353-pankou-*"))) == 2
+
+
+def test_failed_write_not_recorded(tmp_path, monkeypatch):
+    async_save_data = live_quotes.async_save_data
+    calls = []
+
+    async def fail_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) > 1:
+            return await async_save_data(*args, **kwargs)
+        future = Future()
+        future.set_exception(OSError("disk full"))
+        return future
+
+    monkeypatch.setattr(live_quotes, "async_save_data", fail_once)
+    save(tmp_path, {"current": 1}, "SZ002353-pankou-20181019100000.json")
+    save(tmp_path, {"current": 1}, "SZ002353-pankou-20181019100003.json")
+    assert len(calls) == 2
+    assert len(list(tmp_path.glob("SZ002353-pankou-*"))) == 1
+
+
+BATCH_URL = "https://stock.xueqiu.com/v5/stock/batch/quote.json"
+
+
+def quote(symbol):
+    return {"quote": {"symbol": symbol, "current": float(len(symbol))}}
+
+
+class FakeQuoteApi(object):
+    """按请求的 url 返回批量或单只股票行情的 `fetch_json`"""
+
+    def __init__(self, failed_batch=(), unlisted=(), bad=()):
+        # 批量请求失败的股票、批量接口不返回的股票、逐只获取也失败的股票
+        self.failed_batch = set(failed_batch)
+        self.unlisted = set(unlisted)
+        self.bad = set(bad)
+        self.batches = []
+        self.singles = []
+
+    async def __call__(self, session, url, params=None, validate=None, **kwargs):
+        symbols = params["symbol"].split(",")
+        if url != BATCH_URL:
+            self.singles.extend(symbols)
+            if symbols[0] in self.bad:
+                return {"error_code": 400016, "data": None}
+            return {"error_code": 0, "data": quote(symbols[0])}
+        self.batches.append(symbols)
+        if self.failed_batch & set(symbols):
+            outcome = RequestOutcome("GET", url, params, None, False, 502, 3, "", 0)
+            raise FetchError(outcome)
+        items = [quote(s) for s in symbols if s not in self.unlisted]
+        return {"error_code": 0, "data": {"items": items + [quote("SH999999")]}}
+
+
+@pytest.fixture
+def quote_api(monkeypatch):
+    async def no_warm_up(session, force=False):
+        return True
+
+    monkeypatch.setattr(live_quotes, "_init", no_warm_up)
+
+    def install(**kwargs):
+        api = FakeQuoteApi(**kwargs)
+        monkeypatch.setattr(live_quotes, "fetch_json", api)
+        return api
+
+    return install
+
+
+def live_info_many(symbols, **kwargs):
+    return asyncio.run(
+        live_quotes.async_get_live_info_many(None, symbols, batch_size=2, **kwargs)
+    )
+
+
+SYMBOLS = ["SZ002353", "SH600000", "SZ000001", "SH601318", "SZ300750"]
+
+
+def test_live_info_many_batches(quote_api):
+    api = quote_api()
+    results = live_info_many(SYMBOLS + ["SZ002353"], return_df=False)
+    assert api.batches == [SYMBOLS[:2], SYMBOLS[2:4], SYMBOLS[4:]]
+    assert not api.singles
+    # 按请求的顺序返回，批量接口多返回的股票被忽略
+    assert list(results) == SYMBOLS
+    assert results["SH600000"] == quote("SH600000")
+
+
+def test_live_info_many_fallback(quote_api):
+    api = quote_api(failed_batch=["SZ000001"], unlisted=["SZ300750"], bad=["SH601318"])
+    df = live_info_many(SYMBOLS)
+    assert sorted(api.singles) == ["SH601318", "SZ000001", "SZ300750"]
+    assert list(df.index) == ["SZ002353", "SH600000", "SZ000001", "SZ300750"]
+    assert df.index.name == "symbol"
+    assert "symbol" not in df.columns
+    assert list(df.current) == [8.0] * 4
+
+
+def test_live_info_many_saves_snapshots(tmp_path, quote_api):
+    quote_api(unlisted=["SH600000"])
+
+    async def main():
+        results = await live_quotes.async_get_live_info_many(
+            None, SYMBOLS[:2], data_path=tmp_path, return_df=False
+        )
+        await async_flush_writes()
+        return results
+
+    assert list(asyncio.run(main())) == SYMBOLS[:2]
+    for symbol in SYMBOLS[:2]:
+        files = list((tmp_path / "stock" / symbol / "live_quotes").iterdir())
+        assert len(files) == 1
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+from fintie.stock import live_watch
+from fintie.stock.live_watch import LiveWatcher
+
+
+def test_on_data_failure_logged(monkeypatch, caplog):
+    async def fetch(session, symbol, data_path):
+        return {"symbol": symbol}
+
+    async def on_data(quote_type, symbol, data):
+        raise ValueError("bad strategy")
+
+    monkeypatch.setitem(live_watch.FETCHERS, "pankou", fetch)
+    watcher = LiveWatcher(["SZ002353"], intervals={"pankou": 3}, on_data=on_data)
+    asyncio.run(watcher._fetch_one(None, "pankou", "SZ002353", 1))
+    assert watcher._counts["pankou"]["ok"] == 1
+    assert "bad strategy" in caplog.text
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pandas as pd
+import pytest
+
+from fintie.store.loader import filter_dates
+from fintie.store.ticks import TRADE_TZ
+
+
+def report_ms(date):
+    # 雪球接口的报告期为北京时间零点的毫秒时间戳
+    return pd.Timestamp(date, tz=TRADE_TZ).value // 10 ** 6
+
+
+@pytest.mark.parametrize(
+    "reportdate",
+    [
+        [report_ms(d) for d in ("2018-03-31", "2018-06-30", "2018-09-30")],
+        ["2018-03-31", "2018-06-30", "2018-09-30"],
+    ],
+)
+def test_filter_dates_market_dates(reportdate):
+    df = pd.DataFrame({"reportdate": reportdate, "value": [1, 2, 3]})
+    df_q2 = filter_dates(df, "reportdate", "2018-06-30", "2018-06-30")
+    assert list(df_q2.value) == [2]
+    assert list(filter_dates(df, "reportdate", start="2018-07-01").value) == [3]
+    assert list(filter_dates(df, "reportdate", end="2018-06-29").value) == [1]
+    start = pd.Timestamp("2018-06-29 16:00", tz="UTC")
+    assert list(filter_dates(df, "reportdate", start, start).value) == [2]
+
+
+def test_filter_dates_requires_column():
+    df = pd.DataFrame({"value": [1]})
+    assert filter_dates(df, "reportdate") is df
+    with pytest.raises(ValueError):
+        filter_dates(df, "reportdate", start="2018-01-01")
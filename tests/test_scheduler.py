@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from fintie.stock import scheduler
+from fintie.stock.scheduler import (
+    MARKET_TZ,
+    is_live,
+    is_trading_day,
+    market_phase,
+    next_close,
+    next_session,
+    next_trading_day,
+    prev_trading_day,
+    trading_days,
+)
+
+
+@pytest.fixture(autouse=True)
+def builtin_holidays(monkeypatch):
+    monkeypatch.setattr(scheduler, "get_config", lambda key, default=None: default)
+    scheduler._holidays.cache_clear()
+    yield
+    scheduler._holidays.cache_clear()
+
+
+def market_dt(value):
+    return datetime.fromisoformat(value).replace(tzinfo=MARKET_TZ)
+
+
+def test_trading_days_of_year():
+    assert len(trading_days("2024-01-01", "2024-12-31")) == 242
+    assert len(trading_days("2025-01-01", "2025-12-31")) == 243
+
+
+def test_holidays_and_weekends():
+    assert not is_trading_day("2025-01-01")
+    assert not is_trading_day("2025-01-04")
+    assert is_trading_day("2025-01-02")
+    # 春节休市
+    assert next_trading_day("2025-01-27") == date(2025, 2, 5)
+    assert prev_trading_day("2025-02-05") == date(2025, 1, 27)
+    assert next_trading_day("2025-01-27", include=True) == date(2025, 1, 27)
+
+
+def test_holidays_config(monkeypatch):
+    conf = {"market_holidays": ["2025-01-02"], "market_open_days": ["2025-01-01"]}
+    monkeypatch.setattr(
+        scheduler, "get_config", lambda key, default=None: conf.get(key, default)
+    )
+    scheduler._holidays.cache_clear()
+    assert is_trading_day("2025-01-01")
+    assert not is_trading_day("2025-01-02")
+
+
+@pytest.mark.parametrize(
+    "dt, phase",
+    [
+        ("2025-01-02 09:00", "pre_open"),
+        ("2025-01-02 09:15", "call_auction"),
+        ("2025-01-02 09:27", "pre_continuous"),
+        ("2025-01-02 10:00", "morning"),
+        ("2025-01-02 12:00", "lunch_break"),
+        ("2025-01-02 13:00", "afternoon"),
+        ("2025-01-02 14:58", "closing_auction"),
+        ("2025-01-02 15:00", "closed"),
+        ("2025-01-04 10:00", "holiday"),
+    ],
+)
+def test_market_phase(dt, phase):
+    assert market_phase(dt) == phase
+
+
+def test_is_live():
+    assert is_live("2025-01-02 09:20")
+    assert not is_live("2025-01-02 09:20", auction=False)
+    assert not is_live("2025-01-02 09:27")
+    assert is_live("2025-01-02 14:59")
+    assert not is_live("2025-01-02 11:30")
+    assert not is_live("2025-01-04 10:00")
+
+
+def test_naive_and_aware_times():
+    # 02:00 UTC 为北京时间 10:00
+    utc_dt = datetime(2025, 1, 2, 2, 0, tzinfo=timezone.utc)
+    assert market_phase(utc_dt) == "morning"
+    assert market_phase(datetime(2025, 1, 2, 10, 0)) == "morning"
+
+
+def test_next_session():
+    assert next_session("2025-01-02 08:00") == (
+        market_dt("2025-01-02 09:15"),
+        market_dt("2025-01-02 09:25"),
+    )
+    assert next_session("2025-01-02 08:00", auction=False)[0] == market_dt(
+        "2025-01-02 09:30"
+    )
+    # 处于交易时段内时返回当前时段
+    assert next_session("2025-01-02 10:00")[0] == market_dt("2025-01-02 09:30")
+    assert next_session("2025-01-02 09:27")[0] == market_dt("2025-01-02 09:30")
+    assert next_session("2025-01-02 12:00")[0] == market_dt("2025-01-02 13:00")
+    # 周五收盘后为下周一，节假日前为节后第一个交易日
+    assert next_session("2025-01-03 15:00")[0] == market_dt("2025-01-06 09:15")
+    assert next_session("2025-01-27 16:00")[0] == market_dt("2025-02-05 09:15")
+
+
+def test_next_close():
+    assert next_close("2025-01-02 10:00") == market_dt("2025-01-02 15:00")
+    assert next_close("2025-01-02 15:00") == market_dt("2025-01-03 15:00")
+    assert next_close("2025-01-04 10:00") == market_dt("2025-01-06 15:00")
+    close = next_close("2025-01-27 15:30")
+    assert close == market_dt("2025-02-05 15:00")
+    assert close - market_dt("2025-01-27 15:30") > timedelta(days=8)
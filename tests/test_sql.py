@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from fintie.store import sql
+
+
+@pytest.fixture(autouse=True)
+def sqlite_store(monkeypatch):
+    monkeypatch.setattr(sql, "get_config", lambda key, default=None: default)
+    monkeypatch.setattr(sql, "_tables", {})
+
+
+def test_upsert_records_updates_by_natural_key(tmp_path):
+    records = [{"bonusimpdate": "20180601", "x": 1}, {"bonusimpdate": "20190601"}]
+    assert sql.upsert_records("fhsp", "SZ002353", records, tmp_path) == 2
+    records = [{"bonusimpdate": "20180601", "x": 3}]
+    assert sql.upsert_records("fhsp", "SZ002353", records, tmp_path) == 1
+    df = sql.read_records("fhsp", tmp_path).sort_values("bonusimpdate")
+    assert list(df.bonusimpdate) == ["20180601", "20190601"]
+    assert df.x.iloc[0] == 3
+
+
+def test_upsert_records_keeps_rows_without_key(tmp_path):
+    records = [{"bonusimpdate": "20180601", "x": 1}]
+    sql.upsert_records("fhsp", "SZ002353", records, tmp_path)
+    # 尚未实施的分红预案没有实施日期
+    plans = [{"bonusimpdate": None, "x": 2}, {"bonusimpdate": None, "x": 3}]
+    records = plans + [{"bonusimpdate": "20190601", "x": 4}]
+    assert sql.upsert_records("fhsp", "SZ002353", records, tmp_path) == 3
+    # 重复写入同样的预案不会重复插入
+    assert sql.upsert_records("fhsp", "SZ002353", plans, tmp_path) == 2
+    df = sql.read_records("fhsp", tmp_path).sort_values("x")
+    assert list(df.x) == [1, 2, 3, 4]
+    assert list(df.bonusimpdate)[::3] == ["20180601", "20190601"]
+
+
+def test_choose_keys_by_values():
+    records = [{"bonusimpdate": None, "exrightdate": "20190601"}]
+    assert sql._choose_keys("fhsp", records) == ["exrightdate"]
+    records = [{"bonusimpdate": None, "exrightdate": None}]
+    assert sql._choose_keys("fhsp", records) == [sql.ROW_HASH]
+    records = [{"bonusimpdate": None}, {"bonusimpdate": "20190601"}]
+    assert sql._choose_keys("fhsp", records) == ["bonusimpdate"]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+from fintie.stock import tick_collector
+from fintie.stock.tick_collector import TickCollector, _new_ticks, _tick_key
+
+
+def tick(timestamp, current=10.0, volume=100):
+    return {"timestamp": timestamp, "current": current, "trade_volume": volume}
+
+
+def keys(items):
+    return [_tick_key(item) for item in items]
+
+
+def test_first_poll_all_new():
+    items = [tick(1), tick(2)]
+    assert _new_ticks([], items) == (items, True)
+
+
+def test_prefix_overlap():
+    prev = [tick(1), tick(2), tick(3)]
+    items = [tick(2), tick(3), tick(4), tick(5)]
+    assert _new_ticks(keys(prev), items) == ([tick(4), tick(5)], True)
+
+
+def test_unchanged():
+    items = [tick(1), tick(2)]
+    assert _new_ticks(keys(items), items) == ([], True)
+
+
+def test_repeated_trades_at_same_timestamp():
+    prev = [tick(4), tick(5)]
+    # 同一时间、同样价格和数量的两笔成交，第二笔是新成交
+    items = [tick(5), tick(5), tick(6)]
+    assert _new_ticks(keys(prev), items) == ([tick(5), tick(6)], True)
+
+
+def test_misaligned_falls_back_to_timestamp():
+    prev = [tick(4), tick(5, 10.1), tick(5, 10.2)]
+    # 本次结果从更早的成交开始，开头与上一次的末尾对不上
+    items = [tick(3), tick(4), tick(5, 10.1), tick(5, 10.2), tick(5, 10.3), tick(6)]
+    assert _new_ticks(keys(prev), items) == ([tick(5, 10.3), tick(6)], True)
+
+
+def test_no_overlap():
+    prev = [tick(1), tick(2)]
+    items = [tick(10), tick(11)]
+    assert _new_ticks(keys(prev), items) == (items, False)
+
+
+class FailingWriter(object):
+    async def append_async(self, symbol, items):
+        raise OSError("disk full")
+
+
+def test_poll_survives_write_and_callback_failure(tmp_path, monkeypatch, caplog):
+    polls = iter([[tick(1), tick(2)], [tick(2), tick(3)]])
+    received = []
+
+    async def get_trade_info(session, symbol, return_df=True):
+        return {"items": next(polls)}
+
+    async def on_ticks(symbol, items):
+        received.append(keys(items))
+        raise ValueError("bad strategy")
+
+    monkeypatch.setattr(tick_collector, "async_get_trade_info", get_trade_info)
+    monkeypatch.setattr(tick_collector, "get_tick_writer", lambda path: FailingWriter())
+    collector = TickCollector(["SZ002353"], tmp_path, on_ticks=on_ticks)
+
+    async def main():
+        collector._loop = asyncio.get_event_loop()
+        sem = asyncio.Semaphore(1)
+        await collector._poll(None, "SZ002353", sem)
+        await collector._poll(None, "SZ002353", sem)
+
+    asyncio.run(main())
+    assert received == [keys([tick(1), tick(2)]), keys([tick(3)])]
+    stats = collector.stats()
+    assert stats["ticks"] == 3
+    assert stats["write_failed"] == 2
+    assert stats["callback_failed"] == 2
+    assert stats["failed"] == 0
+    assert "disk full" in caplog.text
+    assert "bad strategy" in caplog.text
+
+
+def test_collect_survives_poll_error(monkeypatch):
+    collector = TickCollector(["SZ002353"], min_interval=0.01, sessions_only=False)
+    polls = []
+
+    async def poll(session, symbol, sem):
+        polls.append(symbol)
+        if len(polls) == 1:
+            raise KeyError("timestamp")
+        collector.stop()
+
+    monkeypatch.setattr(collector, "_poll", poll)
+    stats = asyncio.run(collector.run(None, duration=5))
+    assert polls == ["SZ002353", "SZ002353"]
+    assert stats["failed"] == 1
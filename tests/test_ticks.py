@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fintie.store.ticks import (
+    TICK_DTYPE,
+    TRADE_TZ,
+    TickWriter,
+    _TickFile,
+    _to_records,
+    read_ticks,
+    tick_file,
+)
+
+
+def ms(value):
+    dt = datetime.fromisoformat(value).replace(tzinfo=TRADE_TZ)
+    return int(dt.timestamp() * 1000)
+
+
+def trade(value, price=10.0, volume=100):
+    return {"timestamp": ms(value), "current": price, "trade_volume": volume}
+
+
+T1 = ms("2018-10-19 10:00:00")
+T2 = ms("2018-10-19 10:00:03")
+T3 = ms("2018-10-19 10:00:06")
+
+
+def records(*timestamps):
+    return _to_records([{"timestamp": ts} for ts in timestamps])
+
+
+def test_append_skips_overlap(tmp_path):
+    tfile = _TickFile(tmp_path / "a.ticks", "SZ002353")
+    assert tfile.append(records(T1, T2, T2)) == 3
+    assert (tfile.last_ts, tfile.last_cnt) == (T2, 2)
+    # 时间戳相同的成交按顺序对应，第三笔 T2 是新成交
+    assert tfile.append(records(T1, T2, T2, T2, T3)) == 2
+    assert (tfile.last_ts, tfile.last_cnt) == (T3, 1)
+    assert tfile.append(records(T2, T3)) == 0
+    tfile.close()
+    timestamps = np.fromfile(tmp_path / "a.ticks", dtype=TICK_DTYPE)["timestamp"]
+    assert list(timestamps) == [T1, T2, T2, T2, T3]
+
+
+def test_reopen_restores_last_count(tmp_path):
+    tfile = _TickFile(tmp_path / "a.ticks", "SZ002353")
+    tfile.append(records(T1, T2, T2))
+    tfile.close()
+    tfile = _TickFile(tmp_path / "a.ticks", "SZ002353")
+    assert (tfile.last_ts, tfile.last_cnt) == (T2, 2)
+    assert tfile.append(records(T2, T2, T3)) == 1
+    tfile.close()
+
+
+def test_reopen_truncates_partial_record(tmp_path):
+    fpath = tmp_path / "a.ticks"
+    tfile = _TickFile(fpath, "SZ002353")
+    tfile.append(records(T1, T2))
+    tfile.close()
+    with open(fpath, "ab") as f:
+        f.write(records(T3).tobytes()[:7])
+    tfile = _TickFile(fpath, "SZ002353")
+    assert fpath.stat().st_size == 2 * TICK_DTYPE.itemsize
+    assert tfile.last_ts == T2
+    assert tfile.append(records(T2, T3)) == 1
+    tfile.close()
+    assert fpath.stat().st_size == 3 * TICK_DTYPE.itemsize
+
+
+def test_writer_day_rollover(tmp_path):
+    writer = TickWriter(tmp_path)
+    items = [trade("2018-10-19 14:59:57"), trade("2018-10-22 09:25:00")]
+    assert writer.append("SZ002353", items) == 2
+    assert writer.append("SZ002353", items + [trade("2018-10-22 09:30:00")]) == 1
+    # 同一只股票只保持最新交易日的文件打开
+    assert list(writer._files) == [("SZ002353", "20181022")]
+    writer.close()
+    assert len(read_ticks(tmp_path, "SZ002353", "20181019")) == 1
+    assert len(read_ticks(tmp_path, "SZ002353", "2018-10-22")) == 2
+    assert tick_file(tmp_path, "SZ002353", "20181022").exists()
+
+
+def test_read_ticks(tmp_path):
+    writer = TickWriter(tmp_path)
+    writer.append(
+        "SZ002353",
+        [trade("2018-10-19 10:00:03", 10.5, 200), trade("2018-10-19 10:00:00")],
+    )
+    writer.close()
+    ticks = read_ticks(tmp_path, "SZ002353", "20181019")
+    assert isinstance(ticks, np.memmap)
+    assert list(ticks["timestamp"]) == [T1, T2]
+    assert list(ticks["price"]) == [10.0, 10.5]
+    df = read_ticks(tmp_path, "SZ002353", "20181019", as_df=True)
+    assert list(df.index) == [
+        pd.Timestamp("2018-10-19 02:00:00"),
+        pd.Timestamp("2018-10-19 02:00:03"),
+    ]
+    assert list(df.volume) == [100, 200]
+    assert len(read_ticks(tmp_path, "SZ002353", "20181018")) == 0
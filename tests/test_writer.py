@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# This file is part of fintie.
+
+# Copyright (C) 2018-present qytz <hhhhhf@foxmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import threading
+
+import pytest
+
+from fintie.store import writer
+from fintie.store.writer import WriteQueue, read_data, read_frame, save_data
+
+RECORDS = [
+    {"timestamp": 1530201600000, "close": 10.5, "volume": 100},
+    {"timestamp": 1530288000000, "close": 10.8, "volume": 200},
+]
+COLUMNS = {
+    "symbol": "SZ002353",
+    "column": ["timestamp", "close", "volume"],
+    "item": [[1530201600000, 10.5, 100], [1530288000000, 10.8, 200]],
+}
+
+
+def require_codec(fmt, compression):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    elif compression == "zstd":
+        pytest.importorskip("zstandard")
+    elif compression == "lz4":
+        pytest.importorskip("lz4.frame")
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd", "lz4"])
+@pytest.mark.parametrize(
+    "fmt, suffix",
+    [("json", ".json"), ("jsonl", ".jsonl"), ("parquet", ".parquet")],
+)
+def test_save_read_roundtrip(tmp_path, fmt, suffix, compression):
+    require_codec(fmt, compression)
+    fpath = save_data(RECORDS, tmp_path / "kline.json", fmt, compression)
+    if fmt == "parquet":
+        # parquet 使用文件内部的压缩，不加压缩后缀
+        assert fpath.name == "kline" + suffix
+    else:
+        assert fpath.name == "kline" + suffix + writer.COMPRESSION_SUFFIXES[compression]
+    assert read_data(fpath) == RECORDS
+    assert list(read_frame(fpath).volume) == [100, 200]
+
+
+def test_parquet_columns_layout(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    fpath = save_data(COLUMNS, tmp_path / "kline.json", "parquet", "zstd")
+    metadata = pq.read_schema(fpath).metadata
+    assert metadata[writer.PARQUET_LAYOUT_KEY] == b"columns"
+    assert b"SZ002353" in metadata[writer.PARQUET_META_KEY]
+    assert read_data(fpath) == COLUMNS
+    df = read_frame(fpath)
+    assert list(df.columns) == COLUMNS["column"]
+    assert list(df.close) == [10.5, 10.8]
+
+
+def test_failed_write_removes_tmp(tmp_path):
+    fpath = tmp_path / "kline.json"
+    fpath.write_text("old")
+
+    def write(tmp):
+        tmp.write_text("partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        writer._atomic_write(fpath, write)
+    assert [p.name for p in tmp_path.iterdir()] == ["kline.json"]
+    assert fpath.read_text() == "old"
+
+
+def test_failed_parquet_write_removes_tmp(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    write_table = pq.write_table
+
+    def fail(table, where, **kwargs):
+        write_table(table, where, **kwargs)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(writer.pq, "write_table", fail)
+    with pytest.raises(OSError):
+        save_data(RECORDS, tmp_path / "kline.json", "parquet", "gzip")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_same_key_in_order():
+    queue = WriteQueue(workers=4)
+    done = []
+    for i in range(20):
+        queue.submit(done.append, i, key="a")
+    assert queue.flush(5) == 0
+    assert done == list(range(20))
+    queue.close()
+
+
+def test_waiting_write_does_not_hold_worker():
+    queue = WriteQueue(workers=2)
+    release, other_done = threading.Event(), threading.Event()
+    first = queue.submit(release.wait, 5, key="a")
+    second = queue.submit(lambda: "second", key="a")
+    # a 的第二个写入在等待第一个写入，另一个线程仍然可以执行其他 key 的写入
+    queue.submit(other_done.set, key="b")
+    assert other_done.wait(5)
+    assert not second.done()
+    release.set()
+    assert first.result(5) is True
+    assert second.result(5) == "second"
+    queue.close()
+
+
+def test_failed_write_recorded():
+    queue = WriteQueue(workers=1)
+
+    def fail():
+        raise OSError("disk full")
+
+    future = queue.submit(fail, key="a")
+    after = queue.submit(lambda: 1, key="a")
+    assert after.result(5) == 1
+    assert isinstance(future.exception(), OSError)
+    assert len(queue.failed) == 1
+    queue.close()
+
+
+def test_async_submit_waits_for_slot():
+    queue = WriteQueue(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def main():
+        first = await queue.async_submit(release.wait, 5)
+        task = asyncio.ensure_future(queue.async_submit(lambda: "second"))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        release.set()
+        second = await asyncio.wait_for(task, 5)
+        assert await asyncio.wrap_future(first) is True
+        assert await asyncio.wrap_future(second) == "second"
+
+    asyncio.run(main())
+    queue.close()